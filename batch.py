@@ -0,0 +1,170 @@
+"""This module plans many trips at once, spread over several worker processes.
+
+The graphs are loaded once, in the parent process, before the workers are started. Where the
+operating system supports it, the workers are forked from the parent, so they share its copy of
+the graphs (copy-on-write) instead of each receiving a pickled copy. Otherwise, or when asked to,
+the arrays of the graphs are put in shared memory, and every worker rebuilds its graphs around
+read-only views of them. Only the requests and the JSON itineraries are sent between processes,
+and itineraries are returned as soon as each one is finished.
+
+It can also be run from the command line, to plan a trip for every hotel on every given date and
+time window, and print one JSON itinerary per line as they finish:
+
+    python batch.py --dates 2021-04-16 2021-04-17 --windows 09:00-18:00 13:00-20:00
+
+Without --dates, it reads one request per line from standard input, like planner.py.
+
+This file is Copyright (c) 2021 Leen Al Lababidi, Michael Rubenstein, Maria Becerra and Nada Eldin
+"""
+from __future__ import annotations
+from typing import Iterable, Iterator, Optional
+import argparse
+import datetime
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import planner
+from planner import Planner
+import shared_graph
+
+# the number of requests sent to a worker at a time
+CHUNK_SIZE = 4
+
+# the time window of the trips planned when none is given, as (leave, return)
+DEFAULT_WINDOW = (datetime.time(9, 0), datetime.time(18, 0))
+
+# the planner used by the current worker process
+_worker_planner: Optional[Planner] = None
+
+
+def batch_requests(hotel_names: Iterable[str], dates: Iterable[datetime.date],
+                   windows: Iterable[tuple[datetime.time, datetime.time]]) -> Iterator[dict]:
+    """Yield a request for every hotel, on every date, for every time window (leave, return).
+
+    Requests are dictionaries in the format accepted by planner.plan_request.
+    """
+    windows = list(windows)
+    dates = list(dates)
+
+    for hotel_name in hotel_names:
+        for date in dates:
+            for leave, return_time in windows:
+                yield {'hotel': hotel_name,
+                       'leave': datetime.datetime.combine(date, leave).isoformat(' '),
+                       'return': datetime.datetime.combine(date, return_time).isoformat(' ')}
+
+
+def plan_batch(trip_planner: Planner, requests: Iterable[dict | str],
+               processes: Optional[int] = None, use_shared_memory: bool = False)\
+        -> Iterator[dict]:
+    """Yield the itinerary of each of the given requests, in the order they finish.
+
+    Requests are in any format accepted by planner.plan_request, so a request given as a line of
+    JSON is only read by the worker that plans it, and a malformed one only fails itself.
+
+    The requests are planned by a pool of processes worker processes (by default, one for each
+    CPU). Each itinerary includes its request, so results can be matched to requests even though
+    they may come back in a different order.
+
+    If use_shared_memory is True, or if worker processes cannot be forked, the workers get the
+    graphs through shared memory instead of inheriting them.
+
+    Preconditions:
+        - trip_planner.city_graph.hotel is None
+    """
+    global _worker_planner
+
+    if processes is None:
+        processes = os.cpu_count() or 1
+
+    if processes == 1:
+        for request in requests:
+            yield planner.plan_request(trip_planner, request)
+        return
+
+    shared = None
+    if 'fork' in multiprocessing.get_all_start_methods() and not use_shared_memory:
+        # the forked workers start with the parent's copy of the planner
+        context = multiprocessing.get_context('fork')
+        _worker_planner = trip_planner
+        initializer, initargs = None, ()
+    else:
+        # each worker builds its planner around the arrays in shared memory
+        if 'fork' in multiprocessing.get_all_start_methods():
+            context = multiprocessing.get_context('fork')
+        else:
+            context = multiprocessing.get_context('spawn')
+        shared = shared_graph.SharedGraphs(trip_planner.city_graph, trip_planner.subway_graph)
+        initializer = _attach_worker_planner
+        initargs = (shared.descriptor(), trip_planner.hotels, trip_planner.time_budget)
+
+    try:
+        with context.Pool(processes, initializer, initargs) as pool:
+            yield from pool.imap_unordered(_plan_in_worker, requests, CHUNK_SIZE)
+    finally:
+        _worker_planner = None
+        if shared is not None:
+            shared.close()
+
+
+def _attach_worker_planner(descriptor: dict, hotels: dict, time_budget: float) -> None:
+    """Set the planner of the current worker process to one using the graphs in the shared
+    memory blocks with the given descriptor, the given hotels and the given time budget.
+    """
+    global _worker_planner
+
+    city_graph, subway_graph = shared_graph.attach_graphs(descriptor)
+    _worker_planner = Planner(city_graph, subway_graph, hotels, time_budget)
+
+
+def _plan_in_worker(request: dict | str) -> dict:
+    """Return the itinerary of the given request, planned with the planner of the current worker
+    process.
+    """
+    return planner.plan_request(_worker_planner, request)
+
+
+def _parse_window(window: str) -> tuple[datetime.time, datetime.time]:
+    """Return the (leave, return) times of a time window written as HH:MM-HH:MM."""
+    leave, return_time = window.split('-')
+    return (datetime.time.fromisoformat(leave), datetime.time.fromisoformat(return_time))
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    """Plan the requested trips in parallel and print one JSON itinerary per line, as soon as
+    each one is finished.
+    """
+    parser = argparse.ArgumentParser(description='Plan many trips around Paris in parallel.')
+    parser.add_argument('--dates', nargs='+', type=datetime.date.fromisoformat,
+                        help='the dates to plan trips on, as YYYY-MM-DD')
+    parser.add_argument('--windows', nargs='+', type=_parse_window, default=[DEFAULT_WINDOW],
+                        help='the (leave, return) time windows of the trips, as HH:MM-HH:MM')
+    parser.add_argument('--hotels-file', default=planner.HOTELS_FILE,
+                        help='the CSV file of the hotels trips can leave from')
+    parser.add_argument('--processes', type=int, default=None,
+                        help='the number of worker processes (by default, one per CPU)')
+    parser.add_argument('--shared-memory', action='store_true',
+                        help='give the graphs to the workers through shared memory')
+    parser.add_argument('--verbose', action='store_true',
+                        help='log the progress of each stage on standard error')
+    args = parser.parse_args(argv)
+
+    if args.verbose:
+        logging.basicConfig(level=logging.INFO, stream=sys.stderr, format='%(message)s')
+
+    trip_planner = planner.load_planner(args.hotels_file)
+
+    if args.dates is not None:
+        requests = batch_requests(trip_planner.hotels, args.dates, args.windows)
+    else:
+        # each line is read by planner.plan_request, so that a malformed line only fails itself
+        requests = (line.strip() for line in sys.stdin if line.strip())
+
+    for itinerary in plan_batch(trip_planner, requests, args.processes, args.shared_memory):
+        print(json.dumps(itinerary, ensure_ascii=False), flush=True)
+
+
+if __name__ == "__main__":
+    main()
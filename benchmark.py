@@ -0,0 +1,368 @@
+"""This module measures each stage of planning a trip, on the Paris data and on synthetic cities
+of growing sizes generated by synthetic_city, so that slower changes can be caught and the way
+each stage scales can be plotted.
+
+The stages are the ones every trip goes through:
+    - load_city_graph: building the graph of the city from its CSV files, without any hotel
+    - load_subway_graph: building the graph of the subway and its table of routes
+    - choose_locations: choosing the locations of a trip and when to visit them, with
+        orienteering.choose_visits
+    - find_path: finding the path between those locations
+    - build_schedule: building the schedule of that path
+
+For every city, one trip is planned from each hotel in turn, until the requested number of trips
+is reached. Each round of trips from all the hotels is planned on the next day.
+
+Every stage reports its total, mean and longest wall time, the peak memory it allocated during a
+single call and counts of the work it did: the operations counted by the instrumentation module,
+such as distance evaluations or vertices visited, along with the size of what it built, such as
+the edges of the graph. Memory is traced with tracemalloc in a separate run of each call, after
+the timed one, so that tracing neither slows down the timed run nor fills its caches beforehand.
+
+    python benchmark.py --sizes 1000 10000 20000 --trips 5 --output benchmark.json
+
+The city graph links every pair of points of interest less than graphs.PROXIMITY_THRESHOLD meters
+apart, so its edges grow with both the size and the density of the city. At the default density, a
+city of 20000 points of interest has about 5 million edges and needs about 1 GB of memory, and
+every further 20000 add about as much again. A lower --density only helps so much, since most
+points of interest stay in dense neighbourhoods: the same city at a density of 5 still needs about
+half as much.
+
+The results saved with --output can be passed to a later run with --baseline, which then reports
+every stage that became slower by more than a given factor, and exits with status 1 if any did.
+
+This file is Copyright (c) 2021 Leen Al Lababidi, Michael Rubenstein, Maria Becerra and Nada Eldin
+"""
+from __future__ import annotations
+from typing import Any, Callable, Optional
+import argparse
+import datetime
+import functools
+import json
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+from location import Hotel, Landmark, Restaurant, SubwayStation
+from graphs import CityLocations, SubwayLines
+import graphs
+import orienteering
+import find_path
+import schedule
+import planner
+import synthetic_city
+import instrumentation
+
+STAGES = ['load_city_graph', 'load_subway_graph', 'choose_locations', 'find_path',
+          'build_schedule']
+
+# the default numbers of points of interest of the synthetic cities. Larger cities can be given on
+# the command line, but the memory of the city graph grows with its edges, about 1 GB for 20000
+# points of interest at the default density, and the table of routes between every pair of
+# platforms of the subway grows with the square of their number.
+SIZES = [1000, 3000, 10000]
+
+# the default number of trips planned in each city
+TRIPS = 5
+
+# the first day trips are planned on, and the time they leave and come back to the hotel
+FIRST_DAY = datetime.date(2021, 4, 16)
+LEAVE = datetime.time(9, 0)
+RETURN = datetime.time(18, 0)
+
+# the default factor by which a stage may become slower than the baseline
+TOLERANCE = 1.25
+
+
+class StageResult:
+    """The measurements of one stage on one city.
+
+    Instance Attributes:
+        - times: the wall time in seconds of each call of the stage
+        - peak_memory: the most memory in bytes allocated at once during any call, or None if
+            memory was not traced
+        - counts: the number of operations of each kind done by all the calls
+
+    Representation Invariants:
+        - self.peak_memory is None or self.peak_memory >= 0
+        - all(count >= 0 for count in self.counts.values())
+    """
+    times: list[float]
+    peak_memory: Optional[int]
+    counts: dict[str, int]
+
+    def __init__(self) -> None:
+        """Initialize a result with no calls."""
+        self.times = []
+        self.peak_memory = None
+        self.counts = {}
+
+    def add(self, seconds: float, peak_memory: Optional[int], counts: dict[str, int]) -> None:
+        """Record a call that took the given number of seconds, allocated at most peak_memory
+        bytes at once and did the given operations.
+        """
+        self.times.append(seconds)
+        if peak_memory is not None:
+            self.peak_memory = max(self.peak_memory or 0, peak_memory)
+
+        for name, count in counts.items():
+            self.counts[name] = self.counts.get(name, 0) + count
+
+    def add_error(self) -> None:
+        """Record a call that failed, which is counted but not timed."""
+        self.counts['errors'] = self.counts.get('errors', 0) + 1
+
+    def to_json(self) -> dict:
+        """Return this result as a dictionary that can be converted to JSON."""
+        return {'calls': len(self.times),
+                'wall_time': sum(self.times),
+                'mean_time': sum(self.times) / len(self.times) if self.times else None,
+                'max_time': max(self.times, default=None),
+                'peak_memory': self.peak_memory,
+                'counts': self.counts}
+
+
+def measure(function: Callable[[], Any], trace_memory: bool,
+            traced_function: Optional[Callable[[], Any]] = None)\
+        -> tuple[Any, float, Optional[int], dict[str, int]]:
+    """Call function, and return what it returned, the time in seconds it took, the most memory
+    in bytes it allocated at once, or None if trace_memory is False, and the number of operations
+    of each kind it did, as counted by the instrumentation module.
+
+    The memory is traced while calling traced_function, or function if it is not given, after
+    the timed call, so that the timed call does not find the caches filled by the traced one.
+    Memory that the timed call already kept in caches, such as the costs between subway stations,
+    is therefore not counted.
+    """
+    record = instrumentation.default_instrumentation()
+    peak_memory = None
+
+    record.reset()
+    start = time.perf_counter()
+    result = function()
+    seconds = time.perf_counter() - start
+    operations = record.totals()
+
+    if trace_memory:
+        tracemalloc.start()
+        (traced_function or function)()
+        peak_memory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    return (result, seconds, peak_memory, operations)
+
+
+def benchmark_city(landmarks_file: str, restaurants_file: str, subway_file: str,
+                   subway_lines_file: str, hotels: list[Hotel], trips: int,
+                   time_budget: float, trace_memory: bool) -> dict[str, StageResult]:
+    """Return the measurements of every stage of STAGES on the city with the given files,
+    planning the given number of trips from the given hotels.
+
+    Trips that cannot be planned, such as ones with no open location, are counted as errors of
+    the stage that failed.
+
+    Preconditions:
+        - hotels != []
+        - trips >= 0
+    """
+    results = {stage: StageResult() for stage in STAGES}
+
+    city_graph, seconds, peak, operations = measure(
+        functools.partial(graphs.load_base_city_graph, landmarks_file, restaurants_file,
+                          subway_file), trace_memory)
+    results['load_city_graph'].add(seconds, peak, {**operations, **city_counts(city_graph)})
+
+    subway_graph, seconds, peak, operations = measure(
+        functools.partial(graphs.load_subway_graph, subway_file, subway_lines_file,
+                          precompute_routes=True), trace_memory)
+    results['load_subway_graph'].add(seconds, peak,
+                                     {**operations, **subway_counts(subway_graph)})
+
+    # legs are cached across the trips of a city, like they are for a planner
+    legs = find_path.LegCache()
+
+    for i in range(0, trips):
+        hotel = hotels[i % len(hotels)]
+        day = FIRST_DAY + datetime.timedelta(days=i // len(hotels))
+        leave = datetime.datetime.combine(day, LEAVE)
+        return_time = datetime.datetime.combine(day, RETURN)
+
+        with city_graph.attached(hotel):
+            try:
+                visits, seconds, peak, operations = measure(
+                    functools.partial(orienteering.choose_visits, city_graph, subway_graph,
+                                      hotel, leave, return_time, time_budget), trace_memory)
+            except Exception:  # the trip cannot be planned, but the others can
+                results['choose_locations'].add_error()
+                continue
+            results['choose_locations'].add(seconds, peak,
+                                            {**operations, 'locations': len(visits)})
+            chosen = [visit.location_visited for visit in visits]
+
+            try:
+                path, seconds, peak, operations = measure(
+                    functools.partial(find_path.find_path, chosen, city_graph, subway_graph, legs),
+                    trace_memory,
+                    functools.partial(find_path.find_path, chosen, city_graph, subway_graph,
+                                      find_path.LegCache()))
+            except Exception:  # the trip cannot be planned, but the others can
+                results['find_path'].add_error()
+                continue
+            results['find_path'].add(seconds, peak, {**operations, 'stops': len(path)})
+
+        trip_schedule, seconds, peak, operations = measure(
+            functools.partial(schedule.build_schedule, path, leave, return_time, visits),
+            trace_memory)
+        results['build_schedule'].add(seconds, peak,
+                                      {**operations, 'time_blocks': len(trip_schedule)})
+
+    return results
+
+
+def city_counts(city_graph: CityLocations) -> dict[str, int]:
+    """Return the number of vertices of each kind and of edges of city_graph."""
+    _, _, indices, _ = city_graph.export_adjacency()
+    return {'landmarks': len(city_graph.get_all_vertices(Landmark)),
+            'restaurants': len(city_graph.get_all_vertices(Restaurant)),
+            'stations': len(city_graph.get_all_vertices(SubwayStation)),
+            'edges': len(indices) // 2}
+
+
+def subway_counts(subway_graph: SubwayLines) -> dict[str, int]:
+    """Return the number of stations, platforms and edges between platforms of subway_graph."""
+    return {'stations': len(subway_graph),
+            'platforms': len(subway_graph.transit.names),
+            'edges': len(subway_graph.transit.indices)}
+
+
+def city_json(name: str, results: dict[str, StageResult], **details: Any) -> dict:
+    """Return the results of the city with the given name as a dictionary that can be converted
+    to JSON, along with the given details about the city.
+    """
+    return {'name': name, **details,
+            'stages': {stage: result.to_json() for stage, result in results.items()}}
+
+
+def compare(cities: list[dict], baseline: dict, tolerance: float) -> list[str]:
+    """Return a message for every stage of the given cities whose mean time is more than
+    tolerance times its mean time in baseline, the saved results of an earlier run.
+
+    Cities and stages missing from baseline are not compared.
+    """
+    earlier = {city['name']: city.get('stages', {}) for city in baseline['cities']}
+
+    # ACCUMULATOR: the messages about the slower stages found so far
+    messages = []
+
+    for city in cities:
+        for stage, result in city.get('stages', {}).items():
+            before = earlier.get(city['name'], {}).get(stage)
+            if before is None or not before['mean_time'] or result['mean_time'] is None:
+                continue
+
+            ratio = result['mean_time'] / before['mean_time']
+            if ratio > tolerance:
+                messages.append(city['name'] + ' ' + stage + ': ' + format(ratio, '.2f')
+                                + ' times slower than the baseline')
+
+    return messages
+
+
+def print_summary(city: dict) -> None:
+    """Print a table of the results of the given city."""
+    print(city['name'])
+    if 'error' in city:
+        print('    failed: ' + city['error'])
+        return
+
+    for stage, result in city['stages'].items():
+        mean = 'n/a' if result['mean_time'] is None else format(result['mean_time'] * 1000, '.1f')
+        peak = 'n/a' if result['peak_memory'] is None \
+            else format(result['peak_memory'] / 2 ** 20, '.1f')
+        print('    {:<18} calls {:>4}   mean {:>10} ms   peak {:>8} MiB   {}'.format(
+            stage, result['calls'], mean, peak,
+            ', '.join(name + '=' + str(count) for name, count in result['counts'].items())))
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    """Benchmark every stage on the cities requested on the command line, print a summary of
+    the results and save them as JSON.
+    """
+    parser = argparse.ArgumentParser(description='Measure each stage of planning a trip.')
+    parser.add_argument('--sizes', type=int, nargs='*', default=SIZES,
+                        help='the numbers of points of interest of the synthetic cities')
+    parser.add_argument('--stations', type=int,
+                        help='the number of subway stations of every synthetic city')
+    parser.add_argument('--density', type=float, default=synthetic_city.DENSITY,
+                        help='the number of points of interest per square kilometer')
+    parser.add_argument('--seed', type=int, default=0, help='the seed of the synthetic cities')
+    parser.add_argument('--no-paris', action='store_true', help='skip the Paris data')
+    parser.add_argument('--trips', type=int, default=TRIPS,
+                        help='the number of trips planned in each city')
+    parser.add_argument('--time-budget', type=float, default=orienteering.TIME_BUDGET,
+                        help='the number of seconds the locations of each trip are optimized for')
+    parser.add_argument('--no-memory', action='store_true', help='do not trace memory')
+    parser.add_argument('--output', help='the JSON file to save the results to')
+    parser.add_argument('--baseline', help='the JSON file of earlier results to compare to')
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE,
+                        help='how many times slower than the baseline a stage may be')
+    args = parser.parse_args(argv)
+
+    # ACCUMULATOR: the results of the cities benchmarked so far
+    cities = []
+
+    if not args.no_paris:
+        hotels = list(planner.load_hotels(planner.HOTELS_FILE).values())
+        results = benchmark_city(planner.LANDMARKS_FILE, planner.RESTAURANTS_FILE,
+                                 planner.SUBWAY_FILE, planner.SUBWAY_LINES_FILE, hotels,
+                                 args.trips, args.time_budget, not args.no_memory)
+        cities.append(city_json('paris', results))
+        print_summary(cities[-1])
+
+    for size in args.sizes:
+        name = 'synthetic-' + str(size)
+        details = {'points_of_interest': size, 'stations': args.stations,
+                   'density': args.density, 'seed': args.seed}
+
+        with tempfile.TemporaryDirectory() as directory:
+            files = synthetic_city.generate_city(directory, size, args.stations,
+                                                 density=args.density, seed=args.seed)
+            hotels = list(planner.load_hotels(files.hotels).values())
+            try:
+                results = benchmark_city(files.landmarks, files.restaurants, files.subway,
+                                         files.subway_lines, hotels, args.trips,
+                                         args.time_budget, not args.no_memory)
+                cities.append(city_json(name, results, **details))
+            # only raised when the memory of the process is limited, such as with ulimit -v,
+            # since the system may otherwise end the process without it
+            except MemoryError:
+                cities.append({'name': name, **details, 'error': 'out of memory'})
+
+        print_summary(cities[-1])
+
+    report = {'date': datetime.datetime.now().isoformat(timespec='seconds'),
+              'python': platform.python_version(),
+              'numpy': np.__version__,
+              'platform': platform.platform(),
+              'trips': args.trips,
+              'time_budget': args.time_budget,
+              'cities': cities}
+
+    if args.output is not None:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(report, file, indent=2)
+
+    if args.baseline is not None:
+        with open(args.baseline, encoding='utf-8') as file:
+            slower = compare(cities, json.load(file), args.tolerance)
+
+        for message in slower:
+            print(message, file=sys.stderr)
+        if slower:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+"""This module contains an index used to find the best places to visit around a point, without
+walking through the proximity graph.
+
+A query combines a spatial index (which places are close enough), the opening hours index (which
+places are open) and the ratings (which places are best). Each cell of the spatial index keeps its
+places ranked by rating, so the best places around a point are found by merging the rankings of
+the nearby cells, without looking at every place in them.
+
+This file is Copyright (c) 2021 Leen Al Lababidi, Michael Rubenstein, Maria Becerra and Nada Eldin
+"""
+from __future__ import annotations
+from typing import Optional
+import datetime
+import heapq
+import numpy as np
+from location import Landmark, Restaurant
+from spatial_index import GridIndex
+from distances import coordinates_array, point_distance, within_radius
+from opening_hours import OpeningHoursIndex, opening_times_array, week_period
+
+# the default width of the cells of the index, in meters
+CELL_SIZE = 500
+
+# the kinds of places that are ranked when the index is built
+KINDS = [Landmark, Restaurant]
+
+
+class CandidateIndex:
+    """An index over a fixed collection of rated places (landmarks and restaurants).
+
+    Instance Attributes:
+        - locations: the places in this index
+        - coordinates: the (latitude, longitude) of each of the places
+        - ratings: the rating of each of the places
+        - opening_hours: the opening hours of each of the places
+
+    Representation Invariants:
+        - len(self.locations) == len(self.coordinates) == len(self.ratings)
+        - len(self.opening_hours) == len(self.locations)
+    """
+    locations: list[Landmark | Restaurant]
+    coordinates: np.ndarray
+    ratings: np.ndarray
+    opening_hours: OpeningHoursIndex
+    # Private Instance Attributes:
+    #     - _positions: maps the name of each place to its position in self.locations
+    #     - _cell_size: the width of the cells of the grids, in meters
+    #     - _grids: maps a kind of place (or None, for every place) to a grid of the positions of
+    #         the places of that kind, where the positions in each cell are ranked from highest to
+    #         lowest rating. Grids of kinds other than KINDS are built the first time they are
+    #         needed.
+    #     - _kinds: maps a kind of place to a boolean array of which places are of that kind,
+    #         computed the first time that kind is asked for
+    _positions: dict[str, int]
+    _cell_size: float
+    _grids: dict[Optional[type], GridIndex]
+    _kinds: dict[type, np.ndarray]
+
+    def __init__(self, locations: list[Landmark | Restaurant], cell_size: float = CELL_SIZE)\
+            -> None:
+        """Initialize an index over the given places."""
+        self.locations = locations
+        self.coordinates = coordinates_array(locations)
+        self.ratings = np.array([loc.rating for loc in locations], dtype=np.float64)
+        self.opening_hours = OpeningHoursIndex(opening_times_array(locations))
+
+        self._positions = {locations[i].name: i for i in range(0, len(locations))}
+        self._cell_size = cell_size
+        self._grids = {}
+        self._kinds = {}
+
+        self._ranked_grid(None)
+        for kind in KINDS:
+            self._ranked_grid(kind)
+
+    def __len__(self) -> int:
+        """Return the number of places in this index."""
+        return len(self.locations)
+
+    def positions_of(self, locations: list[Landmark | Restaurant]) -> np.ndarray:
+        """Return the positions of the given places in this index.
+
+        Preconditions:
+            - all(loc in self.locations for loc in locations)
+        """
+        return np.array([self._positions[loc.name] for loc in locations], dtype=np.int64)
+
+    def query(self, point: tuple[float, float], radius_m: float,
+              open_during: Optional[tuple[datetime.datetime, datetime.datetime]] = None,
+              kind: Optional[type] = None, top_k: Optional[int] = None,
+              exclude: Optional[set[str]] = None) -> list[Landmark | Restaurant]:
+        """Return the places at most radius_m meters away from the given (latitude, longitude)
+        point, from highest to lowest rating. Places with the same rating keep their order in
+        this index.
+
+        If open_during is a pair (start, end), only return the places that are open at some
+        point between start and end. If kind is given, only return the places of that kind. If
+        exclude is given, never return the places with those names. If top_k is given, return at
+        most top_k places.
+
+        When top_k is given, the rankings of the nearby cells are merged with a heap until top_k
+        places are found, so this takes O(top_k log cells) time when most of the best places
+        match. Otherwise, every nearby place is checked at once with numpy arrays.
+        """
+        if top_k is not None:
+            return self._top_k(point, radius_m, open_during, kind, top_k, exclude)
+
+        positions = np.fromiter(self._grids[None].nearby(point, radius_m), dtype=np.int64)
+        positions.sort()
+
+        keep = within_radius(point, self.coordinates[positions], radius_m)
+
+        if kind is not None:
+            keep &= self._kind_mask(kind)[positions]
+
+        if exclude:
+            excluded = [self._positions[name] for name in exclude if name in self._positions]
+            keep &= ~np.isin(positions, excluded)
+
+        positions = positions[keep]
+
+        if open_during is not None:
+            positions = positions[self.opening_hours.open_during(open_during[0], open_during[1],
+                                                                 positions)]
+
+        # a stable sort keeps the order of the positions between places with the same rating
+        order = np.argsort(-self.ratings[positions], kind='stable')
+
+        return [self.locations[i] for i in positions[order]]
+
+    def _top_k(self, point: tuple[float, float], radius_m: float,
+               open_during: Optional[tuple[datetime.datetime, datetime.datetime]],
+               kind: Optional[type], top_k: int, exclude: Optional[set[str]])\
+            -> list[Landmark | Restaurant]:
+        """Return the same places as query, when top_k is given, by merging the rankings of the
+        cells around point.
+        """
+        cells = list(self._ranked_grid(kind).nearby_cells(point, radius_m))
+        period = None if open_during is None else week_period(open_during[0], open_during[1])
+
+        # a heap of the best place of each cell that was not looked at yet, as tuples
+        # (-rating, position, cell, rank of the place in the cell)
+        heap = [(-self.ratings[cells[c][0]], cells[c][0], c, 0) for c in range(0, len(cells))]
+        heapq.heapify(heap)
+
+        # ACCUMULATOR: the positions of the places found so far
+        found = []
+
+        while heap and len(found) < top_k:
+            _, position, c, rank = heap[0]
+
+            # replace the place with the next one of the same cell
+            if rank + 1 < len(cells[c]):
+                following = cells[c][rank + 1]
+                heapq.heapreplace(heap, (-self.ratings[following], following, c, rank + 1))
+            else:
+                heapq.heappop(heap)
+
+            location = self.locations[position]
+            if (exclude is None or location.name not in exclude) \
+                    and point_distance(point, location.location) <= radius_m \
+                    and (period is None or self.opening_hours.is_open(position, period)):
+                found.append(position)
+
+        return [self.locations[i] for i in found]
+
+    def _ranked_grid(self, kind: Optional[type]) -> GridIndex:
+        """Return the grid of the places of the given kind (or of every place, if kind is None),
+        where the positions in each cell are ranked from highest to lowest rating, building it if
+        needed.
+        """
+        if kind not in self._grids:
+            reference_lat = float(np.max(np.abs(self.coordinates[:, 0]), initial=0.0))
+            grid = GridIndex(self._cell_size, reference_lat)
+
+            # places with the same rating keep their order in this index
+            for i in np.argsort(-self.ratings, kind='stable').tolist():
+                if kind is None or isinstance(self.locations[i], kind):
+                    grid.insert(i, self.locations[i].location)
+
+            self._grids[kind] = grid
+
+        return self._grids[kind]
+
+    def _kind_mask(self, kind: type) -> np.ndarray:
+        """Return a boolean array of which places in this index are of the given kind."""
+        if kind not in self._kinds:
+            self._kinds[kind] = np.array([isinstance(loc, kind) for loc in self.locations],
+                                         dtype=bool)
+
+        return self._kinds[kind]
+
+
+if __name__ == "__main__":
+    import python_ta
+    python_ta.check_all(config={
+        'extra-imports': ['datetime', 'heapq', 'numpy', 'location', 'spatial_index',
+                          'distances', 'opening_hours'],
+        'allowed-io': [],  # the names (strs) of functions that call print/open/input
+        'max-line-length': 100,
+        'disable': ['E1136']
+    })
+
+    import python_ta.contracts
+    python_ta.contracts.DEBUG_CONTRACTS = False
+    python_ta.contracts.check_all_contracts()
@@ -2,14 +2,13 @@
 This file is Copyright (c) 2021 Leen Al Lababidi, Michael Rubenstein, Maria Becerra and Nada Eldin
 """
 from __future__ import annotations
-from graphs import CityLocations
+from graphs import CityLocations, PROXIMITY_THRESHOLD
 from location import Landmark, Restaurant, Location, Hotel
 import datetime
+import heapq
+import logging
 
-# changing from datetime weekday to opening_times attribute
-DAY_TRANSLATION = {0: 'Monday', 1: 'Tuesday', 2: 'Wednesday',
-                   3: 'Thursday', 4: 'Friday', 5: 'Saturday',
-                   6: 'Sunday'}
+logger = logging.getLogger(__name__)
 
 
 def choose_locations(maps: CityLocations, hotel: Hotel, leave: datetime, return_time: datetime)\
@@ -34,7 +33,7 @@ def choose_locations(maps: CityLocations, hotel: Hotel, leave: datetime, return_
 
     if before_noon_diff.days == 0:
         # find nearby open locations
-        print('Gathering locations for morning....')
+        logger.info('Gathering locations for morning')
         while curr_time.time() < midday.time():
             final_plan.extend(choose_activities_timeslot(curr_location, maps, 2,
                                                          curr_time, end_time, final_plan))
@@ -45,15 +44,15 @@ def choose_locations(maps: CityLocations, hotel: Hotel, leave: datetime, return_
             raise Exception('No open locations. Insufficient data, try again')
 
         # find a restaurant for lunch
-        print('Finding a restaurant....')
-        restaurants = find_restaurants(final_plan[-1], maps, 2, [])
+        logger.info('Finding a restaurant')
+        restaurants = find_restaurants(final_plan[-1], maps, 2)
         final_plan.extend(filter_locations_rating(restaurants, 1, final_plan))
 
         curr_time = midday + datetime.timedelta(hours=1)
         curr_location = final_plan[-1]
 
     if after_noon_diff.days == 0:
-        print('Gathering locations for afternoon....')
+        logger.info('Gathering locations for afternoon')
         # add locations for the rest of the day using the found open locations
         while curr_time.time() < return_time.time():
             final_plan.extend(choose_activities_timeslot(curr_location, maps, 2,
@@ -65,73 +64,27 @@ def choose_locations(maps: CityLocations, hotel: Hotel, leave: datetime, return_
 
 
 def find_open_locations(start: Location, maps: CityLocations, distance: int,
-                        starting_time: datetime, return_time: datetime, visited: list) -> list:
-    """Returns all landmarks on a radius of <distance> nodes that are currently open.
+                        starting_time: datetime, return_time: datetime) -> list:
+    """Returns all landmarks at most <distance> * PROXIMITY_THRESHOLD meters away that are open at
+    some point between starting_time and return_time, from highest to lowest rating.
     """
-    # ACCUMULATOR: keeps track of recommended locations to visit
-    recommended = []
-
-    # retrieve starting vertex and its neighbours
-    start_v = maps.get_vertex(start)
-    neighbours = start_v.neighbours
-
-    # what day it is right now
-    day = DAY_TRANSLATION[starting_time.weekday()]
-
-    # base case
-    if distance == 0:
-        return []
-    else:
-        # add current node to visited set
-        visited.append(start)
-
-        # the root node is a hotel and does not need to be added here, so check neighbours
-        for n in neighbours:
-            if n not in visited and isinstance(n.location, Landmark):
-                # if there is an attraction adjacent that is open that day
-                if n.location.opening_times[day] is not None:
-                    open_time = n.location.opening_times[day][0]
-                    close_time = n.location.opening_times[day][1]
-                    # if it's open now, add to list
-                    if open_time <= starting_time.time() <= close_time or \
-                            starting_time.time() <= open_time <= return_time.time():
-                        recommended.append(n.location)
-
-                # recurse over the neighbours
-                find_open_locations(n.location, maps, distance - 1,
-                                    starting_time, return_time, visited)
-
-    return recommended
-
-
-def find_restaurants(start: Location, maps: CityLocations, distance: int, visited: list)\
-        -> list[Restaurant]:
-    """Returns a list of the nearest restaurants.
-    """
-    # ACCUMULATOR: keeps track of nearby restaurants
-    restaurants = []
+    return maps.candidates(start.location, distance * PROXIMITY_THRESHOLD,
+                           (starting_time, return_time), Landmark)
 
-    # get the vertex and its neighbours
-    start_v = maps.get_vertex(start)
-    neighbours = start_v.neighbours
 
-    # base case
-    if distance <= 0:
-        return []
-    else:
-        # keep track of visited vertices
-        visited.append(start)
+def find_restaurants(start: Location, maps: CityLocations, distance: int) -> list[Restaurant]:
+    """Returns a list of the nearest restaurants.
 
-        # if current vertex is a restaurant, return it
-        if isinstance(start, Restaurant):
-            return [start]
+    If start is a restaurant, only start is returned. Otherwise, this returns the restaurants less
+    than <distance> nodes away, without searching past any restaurant.
+    """
+    # if current vertex is a restaurant, return it
+    if isinstance(start, Restaurant):
+        return [start]
 
-        # check if the neighbours are restaurants
-        for u in neighbours:
-            if u not in visited:
-                restaurants.extend(find_restaurants(u.location, maps, distance - 1, visited))
+    nearby = maps.neighbourhood(start, distance - 1, lambda loc: not isinstance(loc, Restaurant))
 
-    return restaurants
+    return [location for location in nearby if isinstance(location, Restaurant)]
 
 
 def filter_locations_rating(locations: list[Restaurant or Landmark], slots: int, chosen: list)\
@@ -139,36 +92,30 @@ def filter_locations_rating(locations: list[Restaurant or Landmark], slots: int,
     """Return list of locations with best ratings from the given dictionary.
 
     slots represents an estimate of how much time is left in that timeslot, used to limit the amount
-    returned.
+    returned. Fewer locations are returned if there are not enough of them that were not chosen.
     """
-    # sort in descending order of ratings
-    locations.sort(key=lambda e: e.rating, reverse=True)
+    chosen_names = {location.name for location in chosen}
 
-    # select enough to fill the timeslot
-    final = []
-    i = 0
-
-    while len(final) < slots:
-        if locations[i] not in chosen:
-            final.append(locations[i])
-            i += 1
-        else:
-            i += 1
-
-    return final
+    # select enough to fill the timeslot, in descending order of ratings
+    return heapq.nlargest(slots, (location for location in locations
+                                  if location.name not in chosen_names),
+                          key=lambda e: e.rating)
 
 
 def choose_activities_timeslot(start: Location, maps: CityLocations, distance: int,
                                starting_time: datetime, end_time: datetime, chosen: list) -> list:
-    """Returns a list of chosen locations for this particular timeslot."""
-    # find nearby open locations
-    open_locations = find_open_locations(start, maps, distance, starting_time, end_time, [])
+    """Returns a list of chosen locations for this particular timeslot.
 
+    These are the highest rated landmarks at most <distance> * PROXIMITY_THRESHOLD meters away
+    that are open during the timeslot and were not already chosen.
+    """
     time_range = end_time - starting_time
     slots = time_range.seconds // 7200
 
-    # get the highest rated locations
-    chosen_locations = filter_locations_rating(open_locations, slots, chosen)
+    # get the highest rated open locations nearby
+    chosen_locations = maps.candidates(start.location, distance * PROXIMITY_THRESHOLD,
+                                       (starting_time, end_time), Landmark, slots,
+                                       {location.name for location in chosen})
 
     return chosen_locations
 
@@ -176,7 +123,7 @@ def choose_activities_timeslot(start: Location, maps: CityLocations, distance: i
 if __name__ == "__main__":
     import python_ta
     python_ta.check_all(config={
-        'extra-imports': [],  # the names (strs) of imported modules
+        'extra-imports': ['heapq', 'logging'],  # the names (strs) of imported modules
         'allowed-io': [],  # the names (strs) of functions that call print/open/input
         'max-line-length': 100,
         'disable': ['E1136']
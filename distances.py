@@ -0,0 +1,134 @@
+"""This module computes geographical distances in bulk using numpy arrays, instead of computing
+the distance of one pair of locations at a time.
+
+All distances use the same haversine formula as graphs.get_distance:
+https://www.movable-type.co.uk/scripts/latlong.html
+
+Every distance computed is counted as a distance evaluation of the running stage, as recorded by
+the instrumentation module.
+
+This file is Copyright (c) 2021 Leen Al Lababidi, Michael Rubenstein, Maria Becerra and Nada Eldin
+"""
+from __future__ import annotations
+import math
+import numpy as np
+from location import Location
+from spatial_index import EARTH_RADIUS
+import instrumentation
+
+
+def coordinates_array(locations: list[Location]) -> np.ndarray:
+    """Return an array of shape (len(locations), 2) holding the (latitude, longitude) of each of
+    the given locations, in degrees.
+    """
+    coordinates = np.empty((len(locations), 2), dtype=np.float64)
+    for i in range(0, len(locations)):
+        coordinates[i] = locations[i].location
+    return coordinates
+
+
+def distance_matrix(coords1: np.ndarray, coords2: np.ndarray = None) -> np.ndarray:
+    """Return the matrix of distances in meters, where entry [i, j] is the distance between
+    coords1[i] and coords2[j].
+
+    If coords2 is not given, return the distances between every pair of points in coords1.
+
+    Preconditions:
+        - coords1.shape[1] == 2
+        - coords2 is None or coords2.shape[1] == 2
+    """
+    if coords2 is None:
+        coords2 = coords1
+
+    instrumentation.count('distance_evaluations', len(coords1) * len(coords2))
+
+    lat1 = np.radians(coords1[:, 0])[:, np.newaxis]
+    lon1 = np.radians(coords1[:, 1])[:, np.newaxis]
+    lat2 = np.radians(coords2[:, 0])[np.newaxis, :]
+    lon2 = np.radians(coords2[:, 1])[np.newaxis, :]
+
+    return _haversine(lat1, lon1, lat2, lon2)
+
+
+def paired_distances(coords1: np.ndarray, coords2: np.ndarray) -> np.ndarray:
+    """Return the distance in meters between coords1[i] and coords2[i], for every i.
+
+    Preconditions:
+        - coords1.shape == coords2.shape
+        - coords1.shape[1] == 2
+    """
+    instrumentation.count('distance_evaluations', len(coords1))
+
+    lat1 = np.radians(coords1[:, 0])
+    lon1 = np.radians(coords1[:, 1])
+    lat2 = np.radians(coords2[:, 0])
+    lon2 = np.radians(coords2[:, 1])
+
+    return _haversine(lat1, lon1, lat2, lon2)
+
+
+def distances_from(point: tuple[float, float], coords: np.ndarray) -> np.ndarray:
+    """Return the distance in meters between the given (latitude, longitude) point and each of
+    the points in coords.
+
+    Preconditions:
+        - coords.shape[1] == 2
+    """
+    instrumentation.count('distance_evaluations', len(coords))
+
+    lat1, lon1 = np.radians(point[0]), np.radians(point[1])
+    lat2 = np.radians(coords[:, 0])
+    lon2 = np.radians(coords[:, 1])
+
+    return _haversine(lat1, lon1, lat2, lon2)
+
+
+def point_distance(point1: tuple[float, float], point2: tuple[float, float]) -> float:
+    """Return the distance in meters between the two given (latitude, longitude) points.
+
+    This is meant for a single pair of points, where creating numpy arrays would cost more than
+    the computation itself.
+    """
+    instrumentation.count('distance_evaluations')
+
+    lat1, lon1 = math.radians(point1[0]), math.radians(point1[1])
+    lat2, lon2 = math.radians(point2[0]), math.radians(point2[1])
+
+    a = math.sin((lat2 - lat1) / 2) ** 2 + \
+        math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+
+    return 2 * EARTH_RADIUS * math.asin(math.sqrt(min(max(a, 0.0), 1.0)))
+
+
+def within_radius(point: tuple[float, float], coords: np.ndarray, radius: float) -> np.ndarray:
+    """Return a boolean mask of the points in coords that are at most radius meters away from
+    the given (latitude, longitude) point.
+    """
+    return distances_from(point, coords) <= radius
+
+
+def _haversine(lat1: np.ndarray, lon1: np.ndarray, lat2: np.ndarray, lon2: np.ndarray)\
+        -> np.ndarray:
+    """Apply the haversine formula to the given latitudes and longitudes, in radians.
+
+    The inputs are broadcast against each other.
+    """
+    a = np.sin((lat2 - lat1) / 2) ** 2 + \
+        np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+
+    # a may go slightly above 1 due to rounding errors
+    return 2 * EARTH_RADIUS * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+if __name__ == "__main__":
+    import python_ta
+    python_ta.check_all(config={
+        'extra-imports': ['math', 'numpy', 'location', 'spatial_index', 'instrumentation'],
+        'allowed-io': [],  # the names (strs) of functions that call print/open/input
+        'max-line-length': 100,
+        'disable': ['E1136']
+    })
+
+    import python_ta.contracts
+    python_ta.contracts.DEBUG_CONTRACTS = False
+    python_ta.contracts.check_all_contracts()
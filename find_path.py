@@ -1,21 +1,184 @@
 """This module picks the route taken during the trip, using the SubwayLines graph for public
 transport.
 
+Each leg of the trip is the fastest way between two consecutive locations, walking, riding the
+subway, or both, found by a MultimodalRouter. The legs of the route between two locations are
+kept in a LegCache shared by every trip, since the same legs (from the hotels and to the most
+popular landmarks) come up again and again. The cache also keeps the router that finds the legs
+it is missing, so the walks between stations that the router precomputes are reused as well.
+
 This file is Copyright (c) 2021 Leen Al Lababidi, Michael Rubenstein, Maria Becerra and Nada Eldin
 """
+from __future__ import annotations
 from typing import Optional
+from collections import OrderedDict
+import logging
 from location import Location, SubwayStation
-from graphs import CityLocations, SubwayLines, get_distance
+from graphs import CityLocations, SubwayLines
+from multimodal import MultimodalRouter
+import instrumentation
+
+# the default number of legs kept in a leg cache
+LEG_CACHE_SIZE = 4096
+
+logger = logging.getLogger(__name__)
+
+
+class LegCache:
+    """A cache of the most recently used legs of trips, where a leg is the list of subway
+    stations passed through between two consecutive locations of a trip (empty when walking).
+
+    Legs are keyed by the ids of their two locations in the city graph. The cache only holds legs
+    of one pair of graphs at a time, and it is emptied when either graph changes. It also holds
+    the router used to find the legs that are not in it, which is only replaced along with the
+    graphs.
+
+    Instance Attributes:
+        - max_size: the maximum number of legs in the cache
+        - hits: the number of times a leg was found in the cache
+        - misses: the number of times a leg was not found in the cache
+        - evictions: the number of legs removed to make room for newer ones
+
+    Representation Invariants:
+        - self.max_size > 0
+    """
+    max_size: int
+    hits: int
+    misses: int
+    evictions: int
+    # Private Instance Attributes:
+    #     - _entries: maps the ids of the two locations of each leg to the names of those locations
+    #         and the leg, from least to most recently used
+    #     - _graphs: the city graph, the subway graph and the transit model of the subway graph
+    #         the legs were computed with, or None if no leg was cached yet
+    #     - _versions: the versions of the city graph and of the subway graph when the legs were
+    #         computed
+    #     - _router: the router between the locations of the city graph in _graphs, or None if it
+    #         was not needed yet
+    _entries: OrderedDict[tuple[int, int], tuple[str, str, tuple[SubwayStation, ...]]]
+    _graphs: Optional[tuple]
+    _versions: tuple[int, int]
+    _router: Optional[MultimodalRouter]
+
+    def __init__(self, max_size: int = LEG_CACHE_SIZE) -> None:
+        """Initialize an empty cache."""
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._graphs = None
+        self._versions = (0, 0)
+        self._router = None
+
+    def __len__(self) -> int:
+        """Return the number of legs in the cache."""
+        return len(self._entries)
+
+    def get(self, location1: Location, location2: Location, city_graph: CityLocations,
+            subway_graph: SubwayLines) -> Optional[tuple[SubwayStation, ...]]:
+        """Return the leg from location1 to location2, or None if it is not in the cache.
+
+        Preconditions:
+            - location1 in city_graph.get_all_vertices()
+            - location2 in city_graph.get_all_vertices()
+        """
+        self._check_graphs(city_graph, subway_graph)
+        key = (city_graph.id_of(location1), city_graph.id_of(location2))
+        entry = self._entries.get(key)
+
+        # the id of a detached location can be given to another location afterwards
+        if entry is None or entry[0] != location1.name or entry[1] != location2.name:
+            self.misses += 1
+            instrumentation.count('leg_cache_misses')
+            return None
+
+        self.hits += 1
+        instrumentation.count('leg_cache_hits')
+        self._entries.move_to_end(key)
+        return entry[2]
+
+    def put(self, location1: Location, location2: Location, city_graph: CityLocations,
+            subway_graph: SubwayLines, leg: tuple[SubwayStation, ...]) -> None:
+        """Store the leg from location1 to location2, removing the least recently used leg if
+        the cache is full.
+
+        Preconditions:
+            - location1 in city_graph.get_all_vertices()
+            - location2 in city_graph.get_all_vertices()
+        """
+        self._check_graphs(city_graph, subway_graph)
+        key = (city_graph.id_of(location1), city_graph.id_of(location2))
+        self._entries[key] = (location1.name, location2.name, leg)
+        self._entries.move_to_end(key)
+
+        if len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        """Remove every leg from the cache."""
+        self._entries.clear()
+
+    def router(self, city_graph: CityLocations, subway_graph: SubwayLines) -> MultimodalRouter:
+        """Return the router that finds the legs between the locations of city_graph using
+        subway_graph, reusing the one this cache already has if it is for the same graphs.
+
+        Preconditions:
+            - subway_graph.transit is not None
+        """
+        self._check_graphs(city_graph, subway_graph)
+
+        if self._router is None or \
+                self._router.boarding_time != subway_graph.transit.transfer_penalty:
+            self._router = MultimodalRouter(city_graph, subway_graph)
+
+        return self._router
+
+    def _check_graphs(self, city_graph: CityLocations, subway_graph: SubwayLines) -> None:
+        """Empty the cache if its legs were not computed with the given graphs, in their current
+        versions, and forget its router if it is not for the given graphs.
+
+        The router does not need to be replaced when the graphs only change versions, since it
+        updates what it computed from the city graph by itself.
+        """
+        graphs = (city_graph, subway_graph, subway_graph.transit)
+        versions = (city_graph.version, subway_graph.version)
+
+        if self._graphs is None or any(graphs[i] is not self._graphs[i] for i in range(0, 3)):
+            self._entries.clear()
+            self._router = None
+            self._graphs = graphs
+            self._versions = versions
+        elif versions != self._versions:
+            self._entries.clear()
+            self._versions = versions
+
+
+# the leg cache used by find_path when no other cache is given
+_legs = LegCache()
+
+
+def default_leg_cache() -> LegCache:
+    """Return the leg cache shared by the calls to find_path that are not given one."""
+    return _legs
 
 
+@instrumentation.timed('find_path')
 def find_path(chosen_locations: list[Location], city_graph: CityLocations,
-              subway_graph: SubwayLines) -> list[Location]:
+              subway_graph: SubwayLines, legs: Optional[LegCache] = None) -> list[Location]:
     """Returns a list representing the route to take between the chosen locations. This route will
     include public transit pathways where needed.
 
+    The legs between consecutive locations are looked up in legs, or in the default leg cache if
+    legs is None, and only computed if they are not there, with the router of that cache.
+
     Preconditions:
         - subway_graph is connected
     """
+    if legs is None:
+        legs = _legs
+
     # initialize the path, starting at the hotel
     path = [city_graph.hotel]
     prev = city_graph.hotel
@@ -23,152 +186,107 @@ def find_path(chosen_locations: list[Location], city_graph: CityLocations,
     locations_to_visit = chosen_locations + [city_graph.hotel]
 
     for location in locations_to_visit:
-        # if next location is adjacent, add to list
-        if city_graph.adjacent(prev, location):
-            print(location.name + ' is close enough to walk to')
-            path.append(location)
-        else:
-            print(location.name + ' is not close enough to walk to, finding nearest subways...')
-            # find subway closest to prev
-            starting_station = find_closest_subway(prev, city_graph, [])
-            print('Closest subway to ' + prev.name + ' is ' + starting_station.name)
-            # find subway closest to location
-            end_station = find_closest_subway(location, city_graph, [])
-            print('Closest subway to ' + location.name + ' is ' + end_station.name)
-
-            # find path between those stations
-            # keep track of how far away a certain vertex is
-            distances = {starting_station.name: 0}
-            station_path = find_subway_path(starting_station, end_station, distances, [],
-                                            subway_graph)
-
-            # the graph should be connected, but throw an exception if something went wrong
-            if station_path is None:
-                raise Exception('There is no path between these stations')
-
-            # combine accumulator and continue
-            path += station_path
-            path.append(location)
+        leg = legs.get(prev, location, city_graph, subway_graph)
+
+        if leg is None:
+            leg = find_leg(prev, location, city_graph, subway_graph,
+                           legs.router(city_graph, subway_graph))
+            legs.put(prev, location, city_graph, subway_graph, leg)
+
+        # combine accumulator and continue
+        path.extend(leg)
+        path.append(location)
 
         prev = location
 
     return path
 
 
-def find_closest_subway(location: Location, city_graph: CityLocations, visited: list)\
-        -> SubwayStation:
-    """Return the subway station that is closest to the given location.
+def find_leg(location1: Location, location2: Location, city_graph: CityLocations,
+             subway_graph: SubwayLines, router: Optional[MultimodalRouter] = None)\
+        -> tuple[SubwayStation, ...]:
+    """Return the subway stations to pass through on the fastest way from location1 to
+    location2, in order. Return an empty tuple if it is fastest to walk straight there.
 
-    If there is a subway station adjacent to it, that station is returned. Else, it tries to find
-    the closest subway station to the chosen location.
-    """
-    # get neighbours
-    neighbors = city_graph.get_neighbors(location)
+    The route is found with router, or with a new router for the given graphs if router is None.
 
-    # ACCUMULATORS
-    visited.append(location)
-    potential_closest = []
+    Raise an Exception if there is no route between the two locations.
 
-    for neighbor in neighbors:
-        if neighbor.location not in visited:
-            # if there is an adjacent station, return that
-            if isinstance(neighbor.location, SubwayStation):
-                return neighbor.location
+    Preconditions:
+        - location1 in city_graph.get_all_vertices()
+        - location2 in city_graph.get_all_vertices()
+        - subway_graph.transit is not None
+        - router is None or (router.city_graph is city_graph and
+            router.subway_graph is subway_graph)
+    """
+    if router is None:
+        router = MultimodalRouter(city_graph, subway_graph)
 
-            # collects stations adjacent to neighbours
-            potential_closest.append(find_closest_subway(neighbor.location, city_graph, visited))
+    route = router.route(location1, location2)
 
-    # of these stations, find the closest
-    closest = potential_closest[0]
-    for station in potential_closest:
-        if get_distance(station, location) < get_distance(closest, location):
-            closest = station
+    # the graph should be connected, but throw an exception if something went wrong
+    if route is None:
+        raise Exception('There is no path between these locations')
 
-    return closest
+    time, stations = route
+    if stations:
+        logger.info('Taking the subway from %s to %s to get to %s in %d minutes',
+                    stations[0].name, stations[-1].name, location2.name, round(time / 60))
+    else:
+        logger.info('Walking to %s in %d minutes', location2.name, round(time / 60))
 
+    return tuple(stations)
 
-def find_subway_path(subway1: SubwayStation, subway2: SubwayStation, distances: dict,
-                     visited: list[SubwayStation], subway_graph: SubwayLines)\
-        -> Optional[list[SubwayStation]]:
-    """Return the shortest subway route between the given two stations, starting from subway1
-    until subway2. Uses a variation of Dijkstra's shortest path algorithm.
 
-    Precondition:
-        - subway1 in subway_graph.get_all_vertices()
-        - subway2 in subway_graph.get_all_vertices()
-    """
-    # initialize path
-    path = [subway1]
-
-    if subway1 == subway2:
-        return path
-    elif subway_graph.adjacent(subway1, subway2):
-        return path + [subway2]
-    else:
-        # keep track of visited vertices
-        new_visited = visited.copy()
-        new_visited.append(subway1)
-
-        # update the distances dictionary
-        reassign_distances(distances, subway1, subway2, subway_graph, new_visited)
+def find_closest_subway(location: Location, city_graph: CityLocations) -> SubwayStation:
+    """Return the subway station that is closest to the given location.
 
-        # pick the shortest step
-        neighbour_stations = sort_by_distances(subway1, subway_graph, distances)
-        shortest = neighbour_stations.pop()
+    Raise a ValueError if there are no subway stations in city_graph.
+    """
+    if isinstance(location, SubwayStation):
+        return location
 
-        rest_of_path = None
+    # the closest stations of every location in the graph are computed once and reused
+    nearest_stations = city_graph.nearest_station_map()
+    if location.name in nearest_stations:
+        return nearest_stations[location.name]
 
-        # keep going until you find a path
-        while rest_of_path is None:
-            # make sure that shortest is not in visited to avoid recursion
-            while shortest in new_visited and len(neighbour_stations) > 0:
-                shortest = neighbour_stations.pop()
+    # the location was attached to the graph after the mapping was computed
+    closest = city_graph.nearest_stations(location)
+    if not closest:
+        raise ValueError('There are no subway stations in this graph')
 
-            # this shouldn't happen but there just in case there was no path
-            if len(neighbour_stations) == 0 and shortest in new_visited:
-                return None
+    return closest[0]
 
-            rest_of_path = find_subway_path(shortest, subway2, distances, new_visited, subway_graph)
 
-        if rest_of_path is not None:
-            path += rest_of_path
-            return path
-        else:
-            return None
+def find_subway_path(subway1: SubwayStation, subway2: SubwayStation, subway_graph: SubwayLines)\
+        -> Optional[list[SubwayStation]]:
+    """Return the fastest subway route between the given two stations, starting from subway1
+    until subway2. Return None if there is no route between them.
 
+    The route is found on the line-aware model of the network, so it only changes lines when that
+    is worth the transfer penalty. A station where the route changes lines only appears once.
 
-def reassign_distances(distances: dict, subway1: SubwayStation, subway2: SubwayStation,
-                       subway_graph: SubwayLines, visited: list) -> None:
-    """Updates the distances dictionary to reflect the shortest possible distances between the
-    neighbours of subway and the original location.
+    Precondition:
+        - subway1 in subway_graph.get_all_vertices()
+        - subway2 in subway_graph.get_all_vertices()
+        - subway_graph.transit is not None
     """
-    # get the actual vertex represented by subway1 and its neighbours
-    subway1_vertex = subway_graph.get_vertex(subway1)
-    neighbours = subway1_vertex.neighbours
-
-    # iterate over the neighbours of subway1 to find the shortest step
-    for u in neighbours:
-        if u.location not in visited:
-            # re-assign distance values
-            if u.item not in distances:
-                distances[u.item] = get_distance(u.location, subway2)
+    platforms = subway_graph.transit.route(subway1.name, subway2.name)
 
+    if platforms is None:
+        return None
 
-def sort_by_distances(subway: SubwayStation, subway_graph: SubwayLines, distances: dict)\
-        -> list:
-    """Return a list of subway stations sorted in descending order by distance from <subway> in
-    edges on the subway_graph."""
-    neighbours = list(subway_graph.get_vertex(subway).neighbours)
-    neighbour_stations = [n.location for n in neighbours]
-    neighbour_stations.sort(reverse=True, key=lambda item: distances[item.name])
-    return neighbour_stations
+    stations = subway_graph.transit.route_stations(platforms)
+    return [subway_graph.get_vertex_str(name).location for name in stations]
 
 
 if __name__ == "__main__":
     import python_ta
     python_ta.check_all(config={
-        'extra-imports': ['location', 'graphs'],
-        'allowed-io': ['find_path'],  # the names (strs) of functions that call print/open/input
+        'extra-imports': ['collections', 'logging', 'location', 'graphs', 'multimodal',
+                          'instrumentation'],
+        'allowed-io': [],  # the names (strs) of functions that call print/open/input
         'max-line-length': 100,
         'disable': ['E1136']
     })
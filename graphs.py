@@ -4,17 +4,36 @@ and the subway lines.
 This file is Copyright (c) 2021 Leen Al Lababidi, Michael Rubenstein, Maria Becerra and Nada Eldin
 """
 from __future__ import annotations
-from typing import Callable, Optional
-from datetime import time
+from typing import Callable, Iterator, Optional
+from contextlib import contextmanager
+import dataclasses
+from datetime import datetime, time
 import math
 import csv
+import numpy as np
 from location import Location, Landmark, Restaurant, SubwayStation, Hotel
+from spatial_index import GridIndex, build_grid_index
+from distances import coordinates_array, distance_matrix, distances_from
+from nearest import NearestIndex
+from candidates import CandidateIndex
+from transit import TRANSFER_PENALTY, TransitNetwork, build_transit_network
+import instrumentation
+
+# the maximum distance, in meters, between two locations connected by an edge
+PROXIMITY_THRESHOLD = 1500
+
+# the average walking speed, in meters per minute
+WALKING_SPEED = 80
 
 
 class _Vertex:
     """A vertex in our graph used to represent a particular location.
 
+    The graph stores its locations and edges in arrays indexed by vertex id, and a _Vertex is a
+    lightweight view of one of those ids. Each graph keeps a single view for each of its vertices.
+
     Instance Attributes:
+        - id: the id of this vertex in its graph
         - item: refers to the name of the location that this vertex represents
         - location: refers to the actual location object
         - neighbours: the vertices adjacent to this one
@@ -23,31 +42,93 @@ class _Vertex:
         - self not in self.neighbours
         -all(self in u.neighbours for u in self.neighbours)
     """
-    item: str
-    location: Location
-    neighbours: set[_Vertex]
+    __slots__ = ('id', '_graph')
+    id: int
+    # Private Instance Attributes:
+    #     - _graph: the graph this vertex is in
+    _graph: Graph
 
-    def __init__(self, location: Location) -> None:
-        """Initialize a new vertex with the given location.
+    def __init__(self, graph: Graph, vertex_id: int) -> None:
+        """Initialize a view of the vertex with the given id in graph."""
+        self.id = vertex_id
+        self._graph = graph
 
-        This vertex is initialized with no neighbours.
-        """
-        self.item = location.name
-        self.location = location
-        self.neighbours = set()
+    @property
+    def item(self) -> str:
+        """The name of the location that this vertex represents."""
+        return self._graph.location_of(self.id).name
+
+    @property
+    def location(self) -> Location:
+        """The location that this vertex represents."""
+        return self._graph.location_of(self.id)
+
+    @property
+    def neighbours(self) -> list[_Vertex]:
+        """The vertices adjacent to this one."""
+        views = self._graph.vertex_of
+        return [views(u) for u in self._graph.neighbour_ids(self.id)]
 
 
 class Graph:
-    """A class representing a graph."""
+    """A class representing a graph.
+
+    Each vertex has an integer id, given in the order vertices are added. The edges between the
+    vertices are stored in compressed sparse row (CSR) arrays, along with a small set of extra
+    edges added one at a time after those arrays were built, such as the edges of a hotel.
+
+    Every edge is weighted by the distance in meters between its two locations, which is computed
+    once when the edge is added.
+
+    Instance Attributes:
+        - version: a number that changes every time a vertex or an edge is added or removed, so
+            that results computed from this graph can tell when they are outdated
+    """
+    version: int
     # Private Instance Attributes:
-    #     - _vertices:
-    #         A collection of the vertices contained in this graph.
-    #         Maps item to _Vertex object.
-    _vertices: dict[str, _Vertex]
+    #     - _ids:
+    #         Maps the item of each vertex to its id.
+    #     - _locations:
+    #         The location of each vertex, indexed by id. Removed vertices are None.
+    #     - _views:
+    #         The _Vertex view of each vertex, indexed by id. Removed vertices are None.
+    #     - _indptr, _indices, _weights:
+    #         The edges in CSR form: the neighbours of the vertex with id i < len(_indptr) - 1
+    #         are _indices[_indptr[i]:_indptr[i + 1]], in increasing order, and the weights of
+    #         those edges are at the same positions in _weights.
+    #     - _extra:
+    #         Maps the id of a vertex to the ids of the neighbours it gained from add_edge, along
+    #         with the weights of those edges.
+    #     - _removed:
+    #         The ids of removed vertices that may still appear in the CSR arrays.
+    #     - _free:
+    #         The ids of removed vertices that are not in the CSR arrays, which can be reused.
+    _ids: dict[str, int]
+    _locations: list[Optional[Location]]
+    _views: list[Optional[_Vertex]]
+    _indptr: np.ndarray
+    _indices: np.ndarray
+    _weights: np.ndarray
+    _extra: dict[int, dict[int, float]]
+    _removed: set[int]
+    _free: list[int]
 
     def __init__(self) -> None:
         """Initialize an empty graph (no vertices or edges)."""
-        self._vertices = {}
+        self.version = 0
+        self._ids = {}
+        self._locations = []
+        self._views = []
+        self._indptr = np.zeros(1, dtype=np.int64)
+        self._indices = np.zeros(0, dtype=np.int32)
+        self._weights = np.zeros(0, dtype=np.float32)
+        self._extra = {}
+        self._removed = set()
+        self._free = []
+
+    def __len__(self) -> int:
+        """Return the number of vertices in this graph."""
+        return len(self._ids)
 
     def add_vertex(self, location: Location) -> None:
         """Add a vertex with the given item to this graph.
@@ -55,70 +136,577 @@ class Graph:
         The new vertex is not adjacent to any other vertices.
         Do nothing if the given item is already in this graph.
         """
-        if location.name not in self._vertices:
-            self._vertices[location.name] = _Vertex(location)
-
-    def add_edge(self, item1: Location, item2: Location) -> None:
+        if location.name not in self._ids:
+            if self._free:
+                vertex_id = self._free.pop()
+                self._locations[vertex_id] = location
+                self._views[vertex_id] = _Vertex(self, vertex_id)
+            else:
+                vertex_id = len(self._locations)
+                self._locations.append(location)
+                self._views.append(_Vertex(self, vertex_id))
+
+            self._ids[location.name] = vertex_id
+            self.version += 1
+
+    def add_edge(self, item1: Location, item2: Location, weight: Optional[float] = None) -> None:
         """Add an edge between the two vertices with the given items in this graph.
 
+        The edge is weighted by the given distance in meters, or by the distance between the two
+        locations if no weight is given.
+
         Raise a ValueError if item1 or item2 do not appear as vertices in this graph.
 
         Preconditions:
             - item1 != item2
         """
-        if item1.name in self._vertices and item2.name in self._vertices:
-            v1 = self._vertices[item1.name]
-            v2 = self._vertices[item2.name]
+        if item1.name in self._ids and item2.name in self._ids:
+            id1 = self._ids[item1.name]
+            id2 = self._ids[item2.name]
+
+            if self._edge_weight(id1, id2) is None:
+                if weight is None:
+                    weight = get_distance(item1, item2)
 
-            v1.neighbours.add(v2)
-            v2.neighbours.add(v1)
+                self._extra.setdefault(id1, {})[id2] = weight
+                self._extra.setdefault(id2, {})[id1] = weight
+                self.version += 1
         else:
             raise ValueError
 
+    def add_edges(self, ids1: np.ndarray, ids2: np.ndarray, weights: np.ndarray) -> None:
+        """Add an edge between the vertices with ids ids1[k] and ids2[k], weighted by
+        weights[k] meters, for every k.
+
+        This rebuilds the CSR arrays once for all the new edges, so it is much faster than calling
+        add_edge for each of them.
+
+        Preconditions:
+            - len(ids1) == len(ids2) == len(weights)
+            - all(ids1[k] != ids2[k] for k in range(len(ids1)))
+            - every id belongs to a vertex of this graph
+        """
+        rows, columns, old_weights = self._edge_arrays()
+        rows = np.concatenate((rows, ids1, ids2))
+        columns = np.concatenate((columns, ids2, ids1))
+        weights = np.concatenate((old_weights, weights, weights))
+
+        self._set_edges(len(self._locations), rows, columns, weights)
+        self._extra = {}
+        self.version += 1
+
+    def remove_vertex(self, location: Location) -> None:
+        """Remove the vertex with the given item from this graph, along with all of its edges.
+
+        Raise a ValueError if the item does not appear as a vertex in this graph.
+        """
+        if location.name not in self._ids:
+            raise ValueError
+
+        vertex_id = self._ids.pop(location.name)
+
+        for u in self._extra.pop(vertex_id, {}):
+            del self._extra[u][vertex_id]
+            if not self._extra[u]:
+                del self._extra[u]
+
+        self._locations[vertex_id] = None
+        self._views[vertex_id] = None
+        if vertex_id < len(self._indptr) - 1:
+            self._removed.add(vertex_id)
+        else:
+            self._free.append(vertex_id)
+
+        self.version += 1
+
     def adjacent(self, item1: Location, item2: Location) -> bool:
         """Return whether item1 and item2 are adjacent vertices in this graph.
 
         Return False if item1 or item2 do not appear as vertices in this graph.
         """
-        if item1.name in self._vertices and item2 .name in self._vertices:
-            v1 = self._vertices[item1.name]
-            return any(v2.location == item2 for v2 in v1.neighbours)
+        if item1.name in self._ids and item2 .name in self._ids:
+            return self._edge_weight(self._ids[item1.name], self._ids[item2.name]) is not None
         else:
             return False
 
+    def edge_weight(self, item1: Location, item2: Location) -> float:
+        """Return the weight of the edge between item1 and item2, which is the distance between
+        them in meters.
+
+        Raise a ValueError if item1 and item2 are not adjacent vertices in this graph.
+        """
+        weight = None
+        if item1.name in self._ids and item2.name in self._ids:
+            weight = self._edge_weight(self._ids[item1.name], self._ids[item2.name])
+
+        if weight is None:
+            raise ValueError
+
+        return weight
+
+    def walking_time(self, item1: Location, item2: Location) -> float:
+        """Return the time in minutes it takes to walk along the edge between item1 and item2.
+
+        Raise a ValueError if item1 and item2 are not adjacent vertices in this graph.
+        """
+        return self.edge_weight(item1, item2) / WALKING_SPEED
+
+    def id_of(self, location: Location) -> int:
+        """Return the id of the vertex with the given item.
+
+        Raise a KeyError if the item does not appear as a vertex in this graph.
+        """
+        return self._ids[location.name]
+
+    def location_of(self, vertex_id: int) -> Location:
+        """Return the location of the vertex with the given id.
+
+        Preconditions:
+            - the vertex with the given id was not removed
+        """
+        return self._locations[vertex_id]
+
+    def vertex_of(self, vertex_id: int) -> _Vertex:
+        """Return the vertex with the given id.
+
+        Preconditions:
+            - the vertex with the given id was not removed
+        """
+        return self._views[vertex_id]
+
+    def neighbour_ids(self, vertex_id: int) -> list[int]:
+        """Return the ids of the neighbours of the vertex with the given id."""
+        neighbours = []
+
+        if vertex_id < len(self._indptr) - 1:
+            neighbours = self._indices[self._indptr[vertex_id]:self._indptr[vertex_id + 1]]\
+                .tolist()
+            if self._removed:
+                neighbours = [u for u in neighbours if u not in self._removed]
+
+        if vertex_id in self._extra:
+            neighbours.extend(sorted(self._extra[vertex_id]))
+
+        return neighbours
+
+    def neighbourhood(self, location: Location, depth: int,
+                      expand: Optional[Callable[[Location], bool]] = None) -> list[Location]:
+        """Return the locations at most depth edges away from the given location, in
+        breadth-first order. The given location itself is not included.
+
+        If expand is given, the search only continues through the locations for which it returns
+        True, although the other locations are still included.
+
+        The search is iterative and marks visited vertices in a bitset indexed by id, so it only
+        takes time proportional to the edges it actually looks at.
+        """
+        start = self._ids[location.name]
+        visited = bytearray(len(self._locations))
+        visited[start] = 1
+
+        # ACCUMULATORS: the ids of the vertices found so far, and the number of levels searched
+        found = []
+        frontier = [start]
+        levels = 0
+
+        while frontier and levels < depth:
+            levels += 1
+            next_frontier = []
+
+            for v in frontier:
+                for u in self.neighbour_ids(v):
+                    if not visited[u]:
+                        visited[u] = 1
+                        found.append(u)
+                        if expand is None or expand(self._locations[u]):
+                            next_frontier.append(u)
+
+            frontier = next_frontier
+
+        instrumentation.count('vertices_visited', len(found))
+        instrumentation.maximum('search_depth', levels)
+        return [self._locations[u] for u in found]
+
+    def export_adjacency(self) -> tuple[list[Location], np.ndarray, np.ndarray, np.ndarray]:
+        """Return the locations of this graph, in the order they were added, along with its edges
+        in compressed sparse row (CSR) form, as a tuple (locations, indptr, indices, weights).
+
+        The neighbours of the i-th location are the locations at the positions
+        indices[indptr[i]:indptr[i + 1]], and the weights of those edges are at the same positions
+        in weights.
+        """
+        live = [i for i in range(0, len(self._locations)) if self._locations[i] is not None]
+
+        # renumber the vertices so that there are no gaps left by removed vertices
+        positions = np.full(len(self._locations), -1, dtype=np.int64)
+        positions[live] = np.arange(len(live))
+
+        rows, columns, weights = self._edge_arrays()
+        indptr, indices, weights = _compress(len(live), positions[rows], positions[columns],
+                                             weights)
+
+        return ([self._locations[i] for i in live], indptr, indices, weights)
+
+    def import_adjacency(self, indptr: np.ndarray, indices: np.ndarray,
+                         weights: np.ndarray) -> None:
+        """Set the edges of this graph to the ones given in compressed sparse row (CSR) form,
+        where positions refer to the vertices of this graph in the order they were added.
+
+        Preconditions:
+            - len(indptr) == len(self) + 1
+            - len(indices) == len(weights)
+            - no vertex was removed from this graph
+            - the edges are symmetric: j is a neighbour of i exactly when i is a neighbour of j,
+                and both edges have the same weight
+            - the neighbours of every vertex are in increasing order
+        """
+        self._indptr = indptr
+        self._indices = indices
+        self._weights = weights
+        self._extra = {}
+        self.version += 1
+
     def get_vertex_str(self, location: str) -> _Vertex:
         """Returns the vertex searched for.
         """
-        return self._vertices[location]
+        return self._views[self._ids[location]]
 
-    def get_neighbors_str(self, location: str) -> set:
-        """Returns set of neighbors from given vertex
+    def get_neighbors_str(self, location: str) -> list:
+        """Returns list of neighbors from given vertex
         """
-        return self._vertices[location].neighbours
+        return self._views[self._ids[location]].neighbours
 
     def get_vertex(self, location: Location) -> _Vertex:
         """Returns the vertex searched for.
         """
-        return self._vertices[location.name]
+        return self._views[self._ids[location.name]]
+
+    def get_neighbors(self, location: Location) -> list:
+        """Returns list of neighbors from given vertex
+        """
+        return self._views[self._ids[location.name]].neighbours
+
+    def _edge_weight(self, id1: int, id2: int) -> Optional[float]:
+        """Return the weight of the edge between the vertices with ids id1 and id2, or None if
+        they are not adjacent.
 
-    def get_neighbors(self, location: Location) -> set:
-        """Returns set of neighbors from given vertex
+        The neighbours of id1 in the CSR arrays are sorted, so id2 is found among them with a
+        binary search, which takes O(log d) time for d neighbours and does not change this graph.
         """
-        return self._vertices[location.name].neighbours
+        if id2 in self._removed:
+            return None
+
+        extra = self._extra.get(id1)
+        if extra is not None and id2 in extra:
+            return extra[id2]
+
+        if id1 >= len(self._indptr) - 1:
+            return None
+
+        start, end = int(self._indptr[id1]), int(self._indptr[id1 + 1])
+        k = start + int(self._indices[start:end].searchsorted(id2))
+
+        if k < end and self._indices[k] == id2:
+            return float(self._weights[k])
+        else:
+            return None
+
+    def _edge_arrays(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Return three arrays (rows, columns, weights) of the same length, so that there is an
+        edge from the vertex with id rows[k] to the vertex with id columns[k] weighted by
+        weights[k], for every k.
+
+        Edges of removed vertices are not included.
+        """
+        rows = [np.repeat(np.arange(len(self._indptr) - 1), np.diff(self._indptr))]
+        columns = [self._indices.astype(np.int64)]
+        weights = [self._weights]
+
+        for u, neighbours in self._extra.items():
+            rows.append(np.full(len(neighbours), u, dtype=np.int64))
+            columns.append(np.fromiter(neighbours.keys(), dtype=np.int64, count=len(neighbours)))
+            weights.append(np.fromiter(neighbours.values(), dtype=np.float32,
+                                       count=len(neighbours)))
+
+        rows = np.concatenate(rows)
+        columns = np.concatenate(columns)
+        weights = np.concatenate(weights)
+
+        if self._removed:
+            removed = np.fromiter(self._removed, dtype=np.int64, count=len(self._removed))
+            keep = ~(np.isin(rows, removed) | np.isin(columns, removed))
+            rows, columns, weights = rows[keep], columns[keep], weights[keep]
+
+        return (rows, columns, weights)
+
+    def _set_edges(self, n: int, rows: np.ndarray, columns: np.ndarray,
+                   weights: np.ndarray) -> None:
+        """Replace the CSR arrays of this graph with the given weighted edges between n
+        vertex ids.
+        """
+        self._indptr, self._indices, self._weights = _compress(n, rows, columns, weights)
+
+        # removed vertices no longer have any edges in the new arrays
+        self._free.extend(self._removed)
+        self._removed = set()
+
+
+def _compress(n: int, rows: np.ndarray, columns: np.ndarray, weights: np.ndarray)\
+        -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Return the edges from rows[k] to columns[k] between n vertices in compressed sparse row
+    (CSR) form, with the neighbours of each vertex sorted and without duplicate edges.
+
+    The weights of the edges are returned as a third array, in the same order as the indices. If
+    an edge appears more than once, the weight of its first appearance is kept.
+    """
+    keys = rows.astype(np.int64) * n + columns
+    order = np.argsort(keys, kind='stable')
+    keys = keys[order]
+    weights = weights[order]
+
+    if len(keys) > 0:
+        first = np.concatenate(([True], keys[1:] != keys[:-1]))
+        keys, weights = keys[first], weights[first]
+    rows, columns = keys // n, keys % n
+
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=n), out=indptr[1:])
+
+    return (indptr, columns.astype(np.int32), weights.astype(np.float32))
 
 
 class CityLocations(Graph):
     """A graph representing all the locations in the city and how close they are to each other.
 
+    The graph is built once without any hotel. The hotel the user is staying at, or any other
+    starting point, is attached for a single request and detached afterwards, which only adds and
+    removes the edges of that one vertex.
+
     Instance Attributes:
         - hotel: the hotel that the user is staying at
     """
     hotel: Optional[Hotel]
+    # Private Instance Attributes:
+    #     - _index:
+    #         A spatial index of the vertices in this graph, keyed by id. It is only built the
+    #         first time a location is attached.
+    #     - _stations:
+    #         An index of the subway stations in this graph, built the first time it is needed.
+    #     - _nearest_stations:
+    #         Maps the item of every vertex that is not a subway station to the closest subway
+    #         station, computed the first time it is needed.
+    #     - _candidates:
+    #         An index of the landmarks and restaurants in this graph, with their ratings and
+    #         opening hours, built the first time it is needed.
+    _index: Optional[GridIndex]
+    _stations: Optional[NearestIndex]
+    _nearest_stations: Optional[dict[str, SubwayStation]]
+    _candidates: Optional[CandidateIndex]
 
     def __init__(self) -> None:
         """Initialize an empty graph (no vertices or edges)."""
         Graph.__init__(self)
         self.hotel = None
+        self._index = None
+        self._stations = None
+        self._nearest_stations = None
+        self._candidates = None
+
+    def add_vertex(self, location: Location) -> None:
+        """Add a vertex with the given item to this graph.
+
+        The new vertex is not adjacent to any other vertices.
+        Do nothing if the given item is already in this graph.
+        """
+        Graph.add_vertex(self, location)
+
+        if self._index is not None:
+            self._index.insert(self._ids[location.name], location.location)
+
+        if isinstance(location, SubwayStation):
+            self._stations = None
+            self._nearest_stations = None
+        elif isinstance(location, (Landmark, Restaurant)):
+            self._candidates = None
+
+    def remove_vertex(self, location: Location) -> None:
+        """Remove the vertex with the given item from this graph, along with all of its edges.
+
+        Raise a ValueError if the item does not appear as a vertex in this graph.
+        """
+        vertex_id = self._ids.get(location.name)
+        Graph.remove_vertex(self, location)
+
+        if self._index is not None:
+            self._index.remove(vertex_id)
+
+        if isinstance(location, SubwayStation):
+            self._stations = None
+            self._nearest_stations = None
+        elif isinstance(location, (Landmark, Restaurant)):
+            self._candidates = None
+
+    def nearest_stations(self, location: Location, k: int = 1) -> list[SubwayStation]:
+        """Return the k subway stations closest to the given location, from closest to furthest.
+
+        The location does not need to be in this graph. Return fewer than k stations if this
+        graph does not have that many.
+        """
+        if self._stations is None:
+            self._stations = NearestIndex(self.get_all_vertices(SubwayStation))
+
+        return [station for station, _ in self._stations.nearest(location.location, k)]
+
+    def nearest_station_map(self) -> dict[str, SubwayStation]:
+        """Return a mapping from the item of every vertex in this graph that is not a subway
+        station to its closest subway station.
+
+        This is computed once and then reused, until a subway station is added or removed. The
+        mapping is empty if there are no subway stations in this graph.
+        """
+        if self._nearest_stations is None:
+            if self._stations is None:
+                self._stations = NearestIndex(self.get_all_vertices(SubwayStation))
+
+            others = [loc for loc in self._locations
+                      if loc is not None and not isinstance(loc, SubwayStation)]
+            if len(self._stations) == 0:
+                others = []
+
+            closest = self._stations.nearest_to_each(others)
+            self._nearest_stations = {others[i].name: closest[i] for i in range(0, len(others))}
+
+        return self._nearest_stations
+
+    def open_locations(self, locations: list[Location], start: datetime, end: datetime)\
+            -> list:
+        """Return the given locations that are open at some point between the start and end
+        datetimes, both included, in the same order.
+
+        All the locations are checked at once using the opening hours index of this graph.
+
+        Preconditions:
+            - all(isinstance(loc, (Landmark, Restaurant)) for loc in locations)
+            - all(loc in self.get_all_vertices() for loc in locations)
+        """
+        index = self._candidate_index()
+        is_open = index.opening_hours.open_during(start, end, index.positions_of(locations))
+
+        return [locations[i] for i in np.flatnonzero(is_open)]
+
+    def candidates(self, point: tuple[float, float], radius_m: float,
+                   open_during: Optional[tuple[datetime, datetime]] = None,
+                   kind: Optional[type] = None, top_k: Optional[int] = None,
+                   exclude: Optional[set[str]] = None) -> list:
+        """Return the landmarks and restaurants of this graph at most radius_m meters away from
+        the given (latitude, longitude) point, from highest to lowest rating.
+
+        If open_during is a pair of datetimes (start, end), only return the places that are open
+        at some point between start and end. If kind is given, only return the places of that
+        kind. If exclude is given, never return the places with those names. If top_k is given,
+        return at most top_k places.
+
+        This does not walk the edges of the graph, so the places found only depend on their
+        distance to the point.
+        """
+        return self._candidate_index().query(point, radius_m, open_during, kind, top_k, exclude)
+
+    def attach(self, location: Location) -> None:
+        """Add the given location to this graph, along with an edge to every location that is at
+        most PROXIMITY_THRESHOLD meters away from it.
+
+        Only the locations in the neighbouring cells of the spatial index are compared, so this
+        does not depend on the size of the graph.
+
+        Unless the location is a subway station, this does not change the version of this graph:
+        only the edges of the new location are added, so nothing computed about the other
+        vertices becomes outdated.
+
+        Raise a ValueError if this graph already has a location with the same name.
+        """
+        if location.name in self._ids:
+            raise ValueError('There is already a location named ' + location.name
+                             + ' in this graph')
+
+        if self._index is None:
+            self._index = build_grid_index({self._ids[loc.name]: loc.location
+                                            for loc in self.get_all_vertices()},
+                                           PROXIMITY_THRESHOLD)
+
+        candidates = [self._locations[vertex_id]
+                      for vertex_id in self._index.nearby(location.location, PROXIMITY_THRESHOLD)]
+        version = self.version
+
+        self.add_vertex(location)
+
+        if candidates:
+            candidate_distances = distances_from(location.location,
+                                                 coordinates_array(candidates))
+            for i in np.flatnonzero(candidate_distances <= PROXIMITY_THRESHOLD):
+                self.add_edge(location, candidates[i], float(candidate_distances[i]))
+
+        if not isinstance(location, SubwayStation):
+            self.version = version
+
+    def detach(self, location: Location) -> None:
+        """Remove the given location that was previously attached to this graph.
+
+        If it is the hotel the user is staying at, the graph no longer has a hotel. Like attach,
+        this only changes the version of this graph if the location is a subway station.
+        """
+        version = self.version
+        self.remove_vertex(location)
+
+        if not isinstance(location, SubwayStation):
+            self.version = version
+
+        if self.hotel is not None and self.hotel.name == location.name:
+            self.hotel = None
+
+    def attach_hotel(self, hotel: Hotel) -> None:
+        """Attach the hotel the user is staying at to this graph.
+
+        The given hotel is not changed: a copy of it with staying set to True is attached instead,
+        and becomes self.hotel.
+
+        Raise a ValueError if this graph already has a location with the same name.
+
+        Preconditions:
+            - self.hotel is None
+        """
+        staying = dataclasses.replace(hotel, staying=True)
+        self.attach(staying)
+        self.hotel = staying
+
+    @contextmanager
+    def attached(self, location: Location) -> Iterator[Location]:
+        """Attach the given location to this graph for the duration of a with statement.
+
+        If the location is a hotel, it becomes the hotel the user is staying at, and the copy of
+        it attached by attach_hotel is the one given to the with statement.
+
+        Raise a ValueError if this graph already has a location with the same name.
+        """
+        if isinstance(location, Hotel):
+            self.attach_hotel(location)
+            location = self.hotel
+        else:
+            self.attach(location)
+
+        try:
+            yield location
+        finally:
+            self.detach(location)
+
+    def _candidate_index(self) -> CandidateIndex:
+        """Return the index of the landmarks and restaurants of this graph, building it if
+        needed.
+        """
+        if self._candidates is None:
+            self._candidates = CandidateIndex([loc for loc in self._locations
+                                               if isinstance(loc, (Landmark, Restaurant))])
+
+        return self._candidates
 
     def get_all_vertices(self, kind: Optional[Callable] = None) -> list:
         """Return a set of all vertex items in this graph.
@@ -129,22 +717,32 @@ class CityLocations(Graph):
             - kind in {'', 'Landmark', 'Restaurant', 'SubwayStation'}
         """
         if kind is not None:
-            return [v.location for v in self._vertices.values() if isinstance(v.location, kind)]
+            return [loc for loc in self._locations if loc is not None and isinstance(loc, kind)]
         else:
-            return [v.location for v in self._vertices.values()]
+            return [loc for loc in self._locations if loc is not None]
 
 
 class SubwayLines(Graph):
     """A graph representing the city's subway network
 
+    Instance Attributes:
+        - transit: the line-aware model of the network used to find routes, where each station
+            has a separate platform for every line serving it
+
     Representation Invariants:
-        - all(isinstance(self._vertices[v].item, SubwayStation) for v in self._vertices)
+        - all(isinstance(loc, SubwayStation) for loc in self.get_all_vertices())
     """
+    transit: Optional[TransitNetwork]
+
+    def __init__(self) -> None:
+        """Initialize an empty graph (no vertices or edges)."""
+        Graph.__init__(self)
+        self.transit = None
 
     def get_all_vertices(self) -> list:
         """Return a set of all Location objects of vertices in this graph.
         """
-        return [v.location for v in self._vertices.values()]
+        return [loc for loc in self._locations if loc is not None]
 
 
 def get_distance(l1: Location, l2: Location) -> float:
@@ -153,6 +751,8 @@ def get_distance(l1: Location, l2: Location) -> float:
     This uses the haversine formula found here:
     https://www.movable-type.co.uk/scripts/latlong.html
     """
+    instrumentation.count('distance_evaluations')
+
     # geographical coordinates
     lat1, lon1 = l1.location
     lat2, lon2 = l2.location
@@ -178,6 +778,7 @@ def get_distance(l1: Location, l2: Location) -> float:
     return d
 
 
+@instrumentation.timed('load_city_graph')
 def load_city_graph(landmarks_file: str, restaurants_file: str, subway_file: str, hotel: Hotel)\
         -> CityLocations:
     """Return a graph representing the locations in the city.
@@ -185,10 +786,31 @@ def load_city_graph(landmarks_file: str, restaurants_file: str, subway_file: str
     This will include all points of interest. However, only one hotel will be included: the one the
     user is staying at currently.
 
-    An edge is drawn between two locations if there is a distance of at most 1 km between them.
+    An edge is drawn between two locations if there is a distance of at most
+    PROXIMITY_THRESHOLD meters between them.
+
+    Preconditions:
+        - landmarks_file is the path to a CSV file corresponding to data about local attractions
+        - restaurants_file is a path to a CSV file corresponding to data about restaurants
+        - subway_file is a path to a CSV file corresponding to data about subway stations
+    """
+    city_graph = load_base_city_graph(landmarks_file, restaurants_file, subway_file)
+
+    # add hotel
+    city_graph.attach_hotel(hotel)
+
+    return city_graph
+
+
+@instrumentation.timed('load_base_city_graph')
+def load_base_city_graph(landmarks_file: str, restaurants_file: str, subway_file: str)\
+        -> CityLocations:
+    """Return a graph representing the locations in the city, without any hotel.
+
+    This graph does not depend on the user, so it can be built once and shared between many
+    requests, each attaching its own hotel with CityLocations.attached.
 
     Preconditions:
-        - hotel.staying is True
         - landmarks_file is the path to a CSV file corresponding to data about local attractions
         - restaurants_file is a path to a CSV file corresponding to data about restaurants
         - subway_file is a path to a CSV file corresponding to data about subway stations
@@ -212,25 +834,50 @@ def load_city_graph(landmarks_file: str, restaurants_file: str, subway_file: str
             new_subway = SubwayStation(subway[1], (float(subway[2]), float(subway[3])))
             city_graph.add_vertex(new_subway)
 
-        # add hotel
-        hotel.staying = True
-        city_graph.add_vertex(hotel)
-        city_graph.hotel = hotel
-
     # add edges
-    print('Adding edges by geographical proximity....')
-    vertices = list(city_graph.get_all_vertices())
-    for i in range(0, len(vertices)):
-        for j in range(i + 1, len(vertices)):
-            assert vertices[i] != vertices[j]
-
-            d = get_distance(vertices[i], vertices[j])
-            if d <= 1500:
-                city_graph.add_edge(vertices[i], vertices[j])
+    add_proximity_edges(city_graph)
 
     return city_graph
 
 
+@instrumentation.timed('add_proximity_edges')
+def add_proximity_edges(city_graph: CityLocations) -> None:
+    """Add an edge between every two locations in city_graph that are at most
+    PROXIMITY_THRESHOLD meters apart.
+
+    A grid index is used so that only locations in neighbouring cells are compared, instead of
+    every pair of locations in the graph. The distances between two cells are computed in bulk.
+    """
+    vertices = city_graph.get_all_vertices()
+    ids = np.array([city_graph.id_of(v) for v in vertices], dtype=np.int64)
+    coordinates = coordinates_array(vertices)
+    index = build_grid_index({i: vertices[i].location for i in range(0, len(vertices))},
+                             PROXIMITY_THRESHOLD)
+
+    # ACCUMULATORS: the positions in vertices of the two ends of each edge, and its length
+    ends1 = []
+    ends2 = []
+    lengths = []
+
+    # compare the locations of each cell to the locations of its neighbouring cells at once
+    for keys, others in index.cell_blocks():
+        block = distance_matrix(coordinates[keys], coordinates[others])
+        close = block <= PROXIMITY_THRESHOLD
+        if others is keys:
+            # only keep each pair inside of the cell once, and never a location with itself
+            close = np.triu(close, 1)
+
+        rows, columns = np.nonzero(close)
+        ends1.append(np.array(keys)[rows])
+        ends2.append(np.array(others)[columns])
+        lengths.append(block[rows, columns])
+
+    if ends1:
+        city_graph.add_edges(ids[np.concatenate(ends1)], ids[np.concatenate(ends2)],
+                             np.concatenate(lengths))
+
+
+@instrumentation.timed('add_attractions')
 def add_attractions(city_graph: CityLocations, landmarks_file: str) -> None:
     """Adds landmarks from landmarks_file to the graph"""
     with open(landmarks_file, encoding='utf-8') as landmarks:
@@ -238,7 +885,6 @@ def add_attractions(city_graph: CityLocations, landmarks_file: str) -> None:
         landmarks_reader = csv.reader(landmarks)
 
         # add landmark vertices
-        print('Adding vertices....')
         for landmark in landmarks_reader:
             operation_times = get_opening_times(landmark[8:22])
             new_landmark = Landmark(landmark[1], (float(landmark[5]), float(landmark[6])),
@@ -246,6 +892,7 @@ def add_attractions(city_graph: CityLocations, landmarks_file: str) -> None:
             city_graph.add_vertex(new_landmark)
 
 
+@instrumentation.timed('add_restaurants')
 def add_restaurants(city_graph: CityLocations, restaurants_file: str) -> None:
     """"Adds restaurants from restaurants_file to the grpah"""
     with open(restaurants_file, encoding='utf-8') as restaurants:
@@ -279,14 +926,22 @@ def get_opening_times(times: list) -> dict:
     return operation_times
 
 
-def load_subway_graph(subway_file: str, subway_lines_file: str) -> SubwayLines:
+@instrumentation.timed('load_subway_graph')
+def load_subway_graph(subway_file: str, subway_lines_file: str, precompute_routes: bool = False,
+                      transfer_penalty: float = TRANSFER_PENALTY) -> SubwayLines:
     """Return a graph representing the subway network of the city.
 
-    Stations are connected together if they are along the same line.
+    Stations are connected together if they are along the same line. The graph also holds a
+    line-aware model of the network, where transferring between two lines costs an extra
+    transfer_penalty seconds.
+
+    If precompute_routes is True, the shortest routes between every pair of platforms are also
+    computed and stored in that model.
 
     Preconditions:
         - subway_file is a CSV file corresponding to the subway stations in the city
-        - subway_lines_file is a CSV file detailing how the stations are linked together
+        - subway_lines_file is a CSV file detailing how the stations are linked together, along
+            with the time in seconds it takes to travel between them
     """
     # initialize the graph
     subway_graph = SubwayLines()
@@ -298,6 +953,9 @@ def load_subway_graph(subway_file: str, subway_lines_file: str) -> SubwayLines:
         lines_reader = csv.reader(lines)
 
         ids_to_objects = {}  # accumulator
+        ids_to_platforms = {}  # accumulator
+        platforms = []  # accumulator
+        edges = []  # accumulator
 
         # add vertices
         for subway in subway_reader:
@@ -307,6 +965,10 @@ def load_subway_graph(subway_file: str, subway_lines_file: str) -> SubwayLines:
             subway_graph.add_vertex(new_subway)
             ids_to_objects[int(subway[0])] = new_subway  # subway[0] is the station_id
 
+            # every row is the platform of one line at that station
+            ids_to_platforms[int(subway[0])] = len(platforms)
+            platforms.append(new_subway)
+
         # add edges
         for row in lines_reader:
             # get the stations corresponding to those three ids
@@ -315,14 +977,28 @@ def load_subway_graph(subway_file: str, subway_lines_file: str) -> SubwayLines:
 
             subway_graph.add_edge(station1, station2)
 
+            # row[2] is the travel time in seconds
+            edges.append((ids_to_platforms[int(row[0])], ids_to_platforms[int(row[1])],
+                          float(row[2])))
+
+    subway_graph.transit = build_transit_network([p.name for p in platforms],
+                                                 [p.location for p in platforms],
+                                                 edges, transfer_penalty)
+
+    if precompute_routes:
+        subway_graph.transit.routes = subway_graph.transit.build_route_table()
+
     return subway_graph
 
 
 if __name__ == "__main__":
     import python_ta
     python_ta.check_all(config={
-        'extra-imports': ['location', 'datetime', 'math', 'csv'],
-        'allowed-io': ['load_city_graph', 'load_subway_graph',
+        'extra-imports': ['location', 'datetime', 'math', 'csv', 'contextlib', 'dataclasses',
+                          'numpy', 'spatial_index', 'distances', 'nearest', 'candidates',
+                          'transit', 'instrumentation'],
+        # the functions that open the CSV files, since none of them print anymore
+        'allowed-io': ['load_base_city_graph', 'load_subway_graph',
                        'add_attractions', 'add_restaurants'],
         'max-line-length': 100,
         'disable': ['E1136']
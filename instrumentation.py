@@ -0,0 +1,362 @@
+"""This module records where the time of the program goes: how long each stage takes, and how many
+operations of each kind it does, such as distance evaluations or vertices visited by a search.
+
+Stages are nested, so a stage entered while another one is running is recorded as part of it, and
+a stage entered many times, such as choosing the locations of every trip a planner plans, is
+recorded once with its number of calls and its total time. Counters are added to the stage that
+is running when they are counted. Each thread keeps its own counters for its running stages, and
+adds them to the record when the stage ends, so counting does not wait for other threads.
+
+Stages can also be profiled with cProfile, or have the memory they allocate traced with
+tracemalloc, by giving their names to Instrumentation.profiled or Instrumentation.traced. Neither
+is done by default, since both slow the program down.
+
+Nothing is printed. The start and end of every stage are logged at the INFO level, and the whole
+record can be returned as a dictionary that can be converted to JSON with Instrumentation.report.
+
+This file is Copyright (c) 2021 Leen Al Lababidi, Michael Rubenstein, Maria Becerra and Nada Eldin
+"""
+from __future__ import annotations
+from typing import Callable, ContextManager, Iterator, Optional
+from contextlib import contextmanager
+import cProfile
+import functools
+import logging
+import pstats
+import threading
+import time
+import tracemalloc
+
+# the number of functions, with the highest cumulative time, listed in the profile of a stage
+PROFILE_ENTRIES = 20
+
+logger = logging.getLogger(__name__)
+
+
+class Stage:
+    """A stage of the program, along with the stages that ran during it.
+
+    Instance Attributes:
+        - name: the name of this stage
+        - calls: the number of times this stage was entered
+        - seconds: the total wall time spent in this stage
+        - counters: the number of operations of each kind done during this stage, not counting
+            the stages nested in it
+        - maxima: the largest value of each quantity recorded during this stage, such as the
+            depth of a search
+        - children: the stages that ran during this stage, by name, in the order they first ran
+        - peak_memory: the most memory in bytes allocated at once during a call of this stage, or
+            None if it was not traced
+        - profile: the profile of the calls of this stage, or None if it was not profiled
+
+    Representation Invariants:
+        - self.calls >= 0
+        - self.seconds >= 0
+    """
+    name: str
+    calls: int
+    seconds: float
+    counters: dict[str, int]
+    maxima: dict[str, float]
+    children: dict[str, Stage]
+    peak_memory: Optional[int]
+    profile: Optional[cProfile.Profile]
+
+    def __init__(self, name: str) -> None:
+        """Initialize a stage with the given name that has not run yet."""
+        self.name = name
+        self.calls = 0
+        self.seconds = 0.0
+        self.counters = {}
+        self.maxima = {}
+        self.children = {}
+        self.peak_memory = None
+        self.profile = None
+
+    def totals(self) -> dict[str, int]:
+        """Return the number of operations of each kind done during this stage, including the
+        stages nested in it.
+        """
+        totals = dict(self.counters)
+
+        for child in self.children.values():
+            for name, count in child.totals().items():
+                totals[name] = totals.get(name, 0) + count
+
+        return totals
+
+    def to_json(self) -> dict:
+        """Return this stage and the stages nested in it as a dictionary that can be converted to
+        JSON. Only what was recorded is included.
+        """
+        result = {'name': self.name, 'calls': self.calls, 'seconds': self.seconds}
+
+        if self.counters:
+            result['counters'] = dict(self.counters)
+        if self.maxima:
+            result['maxima'] = dict(self.maxima)
+        if self.peak_memory is not None:
+            result['peak_memory'] = self.peak_memory
+        if self.profile is not None:
+            result['profile'] = _profile_entries(self.profile)
+        if self.children:
+            result['stages'] = [child.to_json() for child in self.children.values()]
+
+        return result
+
+
+class Instrumentation:
+    """Records the stages of a program and the operations they do.
+
+    Each thread has its own stack of running stages, but they are all recorded in the same
+    tree, so the stages of a planner running in another thread are recorded under the top level.
+
+    Instance Attributes:
+        - root: the top level of the program, which all other stages run during
+        - profiled: the names of the stages profiled with cProfile
+        - traced: the names of the stages whose memory is traced with tracemalloc
+    """
+    root: Stage
+    profiled: set[str]
+    traced: set[str]
+    # Private Instance Attributes:
+    #     - _lock: held while the tree of stages is changed or read
+    #     - _local: holds the stack of running stages of each thread, as the attribute stack, the
+    #         counters and maxima recorded by this thread in each running stage but the root, not
+    #         yet added to it, as the attributes counters and maxima, and whether a stage is being
+    #         profiled by this thread, as the attribute profiling
+    _lock: threading.Lock
+    _local: threading.local
+
+    def __init__(self, profiled: Optional[set[str]] = None,
+                 traced: Optional[set[str]] = None) -> None:
+        """Initialize an empty record, which profiles and traces the stages with the given names.
+        """
+        self.root = Stage('total')
+        self.profiled = set(profiled or ())
+        self.traced = set(traced or ())
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[Stage]:
+        """Record the code run inside this context manager as a call of the stage with the given
+        name, nested in the stage that is running, and yield that stage.
+
+        A stage is only profiled or traced if no stage it is nested in already is, since its
+        calls are then already part of that profile or trace.
+        """
+        stack = self._stack()
+        with self._lock:
+            current = stack[-1].children.get(name)
+            if current is None:
+                current = stack[-1].children[name] = Stage(name)
+        stack.append(current)
+        self._local.counters.append({})
+        self._local.maxima.append({})
+
+        if logger.isEnabledFor(logging.INFO):
+            logger.info('Started %s', '/'.join(s.name for s in stack[1:]))
+
+        profile = self._start_profile(current) if name in self.profiled else None
+        tracing = self._start_tracing() if name in self.traced else False
+
+        start = time.perf_counter()
+        try:
+            yield current
+        finally:
+            seconds = time.perf_counter() - start
+
+            if tracing:
+                peak_memory = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+            if profile is not None:
+                profile.disable()
+                self._local.profiling = False
+
+            counters = self._local.counters.pop()
+            maxima = self._local.maxima.pop()
+            with self._lock:
+                current.calls += 1
+                current.seconds += seconds
+                if tracing:
+                    current.peak_memory = max(current.peak_memory or 0, peak_memory)
+                _add_counters(current, counters, maxima)
+
+            if logger.isEnabledFor(logging.INFO):
+                logger.info('Finished %s in %.3f s', '/'.join(s.name for s in stack[1:]),
+                            seconds)
+            stack.pop()
+
+    def count(self, name: str, amount: int = 1) -> None:
+        """Add amount operations of the kind with the given name to the running stage.
+
+        They are added to the record when the running stage of this thread ends, or at once if
+        no stage is running.
+        """
+        stack = self._stack()
+        if len(stack) == 1:
+            with self._lock:
+                _add_counters(stack[0], {name: amount}, {})
+        else:
+            counters = self._local.counters[-1]
+            counters[name] = counters.get(name, 0) + amount
+
+    def maximum(self, name: str, value: float) -> None:
+        """Record value for the quantity with the given name in the running stage, if it is
+        larger than any value recorded for it there before.
+
+        Like counters, it is added to the record when the running stage of this thread ends, or
+        at once if no stage is running.
+        """
+        stack = self._stack()
+        if len(stack) == 1:
+            with self._lock:
+                _add_counters(stack[0], {}, {name: value})
+        else:
+            maxima = self._local.maxima[-1]
+            if name not in maxima or value > maxima[name]:
+                maxima[name] = value
+
+    def report(self) -> dict:
+        """Return everything recorded so far as a dictionary that can be converted to JSON.
+
+        The counters and maxima of the stages that are still running are not included yet.
+        """
+        with self._lock:
+            return self.root.to_json()
+
+    def totals(self) -> dict[str, int]:
+        """Return the number of operations of each kind recorded so far, in any stage.
+
+        The counters of the stages that are still running are not included yet.
+        """
+        with self._lock:
+            return self.root.totals()
+
+    def reset(self) -> None:
+        """Forget everything recorded so far.
+
+        Preconditions:
+            - no stage is running
+        """
+        with self._lock:
+            self.root = Stage('total')
+        self._local = threading.local()
+
+    def _stack(self) -> list[Stage]:
+        """Return the stack of running stages of the current thread, starting at the root."""
+        if not hasattr(self._local, 'stack'):
+            self._local.stack = [self.root]
+            self._local.counters = []
+            self._local.maxima = []
+            self._local.profiling = False
+        return self._local.stack
+
+    def _start_profile(self, current: Stage) -> Optional[cProfile.Profile]:
+        """Start profiling the given stage and return its profile, unless this thread is already
+        profiling a stage.
+        """
+        if self._local.profiling:
+            return None
+
+        if current.profile is None:
+            current.profile = cProfile.Profile()
+        self._local.profiling = True
+        current.profile.enable()
+        return current.profile
+
+    def _start_tracing(self) -> bool:
+        """Start tracing memory allocations and return True, unless they are already traced."""
+        if tracemalloc.is_tracing():
+            return False
+
+        tracemalloc.start()
+        return True
+
+
+def _add_counters(stage: Stage, counters: dict[str, int], maxima: dict[str, float]) -> None:
+    """Add the given counters to those of stage, and record the given maxima in it.
+
+    The lock of the record of stage must be held.
+    """
+    for name, amount in counters.items():
+        stage.counters[name] = stage.counters.get(name, 0) + amount
+
+    for name, value in maxima.items():
+        if name not in stage.maxima or value > stage.maxima[name]:
+            stage.maxima[name] = value
+
+
+def _profile_entries(profile: cProfile.Profile) -> list[dict]:
+    """Return the PROFILE_ENTRIES functions with the highest cumulative time in profile."""
+    stats = pstats.Stats(profile).stats
+    entries = sorted(stats.items(), key=lambda item: -item[1][3])[:PROFILE_ENTRIES]
+
+    return [{'function': file + ':' + str(line) + '(' + function + ')',
+             'calls': calls,
+             'total_time': total_time,
+             'cumulative_time': cumulative_time}
+            for (file, line, function), (_, calls, total_time, cumulative_time, _) in entries]
+
+
+# the record used by the functions of this module
+_instrumentation = Instrumentation()
+
+
+def default_instrumentation() -> Instrumentation:
+    """Return the record that the stages and counters of the program are recorded in."""
+    return _instrumentation
+
+
+def stage(name: str) -> ContextManager[Stage]:
+    """Record the code run inside this context manager as a call of the stage with the given
+    name, in the default record.
+    """
+    return _instrumentation.stage(name)
+
+
+def timed(name: str) -> Callable[[Callable], Callable]:
+    """Return a decorator recording every call of the function it decorates as a call of the
+    stage with the given name, in the default record.
+    """
+    def decorator(function: Callable) -> Callable:
+        """Return function, recording each of its calls as a stage."""
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs) -> object:
+            """Call the decorated function as a stage."""
+            with _instrumentation.stage(name):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def count(name: str, amount: int = 1) -> None:
+    """Add amount operations of the kind with the given name to the running stage of the default
+    record.
+    """
+    _instrumentation.count(name, amount)
+
+
+def maximum(name: str, value: float) -> None:
+    """Record value for the quantity with the given name in the running stage of the default
+    record, if it is larger than any value recorded for it there before.
+    """
+    _instrumentation.maximum(name, value)
+
+
+if __name__ == "__main__":
+    import python_ta
+    python_ta.check_all(config={
+        'extra-imports': ['contextlib', 'cProfile', 'functools', 'logging', 'pstats',
+                          'threading', 'time', 'tracemalloc'],
+        'allowed-io': [],  # the names (strs) of functions that call print/open/input
+        'max-line-length': 100,
+        'disable': ['E1136']
+    })
+
+    import python_ta.contracts
+    python_ta.contracts.DEBUG_CONTRACTS = False
+    python_ta.contracts.check_all_contracts()
@@ -2,10 +2,12 @@
 
 This file is Copyright (c) 2021 Leen Al Lababidi, Michael Rubenstein, Maria Becerra and Nada Eldin
 """
+import logging
 import input
 from location import Hotel
-import graphs
-import choose_locations
+import instrumentation
+import snapshot
+import orienteering
 import find_path
 import schedule
 import csv
@@ -13,51 +15,51 @@ import output
 
 
 if __name__ == "__main__":
+    # progress is logged on the console, along with the time each stage took
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+
     # get hotels
-    print('Retrieving hotels....')
-    hotels = {}
-    with open('data/paris-hotel.csv', encoding='utf-8') as hotel_file:
-        hotel_reader = csv.reader(hotel_file)
+    with instrumentation.stage('retrieve_hotels'):
+        hotels = {}
+        with open('data/paris-hotel.csv', encoding='utf-8') as hotel_file:
+            hotel_reader = csv.reader(hotel_file)
 
-        for row in hotel_reader:
-            new_hotel = Hotel(row[0], (float(row[3]), float(row[4])))
-            hotels[row[0]] = new_hotel
+            for row in hotel_reader:
+                new_hotel = Hotel(row[0], (float(row[3]), float(row[4])))
+                hotels[row[0]] = new_hotel
 
     # user input
-    print('Collecting user input....')
-    hotel_names = tuple(hotels.keys())
-    win_popup = input.open_input_window(hotel_names)
-    user_input = win_popup.user_input
+    with instrumentation.stage('collect_user_input'):
+        hotel_names = tuple(hotels.keys())
+        win_popup = input.open_input_window(hotel_names)
+        user_input = win_popup.user_input
 
     # process input
-    print('Processing user input....')
     chosen_hotel = hotels[user_input['hotel']]
     leave = user_input['leave']
     return_time = user_input['return']
 
     # load graphs
-    print('Loading city graph....')
-    city_graph = graphs.load_city_graph('data/paris-attraction-final.csv',
-                                        'data/paris-restaurant-organized-final.csv',
-                                        'data/paris_metro_stations.csv', chosen_hotel)
-    print('Loading subway stations graph....')
-    subway_graph = graphs.load_subway_graph('data/paris_metro_stations.csv',
-                                            'data/paris_metro_lines.csv')
-
-    # choose trip locations
-    print('Choosing locations to visit....')
-    chosen_locations = choose_locations.choose_locations(city_graph, chosen_hotel,
-                                                         leave, return_time)
+    city_graph = snapshot.load_base_city_graph('data/paris-attraction-final.csv',
+                                               'data/paris-restaurant-organized-final.csv',
+                                               'data/paris_metro_stations.csv')
+    city_graph.attach_hotel(chosen_hotel)
+    subway_graph = snapshot.load_subway_graph('data/paris_metro_stations.csv',
+                                              'data/paris_metro_lines.csv',
+                                              precompute_routes=True)
+
+    # choose trip locations, along with the times to visit them
+    visits = orienteering.choose_visits(city_graph, subway_graph, chosen_hotel, leave,
+                                        return_time)
 
     # find path
-    print('Finding route....')
-    path = find_path.find_path(chosen_locations, city_graph, subway_graph)
+    path = find_path.find_path([visit.location_visited for visit in visits], city_graph,
+                               subway_graph)
 
     # get schedule
-    print('Building schedule....')
-    schedule = schedule.build_schedule(path, leave, return_time)
+    schedule = schedule.build_schedule(path, leave, return_time, visits)
 
     # display output
-    print('Displaying output....')
-    output.show_path(path)
-    output.open_window_schedule(schedule)
+    with instrumentation.stage('display_output'):
+        output.show_path(path)
+        output.open_window_schedule(schedule)
@@ -0,0 +1,209 @@
+"""This module finds the fastest way between two locations of the city, walking and riding the
+subway in a single search.
+
+The search runs on one graph made of the platforms of the line-aware subway model, joined to the
+city graph at the stations: a location is linked to the stations it can walk to, each station is
+linked to the other stations close enough to walk to, and the start is linked straight to the
+destination when the two are close enough. Every edge is weighted by its time in seconds, so the
+route found compares walking and riding instead of always walking when that is possible.
+
+This file is Copyright (c) 2021 Leen Al Lababidi, Michael Rubenstein, Maria Becerra and Nada Eldin
+"""
+from __future__ import annotations
+from typing import Optional
+import heapq
+from location import Location, SubwayStation
+from graphs import CityLocations, SubwayLines, WALKING_SPEED
+from distances import point_distance
+import instrumentation
+
+
+class MultimodalRouter:
+    """Finds the fastest routes between locations of a city graph, walking or taking the subway.
+
+    Entering the subway from the street takes as long as a transfer between two lines, to account
+    for the wait for a train.
+
+    Instance Attributes:
+        - city_graph: the graph of the locations in the city, including the subway stations
+        - subway_graph: the graph of the subway network
+        - boarding_time: the time in seconds it takes to enter the subway from the street
+
+    Representation Invariants:
+        - self.subway_graph.transit is not None
+        - self.boarding_time >= 0
+    """
+    city_graph: CityLocations
+    subway_graph: SubwayLines
+    boarding_time: float
+    # Private Instance Attributes:
+    #     - _station_walks: maps the name of each station of the city graph that is in the subway
+    #         network to the names of the other such stations close enough to walk to, along with
+    #         the time in seconds it takes to walk there
+    #     - _version: the version of the city graph when _station_walks was computed, or None if
+    #         it was not computed yet
+    _station_walks: dict[str, list[tuple[str, float]]]
+    _version: Optional[int]
+
+    def __init__(self, city_graph: CityLocations, subway_graph: SubwayLines) -> None:
+        """Initialize a router between the locations of city_graph, using the subway network of
+        subway_graph.
+
+        Preconditions:
+            - subway_graph.transit is not None
+        """
+        self.city_graph = city_graph
+        self.subway_graph = subway_graph
+        self.boarding_time = subway_graph.transit.transfer_penalty
+        self._station_walks = {}
+        self._version = None
+
+    def route(self, location1: Location, location2: Location)\
+            -> Optional[tuple[float, list[SubwayStation]]]:
+        """Return the time in seconds of the fastest route from location1 to location2, along
+        with the subway stations it passes through, in order. The list of stations is empty if
+        the fastest route is to walk straight there.
+
+        A location is linked to every station close enough to walk to, or to its closest station
+        if there are none. The route from a location to itself takes no time and passes through
+        no station. Return None if there is no route between the two locations.
+
+        Preconditions:
+            - location1 in self.city_graph.get_all_vertices()
+            - location2 in self.city_graph.get_all_vertices()
+        """
+        if self.city_graph.id_of(location1) == self.city_graph.id_of(location2):
+            return (0.0, [])
+
+        transit = self.subway_graph.transit
+        station_walks = self._walks_between_stations()
+        target = len(transit.names)
+
+        # the time to walk from each station around location2 to location2
+        exits = dict(self._stations_around(location2))
+
+        # ACCUMULATORS: the fastest known time to each platform (and to the target), and the
+        # platform before it, which is -1 for the platforms reached from location1
+        best = {}
+        previous = {}
+
+        # priority queue of (time so far, platform or target)
+        queue = []
+
+        def reach(node: int, cost: float, before: int) -> None:
+            """Record that node can be reached in cost seconds, coming from before."""
+            if node not in best or cost < best[node]:
+                best[node] = cost
+                previous[node] = before
+                heapq.heappush(queue, (cost, node))
+
+        if self.city_graph.adjacent(location1, location2):
+            reach(target, self.city_graph.walking_time(location1, location2) * 60, -1)
+
+        for name, walk in self._stations_around(location1):
+            for p in transit.platforms_of(name):
+                reach(p, walk + self.boarding_time, -1)
+
+        finished = set()
+
+        while queue:
+            cost, p = heapq.heappop(queue)
+
+            if p == target:
+                instrumentation.count('vertices_visited', len(finished))
+
+                # follow the previous platforms back to the start
+                platforms = []
+                p = previous[p]
+                while p != -1:
+                    platforms.append(p)
+                    p = previous[p]
+                platforms.reverse()
+
+                stations = transit.route_stations(platforms)
+                return (cost, [self.subway_graph.get_vertex_str(name).location
+                               for name in stations])
+
+            if p in finished:
+                continue
+            finished.add(p)
+
+            # ride to the next platforms, or change lines
+            for k in range(transit.indptr[p], transit.indptr[p + 1]):
+                reach(int(transit.indices[k]), cost + float(transit.costs[k]), p)
+
+            # leave the subway, and walk to the destination or to another station
+            name = transit.names[p]
+            if name in exits:
+                reach(target, cost + exits[name], p)
+
+            for other, walk in station_walks.get(name, []):
+                for u in transit.platforms_of(other):
+                    reach(u, cost + walk + self.boarding_time, p)
+
+        instrumentation.count('vertices_visited', len(finished))
+        return None
+
+    def _stations_around(self, location: Location) -> list[tuple[str, float]]:
+        """Return the names of the subway stations close enough to walk to from the given
+        location, along with the time in seconds it takes to walk there. If there are none,
+        return the closest station instead.
+
+        A station is always close enough to walk to from itself.
+        """
+        location_id = self.city_graph.id_of(location)
+
+        # ACCUMULATOR: the stations found so far
+        stations = []
+
+        if isinstance(location, SubwayStation) and location.name in self._station_walks:
+            stations.append((location.name, 0.0))
+
+        for u in self.city_graph.neighbour_ids(location_id):
+            neighbour = self.city_graph.location_of(u)
+            if isinstance(neighbour, SubwayStation) and neighbour.name in self._station_walks:
+                stations.append((neighbour.name,
+                                 self.city_graph.walking_time(location, neighbour) * 60))
+
+        if not stations:
+            for station in self.city_graph.nearest_stations(location):
+                if station.name in self._station_walks:
+                    walk = point_distance(location.location, station.location) / WALKING_SPEED
+                    stations.append((station.name, walk * 60))
+
+        return stations
+
+    def _walks_between_stations(self) -> dict[str, list[tuple[str, float]]]:
+        """Return the walks between the subway stations of the city graph, computing them again
+        if the city graph changed since they were last computed.
+        """
+        if self._version != self.city_graph.version:
+            names = set(self.subway_graph.transit.names)
+            stations = [station for station in self.city_graph.get_all_vertices(SubwayStation)
+                        if station.name in names]
+            self._station_walks = {station.name: [] for station in stations}
+
+            for station in stations:
+                for u in self.city_graph.neighbour_ids(self.city_graph.id_of(station)):
+                    neighbour = self.city_graph.location_of(u)
+                    if isinstance(neighbour, SubwayStation) and neighbour.name in names:
+                        walk = self.city_graph.walking_time(station, neighbour) * 60
+                        self._station_walks[station.name].append((neighbour.name, walk))
+
+            self._version = self.city_graph.version
+
+        return self._station_walks
+
+
+if __name__ == "__main__":
+    import python_ta
+    python_ta.check_all(config={
+        'extra-imports': ['heapq', 'location', 'graphs', 'distances', 'instrumentation'],
+        'allowed-io': [],  # the names (strs) of functions that call print/open/input
+        'max-line-length': 100,
+        'disable': ['E1136']
+    })
+
+    import python_ta.contracts
+    python_ta.contracts.DEBUG_CONTRACTS = False
+    python_ta.contracts.check_all_contracts()
@@ -0,0 +1,102 @@
+"""This module contains an index used to find the locations closest to a given point, such as the
+subway stations closest to a landmark.
+
+This file is Copyright (c) 2021 Leen Al Lababidi, Michael Rubenstein, Maria Becerra and Nada Eldin
+"""
+from __future__ import annotations
+import numpy as np
+from location import Location
+from spatial_index import GridIndex, build_grid_index
+from distances import coordinates_array, distances_from, distance_matrix
+
+# the default width of the cells of the index, in meters
+CELL_SIZE = 500
+
+
+class NearestIndex:
+    """An index over a fixed collection of locations that answers k-nearest queries.
+
+    The locations are bucketed in a grid, and the cells are searched in rings of growing size
+    around the query point, so only the cells close to the answer are ever looked at.
+
+    Instance Attributes:
+        - locations: the locations in this index
+        - coordinates: the (latitude, longitude) of each of the locations
+    """
+    locations: list[Location]
+    coordinates: np.ndarray
+    # Private Instance Attributes:
+    #     - _grid: the grid of the positions of the locations in self.locations
+    _grid: GridIndex
+
+    def __init__(self, locations: list[Location], cell_size: float = CELL_SIZE) -> None:
+        """Initialize an index over the given locations."""
+        self.locations = locations
+        self.coordinates = coordinates_array(locations)
+        self._grid = build_grid_index({i: locations[i].location
+                                       for i in range(0, len(locations))}, cell_size)
+
+    def __len__(self) -> int:
+        """Return the number of locations in this index."""
+        return len(self.locations)
+
+    def nearest(self, point: tuple[float, float], k: int = 1) -> list[tuple[Location, float]]:
+        """Return the k locations closest to the given (latitude, longitude) point, along with
+        their distance to it in meters, from closest to furthest.
+
+        Return fewer than k locations if this index does not have that many.
+        """
+        k = min(k, len(self.locations))
+
+        # ACCUMULATORS: the positions of the locations seen so far and their distances
+        seen = []
+        seen_distances = np.empty(0)
+        ring = 0
+
+        while len(seen) < len(self.locations):
+            found = list(self._grid.ring(point, ring))
+
+            if found:
+                seen.extend(found)
+                seen_distances = np.concatenate(
+                    (seen_distances, distances_from(point, self.coordinates[found])))
+
+            # every location that was not seen yet is further away than this
+            covered = ring * self._grid.cell_size
+            if len(seen) >= k and np.count_nonzero(seen_distances <= covered) >= k:
+                break
+
+            ring += 1
+
+        closest = np.argsort(seen_distances, kind='stable')[:k]
+        return [(self.locations[seen[i]], float(seen_distances[i])) for i in closest]
+
+    def nearest_to_each(self, locations: list[Location]) -> list[Location]:
+        """Return the location of this index closest to each of the given locations.
+
+        Preconditions:
+            - len(self) > 0
+        """
+        closest = []
+
+        # compare in blocks, so the distance matrix stays small
+        for start in range(0, len(locations), 1024):
+            block = coordinates_array(locations[start:start + 1024])
+            positions = np.argmin(distance_matrix(block, self.coordinates), axis=1)
+            closest.extend(self.locations[i] for i in positions.tolist())
+
+        return closest
+
+
+if __name__ == "__main__":
+    import python_ta
+    python_ta.check_all(config={
+        'extra-imports': ['numpy', 'location', 'spatial_index', 'distances'],
+        'allowed-io': [],  # the names (strs) of functions that call print/open/input
+        'max-line-length': 100,
+        'disable': ['E1136']
+    })
+
+    import python_ta.contracts
+    python_ta.contracts.DEBUG_CONTRACTS = False
+    python_ta.contracts.check_all_contracts()
@@ -0,0 +1,198 @@
+"""This module contains a compact index of the opening hours of many locations, used to find which
+of them are open during a period of time in a single vectorized operation.
+
+Opening hours are stored as intervals of minutes since the start of the week (Sunday at midnight),
+instead of a dictionary of datetime.time objects for each location. A location that closes after
+midnight, such as one open from 1800 to 0030, has an interval that continues into the next day.
+
+This file is Copyright (c) 2021 Leen Al Lababidi, Michael Rubenstein, Maria Becerra and Nada Eldin
+"""
+from __future__ import annotations
+from typing import Optional
+import datetime
+import numpy as np
+from location import Location, Landmark, Restaurant
+
+DAYS = ['Sunday', 'Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday']
+
+MINUTES_PER_DAY = 24 * 60
+MINUTES_PER_WEEK = 7 * MINUTES_PER_DAY
+
+
+class OpeningHoursIndex:
+    """The opening hours of a sequence of locations, as intervals of minutes of the week.
+
+    Each location has one slot for every day of the week, and a second slot for every day that
+    wraps around the end of the week. An unused slot holds an empty interval.
+
+    Instance Attributes:
+        - opens: opens[i, k] is the minute of the week when the k-th interval of location i starts
+        - closes: closes[i, k] is the minute of the week when the k-th interval of location i ends
+
+    Representation Invariants:
+        - self.opens.shape == self.closes.shape
+    """
+    opens: np.ndarray
+    closes: np.ndarray
+
+    def __init__(self, opening_times: np.ndarray) -> None:
+        """Initialize an index from an array of shape (n, 7, 2), where opening_times[i, day] holds
+        the minutes since midnight when location i opens and closes on that day, or -1 if it is
+        closed on that day. Days start on Sunday, like DAYS.
+
+        A closing time before the opening time is on the next day, and a closing time equal to the
+        opening time means the location is open the whole day.
+        """
+        n = opening_times.shape[0]
+        days = np.arange(7) * MINUTES_PER_DAY
+        open_minutes = opening_times[:, :, 0].astype(np.int32)
+        close_minutes = opening_times[:, :, 1].astype(np.int32)
+
+        closed = open_minutes == -1
+        overnight = close_minutes <= open_minutes
+        close_minutes = close_minutes + overnight * MINUTES_PER_DAY
+
+        opens = np.empty((n, 14), dtype=np.int32)
+        closes = np.empty((n, 14), dtype=np.int32)
+        opens[:, :7] = days + open_minutes
+        closes[:, :7] = days + close_minutes
+
+        # the part of an interval that runs past the end of the week is moved to its start
+        opens[:, 7:] = opens[:, :7] - MINUTES_PER_WEEK
+        closes[:, 7:] = closes[:, :7] - MINUTES_PER_WEEK
+
+        # unused slots hold an interval that never overlaps any period
+        opens[:, :7][closed] = MINUTES_PER_WEEK + 1
+        closes[:, :7][closed] = -1
+        unused = closed | (closes[:, 7:] < 0)
+        opens[:, 7:][unused] = MINUTES_PER_WEEK + 1
+        closes[:, 7:][unused] = -1
+
+        self.opens = opens
+        self.closes = closes
+
+    def __len__(self) -> int:
+        """Return the number of locations in this index."""
+        return self.opens.shape[0]
+
+    def open_during(self, start: datetime.datetime, end: datetime.datetime,
+                    positions: np.ndarray = None) -> np.ndarray:
+        """Return a boolean array of whether each location is open at some point between start and
+        end, both included.
+
+        If positions is given, only the locations at those positions are checked, in that order.
+
+        Preconditions:
+            - start <= end
+            - end - start < datetime.timedelta(weeks=1)
+        """
+        opens, closes = self.opens, self.closes
+        if positions is not None:
+            opens, closes = opens[positions], closes[positions]
+
+        first, last = week_period(start, end)
+
+        is_open = ((opens <= last) & (closes >= first)).any(axis=1)
+
+        if last >= MINUTES_PER_WEEK:
+            # the period itself continues into the next week
+            is_open |= ((opens <= last - MINUTES_PER_WEEK) & (closes >= 0)).any(axis=1)
+
+        return is_open
+
+    def is_open(self, position: int, period: tuple[int, int]) -> bool:
+        """Return whether the location at the given position is open at some point during the
+        given period, as returned by week_period.
+
+        This checks a single location, so it is cheaper than open_during for one position.
+        """
+        first, last = period
+        opens = self.opens[position]
+        closes = self.closes[position]
+
+        if ((opens <= last) & (closes >= first)).any():
+            return True
+
+        return last >= MINUTES_PER_WEEK and \
+            bool(((opens <= last - MINUTES_PER_WEEK) & (closes >= 0)).any())
+
+    def open_intervals(self, position: int, period: tuple[int, int]) -> list[tuple[int, int]]:
+        """Return the intervals of minutes during which the location at the given position is
+        open within the given period, as returned by week_period, in chronological order.
+
+        Intervals are in minutes of the week, like the period, and are cut to fit inside of it.
+        Overlapping intervals are not merged.
+        """
+        first, last = period
+
+        # ACCUMULATOR: the intervals found so far
+        intervals = []
+
+        # the period may continue into the next week, where the same hours repeat
+        for shift in (0, MINUTES_PER_WEEK):
+            if last < shift:
+                break
+
+            for k in range(0, self.opens.shape[1]):
+                start = int(self.opens[position, k]) + shift
+                end = int(self.closes[position, k]) + shift
+                if start <= last and end >= first and start <= end:
+                    intervals.append((max(start, first), min(end, last)))
+
+        intervals.sort()
+        return intervals
+
+
+def week_period(start: datetime.datetime, end: datetime.datetime) -> tuple[int, int]:
+    """Return the minutes of the week (first, last) of the period from start to end.
+
+    last may be past the end of the week when the period continues into the next week.
+
+    Preconditions:
+        - start <= end
+        - end - start < datetime.timedelta(weeks=1)
+    """
+    first = minute_of_week(start)
+    return (first, first + (end - start) // datetime.timedelta(minutes=1))
+
+
+def minute_of_week(moment: datetime.datetime) -> int:
+    """Return the number of minutes between the start of the week (Sunday at midnight) and the
+    given moment.
+    """
+    day = (moment.weekday() + 1) % 7  # datetime counts days from Monday
+    return day * MINUTES_PER_DAY + moment.hour * 60 + moment.minute
+
+
+def opening_times_array(locations: list[Optional[Location]]) -> np.ndarray:
+    """Return an array of shape (len(locations), 7, 2) holding the minutes since midnight when
+    each location opens and closes on each day of the week, starting on Sunday.
+
+    Days a location is closed, and every day of locations without opening hours (including None),
+    are -1.
+    """
+    opening_times = np.full((len(locations), 7, 2), -1, dtype=np.int16)
+
+    for i in range(0, len(locations)):
+        if isinstance(locations[i], (Landmark, Restaurant)):
+            for day in range(0, 7):
+                hours = locations[i].opening_times[DAYS[day]]
+                if hours is not None:
+                    opening_times[i, day, 0] = hours[0].hour * 60 + hours[0].minute
+                    opening_times[i, day, 1] = hours[1].hour * 60 + hours[1].minute
+
+    return opening_times
+
+
+if __name__ == "__main__":
+    import python_ta
+    python_ta.check_all(config={
+        'extra-imports': ['datetime', 'numpy', 'location'],
+        'allowed-io': [],  # the names (strs) of functions that call print/open/input
+        'max-line-length': 100,
+        'disable': ['E1136']
+    })
+
+    import python_ta.contracts
+    python_ta.contracts.DEBUG_CONTRACTS = False
+    python_ta.contracts.check_all_contracts()
@@ -0,0 +1,104 @@
+"""This module improves the order in which the places of a trip are visited, so that less time
+is spent travelling between them.
+
+The order is improved with two kinds of moves, tried until neither makes the trip shorter:
+    - 2-opt, which reverses a stretch of the route, undoing routes that cross themselves
+    - Or-opt, which moves a run of one to three consecutive places somewhere else in the route
+
+Every move is checked with a function that follows a route and returns the time it leaves each
+place, such as OrienteeringProblem.departures, so a better order is never one that arrives
+somewhere after it closes or comes back to the hotel too late.
+
+This file is Copyright (c) 2021 Leen Al Lababidi, Michael Rubenstein, Maria Becerra and Nada Eldin
+"""
+from __future__ import annotations
+from typing import Callable, Optional
+import instrumentation
+
+# the longest run of consecutive places moved by an Or-opt move
+MAX_SEGMENT = 3
+
+# the least time, in seconds, a move must save to be made
+MIN_SAVING = 1.0
+
+
+def improve_order(route: list[int],
+                  departures: Callable[[list[int]], Optional[list[float]]]) -> list[int]:
+    """Return the places of the given route in an order that comes back to the hotel at least as
+    early, and is still feasible.
+
+    departures(route) returns the times of leaving the hotel, then each place of route, and of
+    coming back to the hotel, or None if route is not feasible.
+
+    Moves are made as soon as one is found that saves at least MIN_SAVING seconds, and the
+    search starts over after each of them, until no move saves time.
+
+    Preconditions:
+        - departures(route) is not None
+    """
+    route = list(route)
+    end = departures(route)[-1]
+
+    while True:
+        moved = _two_opt(route, end, departures) or _or_opt(route, end, departures)
+        if moved is None:
+            return route
+
+        instrumentation.count('order_moves')
+        route, end = moved
+
+
+def _two_opt(route: list[int], end: float,
+             departures: Callable[[list[int]], Optional[list[float]]])\
+        -> Optional[tuple[list[int], float]]:
+    """Return the first route found by reversing a stretch of route that comes back to the hotel
+    at least MIN_SAVING seconds before end, along with its return time, or None if there is none.
+    """
+    for i in range(0, len(route) - 1):
+        for j in range(i + 2, len(route) + 1):
+            candidate = route[:i] + route[i:j][::-1] + route[j:]
+            times = departures(candidate)
+
+            if times is not None and times[-1] <= end - MIN_SAVING:
+                return (candidate, times[-1])
+
+    return None
+
+
+def _or_opt(route: list[int], end: float,
+            departures: Callable[[list[int]], Optional[list[float]]])\
+        -> Optional[tuple[list[int], float]]:
+    """Return the first route found by moving at most MAX_SEGMENT consecutive places of route to
+    another position that comes back to the hotel at least MIN_SAVING seconds before end, along
+    with its return time, or None if there is none.
+    """
+    for length in range(1, min(MAX_SEGMENT, len(route) - 1) + 1):
+        for i in range(0, len(route) - length + 1):
+            segment = route[i:i + length]
+            rest = route[:i] + route[i + length:]
+
+            for k in range(0, len(rest) + 1):
+                if k == i:
+                    continue  # the segment would be put back where it was
+
+                candidate = rest[:k] + segment + rest[k:]
+                times = departures(candidate)
+
+                if times is not None and times[-1] <= end - MIN_SAVING:
+                    return (candidate, times[-1])
+
+    return None
+
+
+if __name__ == "__main__":
+    import python_ta
+    python_ta.check_all(config={
+        'extra-imports': ['instrumentation'],
+        'allowed-io': [],  # the names (strs) of functions that call print/open/input
+        'max-line-length': 100,
+        'disable': ['E1136']
+    })
+
+    import python_ta.contracts
+    python_ta.contracts.DEBUG_CONTRACTS = False
+    python_ta.contracts.check_all_contracts()
@@ -0,0 +1,402 @@
+"""This module chooses the locations a trip visits by solving an orienteering problem with time
+windows: find the places with the highest total rating that can all be visited during their
+opening hours, with the time it takes to travel between them, and still be back at the hotel by
+the return time.
+
+Finding the best route is NP-hard, so it is approximated. A first route is built by repeatedly
+inserting the place that adds the most rating for the least extra time, at the position where it
+costs the least time, until no other place fits. The route is then improved by iterated local
+search: a few consecutive places are removed from it and it is filled again by insertion, keeping
+the best route found, until the time budget or the number of iterations runs out. Every time a
+route is filled, its order is improved with ordering.improve_order, which may leave enough time
+for more places to be inserted.
+
+The visits are returned with the times the solver found for them, waiting for places to open
+where needed, so that the schedule of the trip can keep them instead of working out new ones.
+
+This file is Copyright (c) 2021 Leen Al Lababidi, Michael Rubenstein, Maria Becerra and Nada Eldin
+"""
+from __future__ import annotations
+from typing import Optional
+import datetime
+import math
+import time
+from location import Hotel, Landmark, Restaurant
+from graphs import CityLocations, SubwayLines, PROXIMITY_THRESHOLD
+from opening_hours import OpeningHoursIndex, minute_of_week, opening_times_array, week_period
+from schedule import TimeBlock
+from travel_times import travel_time_matrix
+from ordering import improve_order
+import instrumentation
+
+# the default time, in seconds, that the local search may run for
+TIME_BUDGET = 0.2
+
+# the default number of local search iterations
+MAX_ITERATIONS = 100
+
+# the maximum distance, in meters, between the hotel and the places considered
+SEARCH_RADIUS = 3 * PROXIMITY_THRESHOLD
+
+# the number of landmarks and of restaurants considered, among the highest rated ones
+MAX_LANDMARKS = 40
+MAX_RESTAURANTS = 10
+
+# the time of day a meal at a restaurant must start and end within
+LUNCH_HOURS = (datetime.time(11, 30), datetime.time(14, 30))
+
+
+class OrienteeringProblem:
+    """An orienteering problem with time windows, where the places are numbered from 0 and place
+    0 is the hotel that the route starts and ends at. Times are in seconds since leaving the
+    hotel.
+
+    Instance Attributes:
+        - ratings: the rating of each place
+        - durations: the time each place takes to visit
+        - windows: the intervals (start, end) during which each place can be visited, in
+            chronological order. A visit must start and end within one of them.
+        - travel: travel[i][j] is the time it takes to go from place i to place j
+        - horizon: the time by which the route must be back at the hotel
+        - meals: the places that are restaurants
+        - max_meals: the maximum number of restaurants a route may visit
+
+    Representation Invariants:
+        - len(self.ratings) == len(self.durations) == len(self.windows) == len(self.travel)
+        - all(len(row) == len(self.travel) for row in self.travel)
+        - 0 not in self.meals
+        - self.max_meals >= 0
+    """
+    ratings: list[float]
+    durations: list[float]
+    windows: list[list[tuple[float, float]]]
+    travel: list[list[float]]
+    horizon: float
+    meals: set[int]
+    max_meals: int
+
+    def __init__(self, ratings: list[float], durations: list[float],
+                 windows: list[list[tuple[float, float]]], travel: list[list[float]],
+                 horizon: float, meals: set[int], max_meals: int = 1) -> None:
+        """Initialize a problem with the given places."""
+        self.ratings = ratings
+        self.durations = durations
+        self.windows = windows
+        self.travel = travel
+        self.horizon = horizon
+        self.meals = meals
+        self.max_meals = max_meals
+
+    def __len__(self) -> int:
+        """Return the number of places in this problem, including the hotel."""
+        return len(self.ratings)
+
+    def score(self, route: list[int]) -> float:
+        """Return the total rating of the places on the given route."""
+        return sum(self.ratings[place] for place in route)
+
+    def departures(self, route: list[int]) -> Optional[list[float]]:
+        """Return the time of leaving the hotel and then each place of the given route, in order,
+        followed by the time of coming back to the hotel. Return None if the route cannot be
+        followed within the time windows and the horizon.
+
+        The route does not include the hotel itself.
+        """
+        times = [0.0]
+        previous = 0
+
+        for place in route:
+            left = self.visit(place, times[-1] + self.travel[previous][place])
+            if left is None:
+                return None
+            times.append(left)
+            previous = place
+
+        back = times[-1] + self.travel[previous][0]
+        if back > self.horizon:
+            return None
+
+        times.append(back)
+        return times
+
+    def visit(self, place: int, arrival: float) -> Optional[float]:
+        """Return the earliest time a visit of the given place can end, when arriving there at
+        the given time, waiting for it to open if needed. Return None if it can no longer be
+        visited.
+        """
+        for start, end in self.windows[place]:
+            begin = max(start, arrival)
+            if begin + self.durations[place] <= end:
+                return begin + self.durations[place]
+
+        return None
+
+    def insertion_end(self, route: list[int], departures: list[float], place: int,
+                      position: int) -> Optional[float]:
+        """Return the time of coming back to the hotel if the given place is inserted in route at
+        the given position, or None if the route would no longer be feasible.
+
+        Preconditions:
+            - departures == self.departures(route)
+            - 0 <= position <= len(route)
+        """
+        previous = route[position - 1] if position > 0 else 0
+        left = self.visit(place, departures[position] + self.travel[previous][place])
+        if left is None:
+            return None
+
+        # the rest of the route is shifted by the insertion
+        previous = place
+        for following in route[position:]:
+            left = self.visit(following, left + self.travel[previous][following])
+            if left is None:
+                return None
+            previous = following
+
+        back = left + self.travel[previous][0]
+        return back if back <= self.horizon else None
+
+
+@instrumentation.timed('solve')
+def solve(problem: OrienteeringProblem, time_budget: float = TIME_BUDGET,
+          max_iterations: int = MAX_ITERATIONS) -> list[int]:
+    """Return a route through the places of problem with a high total rating, without the hotel.
+
+    The local search stops after max_iterations iterations, or once time_budget seconds have
+    passed since this was called, whichever comes first. The first route is always completed,
+    however long it takes.
+    """
+    deadline = time.perf_counter() + time_budget
+
+    best = fill_route(problem, [])
+    best_key = _route_key(problem, best)
+    current = best
+
+    # remove size consecutive places starting at position start, then fill the route again
+    size, start = 1, 0
+
+    for _ in range(0, max_iterations):
+        if time.perf_counter() >= deadline or not current:
+            break
+        instrumentation.count('search_iterations')
+
+        start %= len(current)
+        current = fill_route(problem, current[:start] + current[start + size:])
+
+        key = _route_key(problem, current)
+        if key > best_key:
+            best, best_key = current, key
+            size = 1
+        else:
+            start += size
+            size += 1
+            if size > max(1, len(current) // 2):
+                size = 1
+
+    return best
+
+
+def fill_route(problem: OrienteeringProblem, route: list[int]) -> list[int]:
+    """Return the given route with places inserted into it until no other place fits, in an
+    order improved by ordering.improve_order.
+
+    Preconditions:
+        - problem.departures(route) is not None
+    """
+    route = insert_places(problem, route)
+    shorter = improve_order(route, problem.departures)
+
+    # a shorter route may have time left for more places
+    while shorter != route:
+        route = insert_places(problem, shorter)
+        shorter = improve_order(route, problem.departures)
+
+    return route
+
+
+def insert_places(problem: OrienteeringProblem, route: list[int]) -> list[int]:
+    """Return the given route with places inserted into it until no other place fits.
+
+    Each time, the place and position chosen are the ones with the highest ratio between the
+    square of the rating of the place and the time it adds to the route.
+
+    Preconditions:
+        - problem.departures(route) is not None
+    """
+    route = list(route)
+    visited = set(route)
+    meals = len(visited & problem.meals)
+
+    # ACCUMULATOR: the number of insertions tried
+    tried = 0
+
+    while True:
+        departures = problem.departures(route)
+        end = departures[-1]
+
+        # the best insertion so far, as (ratio, place, position)
+        best = None
+
+        for place in range(1, len(problem)):
+            if place in visited or problem.ratings[place] <= 0 \
+                    or (place in problem.meals and meals >= problem.max_meals):
+                continue
+
+            tried += len(route) + 1
+            for position in range(0, len(route) + 1):
+                new_end = problem.insertion_end(route, departures, place, position)
+
+                if new_end is not None:
+                    # travel times are estimates, so an insertion may even save a little time
+                    ratio = problem.ratings[place] ** 2 / (max(new_end - end, 0.0) + 60)
+                    if best is None or ratio > best[0]:
+                        best = (ratio, place, position)
+
+        if best is None:
+            instrumentation.count('insertions_tried', tried)
+            return route
+
+        _, place, position = best
+        route.insert(position, place)
+        visited.add(place)
+        if place in problem.meals:
+            meals += 1
+
+
+def _route_key(problem: OrienteeringProblem, route: list[int]) -> tuple[float, float]:
+    """Return a key that is larger for better routes: a higher total rating first, and then an
+    earlier return to the hotel.
+    """
+    return (problem.score(route), -problem.departures(route)[-1])
+
+
+@instrumentation.timed('choose_locations')
+def choose_visits(maps: CityLocations, subway_graph: SubwayLines, hotel: Hotel,
+                  leave: datetime.datetime, return_time: datetime.datetime,
+                  time_budget: float = TIME_BUDGET, max_iterations: int = MAX_ITERATIONS)\
+        -> list[TimeBlock]:
+    """Return the visits of the trip, in order, each as a TimeBlock from the time the visit
+    starts to the time it ends.
+
+    Each visit starts once the place is open and the trip has got there from the previous one,
+    and ends while the place is still open. Times are rounded up to whole seconds.
+
+    The places considered are the highest rated landmarks and restaurants at most SEARCH_RADIUS
+    meters away from the hotel that are open at some point during the trip. At most one
+    restaurant is visited, for lunch. Travel times are estimated with
+    travel_times.travel_time_matrix.
+
+    Raise an Exception if no place can be visited during the trip, such as when none is open or
+    the trip is too short to get to any of them and back.
+
+    Preconditions:
+        - leave < return_time
+        - leave.date() == return_time.date()
+        - subway_graph.transit is not None
+    """
+    open_during = (leave, return_time)
+    places = maps.candidates(hotel.location, SEARCH_RADIUS, open_during, Landmark, MAX_LANDMARKS)
+    places += maps.candidates(hotel.location, SEARCH_RADIUS, open_during, Restaurant,
+                              MAX_RESTAURANTS)
+
+    if not places:
+        raise Exception('No open locations. Insufficient data, try again')
+    instrumentation.count('candidates', len(places))
+
+    period = week_period(leave, return_time)
+    opening_hours = OpeningHoursIndex(opening_times_array(places))
+    lunch_start = _seconds_between(leave, LUNCH_HOURS[0])
+    lunch_end = _seconds_between(leave, LUNCH_HOURS[1])
+
+    # ACCUMULATOR: the time windows of the hotel and then of each place
+    windows = [[(0.0, (return_time - leave).total_seconds())]]
+
+    for i in range(0, len(places)):
+        intervals = [((start - period[0]) * 60.0, (end - period[0]) * 60.0)
+                     for start, end in opening_hours.open_intervals(i, period)]
+        if isinstance(places[i], Restaurant):
+            intervals = [(max(start, lunch_start), min(end, lunch_end))
+                         for start, end in intervals if start < lunch_end and end > lunch_start]
+        windows.append(intervals)
+
+    problem = OrienteeringProblem(
+        [0.0] + [place.rating for place in places],
+        [0.0] + [place.time_spent.total_seconds() for place in places],
+        windows,
+        travel_time_matrix([hotel] + places, maps, subway_graph).tolist(),
+        (return_time - leave).total_seconds(),
+        {i + 1 for i in range(0, len(places)) if isinstance(places[i], Restaurant)})
+
+    route = solve(problem, time_budget, max_iterations)
+    if not route:
+        raise Exception('No open locations. Insufficient data, try again')
+    departures = problem.departures(route)
+
+    # ACCUMULATOR: the visits of the route so far
+    visits = []
+
+    for k in range(0, len(route)):
+        start = departures[k + 1] - problem.durations[route[k]]
+        start = leave + datetime.timedelta(seconds=math.ceil(start))
+        visits.append(TimeBlock(start, places[route[k] - 1]))
+
+    return visits
+
+
+def outside_windows(trip_schedule: list[TimeBlock]) -> list[TimeBlock]:
+    """Return the visits of the given schedule to landmarks and restaurants that do not start
+    and end within a single period when the place is open, or, for restaurants, within
+    LUNCH_HOURS.
+
+    These are the constraints choose_visits plans visits with, so a schedule that keeps its
+    times has no such visits.
+    """
+    visits = [block for block in trip_schedule
+              if isinstance(block.location_visited, (Landmark, Restaurant))]
+    opening_hours = OpeningHoursIndex(opening_times_array([block.location_visited
+                                                           for block in visits]))
+
+    # ACCUMULATOR: the visits outside of their windows
+    outside = []
+
+    for i in range(0, len(visits)):
+        start, end = visits[i].start_time, visits[i].end_time
+
+        # the start and end of the visit, in seconds since the start of the week
+        first = minute_of_week(start) * 60 + start.second + start.microsecond / 1e6
+        last = first + (end - start).total_seconds()
+
+        fits = any(opens * 60 <= first and last <= closes * 60 for opens, closes
+                   in opening_hours.open_intervals(i, (int(first // 60),
+                                                       math.ceil(last / 60))))
+
+        if isinstance(visits[i].location_visited, Restaurant):
+            fits = fits and _seconds_between(start, LUNCH_HOURS[0]) <= 0 \
+                and _seconds_between(end, LUNCH_HOURS[1]) >= 0
+
+        if not fits:
+            outside.append(visits[i])
+
+    return outside
+
+
+def _seconds_between(moment: datetime.datetime, time_of_day: datetime.time) -> float:
+    """Return the number of seconds from moment to the given time of day on the same date, which
+    is negative if that time is before moment.
+    """
+    return (datetime.datetime.combine(moment.date(), time_of_day) - moment).total_seconds()
+
+
+if __name__ == "__main__":
+    import python_ta
+    python_ta.check_all(config={
+        'extra-imports': ['datetime', 'math', 'time', 'location', 'graphs', 'opening_hours',
+                          'schedule', 'travel_times', 'ordering', 'instrumentation'],
+        'allowed-io': [],  # the names (strs) of functions that call print/open/input
+        'max-line-length': 100,
+        'disable': ['E1136']
+    })
+
+    import python_ta.contracts
+    python_ta.contracts.DEBUG_CONTRACTS = False
+    python_ta.contracts.check_all_contracts()
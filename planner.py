@@ -0,0 +1,245 @@
+"""This module plans trips without any graphical interface, so that itineraries can be planned in
+batches or behind a service.
+
+The graphs are loaded once when a Planner is created, and every trip planned with it reuses them:
+the hotel of each trip is only attached to the city graph while that trip is being planned.
+
+It can also be run from the command line. Given a hotel, a leave time and a return time, it prints
+the itinerary as JSON:
+
+    python planner.py --hotel "Hôtel Ritz Paris" --leave "2021-04-16 09:00" \
+        --return "2021-04-16 18:00"
+
+Without --hotel, it reads one request per line from standard input, each a JSON object with the
+keys "hotel", "leave" and "return", and prints one JSON itinerary per line.
+
+With --report, the time taken by each stage of loading the graphs and planning the trips, and the
+operations they did, are saved as JSON once every trip is planned. Stages can also be profiled
+with --profile, or have their memory traced with --trace-memory.
+
+This file is Copyright (c) 2021 Leen Al Lababidi, Michael Rubenstein, Maria Becerra and Nada Eldin
+"""
+from __future__ import annotations
+from typing import Optional
+import argparse
+import csv
+import datetime
+import json
+import logging
+import sys
+from location import Location, Hotel
+from graphs import CityLocations, SubwayLines
+import snapshot
+import orienteering
+import find_path
+import schedule
+from schedule import TimeBlock
+import instrumentation
+
+HOTELS_FILE = 'data/paris-hotel.csv'
+LANDMARKS_FILE = 'data/paris-attraction-final.csv'
+RESTAURANTS_FILE = 'data/paris-restaurant-organized-final.csv'
+SUBWAY_FILE = 'data/paris_metro_stations.csv'
+SUBWAY_LINES_FILE = 'data/paris_metro_lines.csv'
+
+
+class Planner:
+    """Plans trips around the city, reusing the same graphs for every trip.
+
+    A planner changes its city graph while a trip is being planned, so it must only plan one trip
+    at a time.
+
+    Instance Attributes:
+        - city_graph: the graph of the locations in the city, without any hotel attached
+        - subway_graph: the graph of the subway network
+        - hotels: maps the name of each hotel that trips can start from to that hotel
+        - time_budget: the time in seconds the locations of each trip may be optimized for
+
+    Representation Invariants:
+        - self.time_budget >= 0
+    """
+    city_graph: CityLocations
+    subway_graph: SubwayLines
+    hotels: dict[str, Hotel]
+    time_budget: float
+
+    def __init__(self, city_graph: CityLocations, subway_graph: SubwayLines,
+                 hotels: dict[str, Hotel], time_budget: float = orienteering.TIME_BUDGET) -> None:
+        """Initialize a planner using the given graphs and hotels."""
+        self.city_graph = city_graph
+        self.subway_graph = subway_graph
+        self.hotels = hotels
+        self.time_budget = time_budget
+
+    @instrumentation.timed('plan')
+    def plan(self, hotel_name: str, leave: datetime.datetime, return_time: datetime.datetime)\
+            -> tuple[list[Location], list[TimeBlock]]:
+        """Return the path and the schedule of a trip leaving the hotel with the given name at
+        leave, and coming back to it at return_time.
+
+        The landmarks and restaurants are visited at the times chosen for them by
+        orienteering.choose_visits, while they are open.
+
+        Raise a ValueError if the trip is not valid, as checked by self.validate.
+        """
+        self.validate(hotel_name, leave, return_time)
+
+        hotel = self.hotels[hotel_name]
+
+        with self.city_graph.attached(hotel):
+            visits = orienteering.choose_visits(self.city_graph, self.subway_graph, hotel, leave,
+                                                return_time, self.time_budget)
+            path = find_path.find_path([visit.location_visited for visit in visits],
+                                       self.city_graph, self.subway_graph)
+
+        trip_schedule = schedule.build_schedule(path, leave, return_time, visits)
+
+        # the schedule keeps the times the visits were chosen for, so they must all fit
+        outside = orienteering.outside_windows(trip_schedule)
+        if outside:
+            raise Exception('The schedule visits ' + outside[0].location_visited.name
+                            + ' while it is closed')
+
+        return (path, trip_schedule)
+
+    def validate(self, hotel_name: str, leave: datetime.datetime,
+                 return_time: datetime.datetime) -> None:
+        """Raise a ValueError if there is no hotel with the given name, or if return_time is not
+        after leave on the same day.
+        """
+        if hotel_name not in self.hotels:
+            raise ValueError('Unknown hotel: ' + hotel_name)
+        if return_time <= leave or return_time.date() != leave.date():
+            raise ValueError('The return time must be after the leave time, on the same day')
+
+    def plan_json(self, hotel_name: str, leave: datetime.datetime,
+                  return_time: datetime.datetime) -> dict:
+        """Return the trip planned by self.plan as a dictionary that can be converted to JSON.
+        """
+        path, trip_schedule = self.plan(hotel_name, leave, return_time)
+        return itinerary_json(hotel_name, leave, return_time, path, trip_schedule)
+
+
+@instrumentation.timed('load_planner')
+def load_planner(hotels_file: str = HOTELS_FILE, cache_dir: str = snapshot.CACHE_DIR,
+                 time_budget: float = orienteering.TIME_BUDGET) -> Planner:
+    """Return a planner using the graphs of the city, loaded from snapshots in cache_dir when
+    possible, and the hotels in hotels_file, which optimizes the locations of each trip for
+    time_budget seconds.
+    """
+    city_graph = snapshot.load_base_city_graph(LANDMARKS_FILE, RESTAURANTS_FILE, SUBWAY_FILE,
+                                               cache_dir)
+    subway_graph = snapshot.load_subway_graph(SUBWAY_FILE, SUBWAY_LINES_FILE,
+                                              precompute_routes=True, cache_dir=cache_dir)
+
+    return Planner(city_graph, subway_graph, load_hotels(hotels_file), time_budget)
+
+
+def load_hotels(hotels_file: str) -> dict[str, Hotel]:
+    """Return a mapping from the name of each hotel in hotels_file to that hotel.
+
+    Preconditions:
+        - hotels_file is the path to a CSV file with the name, latitude and longitude of each
+            hotel in its columns 0, 3 and 4
+    """
+    hotels = {}
+    with open(hotels_file, encoding='utf-8') as file:
+        for row in csv.reader(file):
+            hotels[row[0]] = Hotel(row[0], (float(row[3]), float(row[4])))
+
+    return hotels
+
+
+def itinerary_json(hotel_name: str, leave: datetime.datetime, return_time: datetime.datetime,
+                   path: list[Location], trip_schedule: list[TimeBlock]) -> dict:
+    """Return the given trip as a dictionary that can be converted to JSON.
+
+    Times are written in ISO 8601 format.
+    """
+    return {
+        'hotel': hotel_name,
+        'leave': leave.isoformat(),
+        'return': return_time.isoformat(),
+        'path': [location_json(location) for location in path],
+        'schedule': [{'start': block.start_time.isoformat(),
+                      'end': block.end_time.isoformat(),
+                      'location': location_json(block.location_visited)}
+                     for block in trip_schedule]
+    }
+
+
+def location_json(location: Location) -> dict:
+    """Return the given location as a dictionary that can be converted to JSON."""
+    return {'name': location.name,
+            'kind': type(location).__name__,
+            'location': list(location.location)}
+
+
+def plan_request(trip_planner: Planner, request: dict | str) -> dict:
+    """Return the itinerary for the given request, a dictionary with the keys 'hotel', 'leave'
+    and 'return', where times are in ISO 8601 format (such as 2021-04-16 09:00). The request
+    can also be given as a line of JSON holding that dictionary.
+
+    If the request cannot be read or the trip cannot be planned, return a dictionary with the
+    request and an 'error' key instead.
+    """
+    try:
+        if isinstance(request, str):
+            request = json.loads(request)
+
+        return trip_planner.plan_json(request['hotel'],
+                                      datetime.datetime.fromisoformat(request['leave']),
+                                      datetime.datetime.fromisoformat(request['return']))
+    except Exception as error:  # one bad request should not stop the others
+        return {'request': request, 'error': str(error) or type(error).__name__}
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    """Plan the trips requested on the command line, or on standard input, and print them as
+    JSON on standard output.
+
+    With --verbose, progress messages are logged on standard error, so that standard output only
+    has JSON.
+    """
+    parser = argparse.ArgumentParser(description='Plan trips around Paris and print them as JSON.')
+    parser.add_argument('--hotel', help='the name of the hotel to leave from')
+    parser.add_argument('--leave', help='when to leave the hotel, as YYYY-MM-DD HH:MM')
+    parser.add_argument('--return', dest='return_time',
+                        help='when to come back to the hotel, as YYYY-MM-DD HH:MM')
+    parser.add_argument('--hotels-file', default=HOTELS_FILE,
+                        help='the CSV file of the hotels trips can leave from')
+    parser.add_argument('--time-budget', type=float, default=orienteering.TIME_BUDGET,
+                        help='the number of seconds the locations of each trip are optimized for')
+    parser.add_argument('--verbose', action='store_true',
+                        help='log the progress of each stage on standard error')
+    parser.add_argument('--report', help='the JSON file to save the time taken by each stage to')
+    parser.add_argument('--profile', nargs='+', default=[], metavar='STAGE',
+                        help='the names of the stages to profile, such as choose_locations')
+    parser.add_argument('--trace-memory', nargs='+', default=[], metavar='STAGE',
+                        help='the names of the stages whose memory allocations are traced')
+    args = parser.parse_args(argv)
+
+    if args.verbose:
+        logging.basicConfig(level=logging.INFO, stream=sys.stderr, format='%(message)s')
+    instrumentation.default_instrumentation().profiled.update(args.profile)
+    instrumentation.default_instrumentation().traced.update(args.trace_memory)
+
+    trip_planner = load_planner(args.hotels_file, time_budget=args.time_budget)
+
+    if args.hotel is not None:
+        requests = [{'hotel': args.hotel, 'leave': args.leave, 'return': args.return_time}]
+    else:
+        # each line is read by plan_request, so that a malformed line only fails its own request
+        requests = (line.strip() for line in sys.stdin if line.strip())
+
+    for request in requests:
+        itinerary = plan_request(trip_planner, request)
+        print(json.dumps(itinerary, ensure_ascii=False), flush=True)
+
+    if args.report is not None:
+        with open(args.report, 'w', encoding='utf-8') as file:
+            json.dump(instrumentation.default_instrumentation().report(), file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
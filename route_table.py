@@ -0,0 +1,103 @@
+"""This module contains a table of the shortest routes between every pair of vertices of a small
+graph, such as the subway network.
+
+The subway network is small, so computing every shortest route ahead of time is cheap. Once the
+table is built, finding a route between two vertices only needs to follow predecessor pointers,
+instead of running a search.
+
+This file is Copyright (c) 2021 Leen Al Lababidi, Michael Rubenstein, Maria Becerra and Nada Eldin
+"""
+from __future__ import annotations
+from typing import Optional
+import numpy as np
+
+
+class RouteTable:
+    """The shortest routes between every pair of vertices of a graph, where vertices are numbered
+    from 0.
+
+    Instance Attributes:
+        - costs: costs[i, j] is the cost of the shortest route from vertex i to vertex j, or
+            infinity if there is no route between them
+        - predecessors: predecessors[i, j] is the vertex right before vertex j on the shortest
+            route from vertex i, or -1 if there is no such vertex
+
+    Representation Invariants:
+        - self.costs.shape == self.predecessors.shape
+        - self.costs.shape[0] == self.costs.shape[1]
+    """
+    costs: np.ndarray
+    predecessors: np.ndarray
+
+    def __init__(self, costs: np.ndarray, predecessors: np.ndarray) -> None:
+        """Initialize a table from already computed arrays."""
+        self.costs = costs
+        self.predecessors = predecessors
+
+    def cost(self, start: int, end: int) -> float:
+        """Return the cost of the shortest route between the two given vertices."""
+        return float(self.costs[start, end])
+
+    def route(self, start: int, end: int) -> Optional[list[int]]:
+        """Return the vertices along the shortest route from start to end, both included.
+        Return None if there is no route between them.
+        """
+        if np.isinf(self.costs[start, end]):
+            return None
+
+        # follow the predecessors back to the start
+        route = [end]
+        current = end
+        while current != start:
+            current = int(self.predecessors[start, current])
+            route.append(current)
+
+        route.reverse()
+        return route
+
+
+def compute_route_table(indptr: np.ndarray, indices: np.ndarray, weights: np.ndarray)\
+        -> RouteTable:
+    """Return the table of shortest routes of the graph with the given edges, which are in
+    compressed sparse row (CSR) form with a weight for each edge.
+
+    This uses the Floyd-Warshall algorithm, where each step is done on whole arrays at once.
+
+    Preconditions:
+        - len(indices) == len(weights)
+        - all(w >= 0 for w in weights)
+    """
+    n = len(indptr) - 1
+    costs = np.full((n, n), np.inf)
+    predecessors = np.full((n, n), -1, dtype=np.int32)
+
+    # routes with no edges or with a single edge
+    np.fill_diagonal(costs, 0.0)
+    rows = np.repeat(np.arange(n), np.diff(indptr))
+    for i, j, w in zip(rows, indices, weights):
+        if w < costs[i, j]:
+            costs[i, j] = w
+            predecessors[i, j] = i
+
+    # allow each vertex in turn to be an intermediate stop
+    for k in range(0, n):
+        through_k = costs[:, k, np.newaxis] + costs[np.newaxis, k, :]
+        shorter = through_k < costs
+        costs = np.where(shorter, through_k, costs)
+        predecessors = np.where(shorter, predecessors[np.newaxis, k, :], predecessors)
+
+    return RouteTable(costs, predecessors)
+
+
+if __name__ == "__main__":
+    import python_ta
+    python_ta.check_all(config={
+        'extra-imports': ['numpy'],
+        'allowed-io': [],  # the names (strs) of functions that call print/open/input
+        'max-line-length': 100,
+        'disable': ['E1136']
+    })
+
+    import python_ta.contracts
+    python_ta.contracts.DEBUG_CONTRACTS = False
+    python_ta.contracts.check_all_contracts()
@@ -5,8 +5,10 @@ This file is Copyright (c) 2021 Leen Al Lababidi, Michael Rubenstein, Maria Bece
 
 from __future__ import annotations
 from typing import Optional
-from datetime import datetime
+from datetime import datetime, timedelta
+import math
 from location import Location, Landmark, Restaurant, SubwayStation
+import instrumentation
 
 
 class TimeBlock:
@@ -37,83 +39,160 @@ class TimeBlock:
             self.end_time = start + loc.time_spent
 
 
+@instrumentation.timed('build_schedule')
 def build_schedule(path: list[Location or Restaurant or Landmark or SubwayStation],
-                   start: datetime, end: datetime) -> list[TimeBlock]:
+                   start: datetime, end: datetime, visits: Optional[list[TimeBlock]] = None)\
+        -> list[TimeBlock]:
     """Return a schedule in the form of a list of TimeBlock objects based on the path.
 
+    If visits is given, the landmarks and restaurants of path are visited at the times of those
+    visits, such as the ones chosen by orienteering.choose_visits to fit their opening hours.
+    The subway stations on the way to each of them are passed through right after leaving the
+    previous location, each for its usual time, or for an equal share of the time until the next
+    visit if there is not enough time for that.
+
+    Otherwise, every location is visited right after the previous one. If spending the usual time
+    at every location would go past end, less time is spent at the landmarks and restaurants, as
+    computed by compress_durations. The time spent at subway stations is never shortened.
+
+    The locations in path are not changed.
+
     Preconditions:
         - the only hotel in path is at the start/end
+        - visits is None or [block.location_visited for block in visits] == \
+            [loc for loc in path[1:-1] if not isinstance(loc, SubwayStation)]
+        - visits is None or all(start <= block.start_time and block.end_time <= end
+            for block in visits)
     """
     locations_to_visit = path[1:-1]  # remove the hotel from path
+
+    if visits is not None:
+        return _schedule_visits(locations_to_visit, start, end, visits)
+
+    stops = [i for i in range(0, len(locations_to_visit))
+             if not isinstance(locations_to_visit[i], SubwayStation)]
+    durations = [location.time_spent for location in locations_to_visit]
+
+    # the time left for the stops once every subway station is passed through
+    budget = end - start - sum((location.time_spent for location in locations_to_visit
+                                if isinstance(location, SubwayStation)), timedelta(0))
+    compressed = compress_durations([durations[i] for i in stops],
+                                    [locations_to_visit[i].rating for i in stops], budget)
+    for k in range(0, len(stops)):
+        durations[stops[k]] = compressed[k]
+
+    schedule = []
+    for i in range(0, len(locations_to_visit)):
+        schedule.append(TimeBlock(start, locations_to_visit[i], start + durations[i]))
+        start += durations[i]
+
+    return schedule
+
+
+def _schedule_visits(locations_to_visit: list[Location], start: datetime, end: datetime,
+                     visits: list[TimeBlock]) -> list[TimeBlock]:
+    """Return the schedule of the given locations between start and end, where the landmarks and
+    restaurants are visited at the times of visits, as described in build_schedule.
+    """
     schedule = []
 
-    print('Building Schedule....')
+    # ACCUMULATORS: the subway stations since the last visit, and the number of visits so far
+    stations = []
+    visited = 0
+
     for location in locations_to_visit:
-        new_time_block = TimeBlock(start, location)
-        start += location.time_spent
-        schedule.append(new_time_block)
-
-    # if we overflow beyond the planned time
-    altered = set()
-    i = 0
-    while schedule[-1].end_time > end:
-        print('Fixing Schedule....')
-        schedule, altered = fix_schedule(schedule, altered)
-        print(schedule[-1].end_time)
-        i += 1
+        if isinstance(location, SubwayStation):
+            stations.append(location)
+        else:
+            visit = visits[visited]
+            schedule.extend(_pass_through(stations, start, visit.start_time))
+            schedule.append(TimeBlock(visit.start_time, location, visit.end_time))
+
+            start = visit.end_time
+            stations = []
+            visited += 1
+
+    schedule.extend(_pass_through(stations, start, end))
 
     return schedule
 
 
-def fix_schedule(schedule: list[TimeBlock], altered: set) -> tuple[list[TimeBlock], set]:
-    """"Return a fixed copy of the schedule accounting for if we cross the inputted return time.
-    This is done by reducing time spent at the lowest rated location.
+def _pass_through(stations: list[SubwayStation], leave: datetime, arrive: datetime)\
+        -> list[TimeBlock]:
+    """Return the time blocks of passing through the given subway stations in order, starting
+    at leave. Each station takes its usual time, or an equal share of the time until arrive,
+    rounded down to whole seconds, if that is shorter.
     """
-    fixed_schedule = schedule.copy()
+    if not stations:
+        return []
+
+    share = timedelta(seconds=max(arrive - leave, timedelta(0)).total_seconds() // len(stations))
 
-    # find lowest rated location
-    lowest_index = None
+    # ACCUMULATOR: the time blocks of the stations passed through so far
+    blocks = []
 
-    for i in range(0, len(schedule)):
-        if schedule[i].location_visited.name not in altered and \
-                not isinstance(schedule[i].location_visited, SubwayStation):
-            if lowest_index is None:
-                lowest_index = i
-            elif schedule[i].location_visited.rating < \
-                    schedule[lowest_index].location_visited.rating:
-                lowest_index = i
+    for station in stations:
+        duration = min(station.time_spent, share)
+        blocks.append(TimeBlock(leave, station, leave + duration))
+        leave += duration
 
-    if lowest_index is None:
-        return fix_schedule(schedule, set())
+    return blocks
 
-    # reduce time spent there by 50%
-    start = fixed_schedule[lowest_index].start_time
-    fixed_schedule[lowest_index].location_visited.time_spent = schedule[
-        lowest_index].location_visited.time_spent // 2
-    end = start + fixed_schedule[lowest_index].location_visited.time_spent
 
-    # fixed_schedule[lowest_index] = TimeBlock(start, schedule[lowest_index].location_visited, end)
-    fixed_schedule[lowest_index].end_time = end
-    altered.add(schedule[lowest_index].location_visited.name)
+def compress_durations(durations: list[timedelta], ratings: list[float], budget: timedelta)\
+        -> list[timedelta]:
+    """Return the time to spend at each stop of a trip, so that the total is at most budget.
+
+    durations[i] is the usual time spent at the i-th stop, and ratings[i] is its rating. If the
+    usual times fit in the budget, they are returned unchanged. Otherwise, every stop keeps a
+    share of its usual time proportional to one more than its rating, so that the best rated stops
+    keep the most time, and the highest rated stops keep all of it if the budget allows. Times
+    are rounded down to whole seconds.
+
+    The shares are found in one pass over the stops sorted by rating, so this takes
+    O(n log n) time for n stops.
+
+    Preconditions:
+        - len(durations) == len(ratings)
+        - all(d >= timedelta(0) for d in durations)
+        - all(0 <= r <= 5 for r in ratings)
+    """
+    total = sum(durations, timedelta(0))
+    if total <= budget:
+        return list(durations)
+    instrumentation.count('schedule_compressions')
+    if budget <= timedelta(0):
+        return [timedelta(0) for _ in durations]
+
+    seconds = [d.total_seconds() for d in durations]
+    weights = [r + 1 for r in ratings]
 
-    # shift the rest of the schedule
-    for j in range(lowest_index + 1, len(schedule)):
-        fixed_schedule[j].start_time = end
-        fixed_schedule[j].end_time = end + fixed_schedule[j].location_visited.time_spent
+    # stop i keeps min(1, scale * weights[i]) of its usual time. The stops that keep all of it
+    # are the ones with the highest weights, so try each number of them in that order.
+    order = sorted(range(0, len(durations)), key=lambda i: -weights[i])
+    full = 0.0
+    weighted = sum(weights[i] * seconds[i] for i in order)
+    scale = 0.0
 
-        end = fixed_schedule[j].end_time
+    for k in range(0, len(order)):
+        instrumentation.count('compression_steps')
+        scale = (budget.total_seconds() - full) / weighted
+        if scale * weights[order[k]] <= 1:
+            break
 
-    if len(altered) == len(fixed_schedule):
-        altered = set()
+        # the k-th stop keeps all of its time
+        full += seconds[order[k]]
+        weighted -= weights[order[k]] * seconds[order[k]]
 
-    return (fixed_schedule, altered)
+    return [timedelta(seconds=math.floor(seconds[i] * min(1.0, scale * weights[i])))
+            for i in range(0, len(durations))]
 
 
 if __name__ == "__main__":
     import python_ta
     python_ta.check_all(config={
-        'extra-imports': ['datetime', 'location'],
-        'allowed-io': ['build_schedule'],
+        'extra-imports': ['datetime', 'math', 'location', 'instrumentation'],
+        'allowed-io': [],
         'max-line-length': 100,
         'disable': ['E1136']
     })
@@ -0,0 +1,431 @@
+"""This module contains a small HTTP service that plans trips and returns them as JSON.
+
+The service runs on asyncio, while the trips themselves are planned in an executor, so that
+planning never blocks the event loop. Requests for the same trip that arrive while it is being
+planned are coalesced into a single planning job, and finished plans are kept in a cache.
+
+A trip only depends on the hotel, the day of the week and the leave and return times, so plans are
+cached under that key, and a plan made for one date is reused for any other date on the same day
+of the week.
+
+It can be run from the command line, and then answers requests such as:
+
+    GET /plan?hotel=Hôtel%20Ritz%20Paris&leave=2021-04-16%2009:00&return=2021-04-16%2018:00
+    POST /plan with the JSON body {"hotel": ..., "leave": ..., "return": ...}
+    GET /stats
+
+This file is Copyright (c) 2021 Leen Al Lababidi, Michael Rubenstein, Maria Becerra and Nada Eldin
+"""
+from __future__ import annotations
+from typing import Callable, Hashable, Optional
+from collections import OrderedDict
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from urllib.parse import parse_qs, urlsplit
+import argparse
+import asyncio
+import datetime
+import json
+import multiprocessing
+import time
+import planner
+from planner import Planner
+import instrumentation
+
+# the default number of plans kept in the cache
+CACHE_SIZE = 1024
+
+# the default number of seconds a plan stays in the cache
+CACHE_TTL = 3600
+
+# the reason phrase of each HTTP status code the service uses
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+           500: 'Internal Server Error'}
+
+# the planner used by the current worker process, when trips are planned by worker processes
+_worker_planner: Optional[Planner] = None
+
+
+class PlanCache:
+    """A cache of the most recently used plans, where each plan also expires after some time.
+
+    Instance Attributes:
+        - max_size: the maximum number of plans in the cache
+        - ttl: the number of seconds a plan stays in the cache after it was added
+        - hits: the number of times a plan was found in the cache
+        - misses: the number of times a plan was not found in the cache
+
+    Representation Invariants:
+        - self.max_size > 0
+        - self.ttl > 0
+    """
+    max_size: int
+    ttl: float
+    hits: int
+    misses: int
+    # Private Instance Attributes:
+    #     - _entries: maps each key to the time its plan expires and the plan, from least to most
+    #         recently used
+    #     - _clock: returns the current time, in seconds
+    _entries: OrderedDict[Hashable, tuple[float, dict]]
+    _clock: Callable[[], float]
+
+    def __init__(self, max_size: int = CACHE_SIZE, ttl: float = CACHE_TTL,
+                 clock: Callable[[], float] = time.monotonic) -> None:
+        """Initialize an empty cache."""
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._clock = clock
+
+    def __len__(self) -> int:
+        """Return the number of plans in the cache, including expired plans that were not removed
+        yet.
+        """
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Optional[dict]:
+        """Return the plan stored under the given key, or None if there is no such plan or if it
+        has expired.
+        """
+        entry = self._entries.get(key)
+
+        if entry is not None and entry[0] <= self._clock():
+            del self._entries[key]
+            entry = None
+
+        if entry is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    def put(self, key: Hashable, plan: dict) -> None:
+        """Store the given plan under the given key, removing the least recently used plan if the
+        cache is full.
+        """
+        self._entries[key] = (self._clock() + self.ttl, plan)
+        self._entries.move_to_end(key)
+
+        if len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+
+class PlanService:
+    """An HTTP service that plans trips, coalescing identical requests and caching plans.
+
+    Instance Attributes:
+        - cache: the cache of finished plans
+        - coalesced: the number of requests that waited for a plan that was already being made
+    """
+    cache: PlanCache
+    coalesced: int
+    # Private Instance Attributes:
+    #     - _executor: the executor the trips are planned in
+    #     - _validate: raises a ValueError if a trip with the given hotel name, leave and return
+    #         times cannot be planned, without planning it
+    #     - _plan: plans a trip in the executor, from the hotel name, leave and return times
+    #     - _in_flight: maps the key of each trip being planned to its future plan
+    _executor: Executor
+    _validate: Callable[[str, datetime.datetime, datetime.datetime], None]
+    _plan: Callable[[str, datetime.datetime, datetime.datetime], dict]
+    _in_flight: dict[Hashable, asyncio.Future]
+
+    def __init__(self, trip_planner: Planner, processes: Optional[int] = None,
+                 cache: Optional[PlanCache] = None) -> None:
+        """Initialize a service planning trips with trip_planner.
+
+        If processes is given, trips are planned by that many worker processes, forked right away
+        so that each has a copy-on-write copy of trip_planner. Otherwise, they are planned one at
+        a time by a single thread.
+
+        Preconditions:
+            - trip_planner.city_graph.hotel is None
+            - processes is None or 'fork' in multiprocessing.get_all_start_methods()
+        """
+        global _worker_planner
+
+        self.cache = cache if cache is not None else PlanCache()
+        self.coalesced = 0
+        self._in_flight = {}
+        self._validate = trip_planner.validate
+
+        if processes is None:
+            # a planner must only plan one trip at a time
+            self._executor = ThreadPoolExecutor(max_workers=1)
+            self._plan = trip_planner.plan_json
+        else:
+            _worker_planner = trip_planner
+            self._executor = ProcessPoolExecutor(processes, multiprocessing.get_context('fork'))
+            self._plan = _plan_in_worker
+
+            # the workers are forked now, before the service opens any socket, since forked
+            # workers would otherwise keep the connections open after the service closes them
+            list(self._executor.map(int, range(0, processes)))
+
+    async def plan(self, hotel_name: str, leave: datetime.datetime,
+                   return_time: datetime.datetime) -> dict:
+        """Return the JSON itinerary of the given trip.
+
+        The itinerary is taken from the cache if possible. Otherwise, it is planned in the
+        executor, unless the same trip is already being planned, in which case this waits for that
+        plan instead.
+
+        Raise a ValueError if the given values are not a valid trip, as checked by
+        planner.Planner.validate. Errors raised while planning a valid trip are raised as they
+        are.
+        """
+        self._validate(hotel_name, leave, return_time)
+
+        key = (hotel_name, leave.weekday(), leave.time(), return_time.time())
+        itinerary = self.cache.get(key)
+
+        if itinerary is None:
+            future = self._in_flight.get(key)
+
+            if future is None:
+                loop = asyncio.get_running_loop()
+                future = asyncio.ensure_future(loop.run_in_executor(
+                    self._executor, self._plan, hotel_name, leave, return_time))
+                self._in_flight[key] = future
+                future.add_done_callback(lambda done: self._finish(key, done))
+            else:
+                self.coalesced += 1
+
+            # a cancelled request must not cancel the plan other requests are waiting for
+            itinerary = await asyncio.shield(future)
+
+        return _move_itinerary(itinerary, leave, return_time)
+
+    def stats(self) -> dict:
+        """Return the counters of this service.
+
+        When trips are planned by a thread, this also includes the time taken by each stage of
+        planning them, as recorded by the instrumentation module. Worker processes keep their own
+        records, so they are not included.
+        """
+        stats = {'cached_plans': len(self.cache),
+                 'cache_hits': self.cache.hits,
+                 'cache_misses': self.cache.misses,
+                 'coalesced': self.coalesced,
+                 'in_flight': len(self._in_flight)}
+
+        if isinstance(self._executor, ThreadPoolExecutor):
+            stats['stages'] = instrumentation.default_instrumentation().report()
+
+        return stats
+
+    async def respond(self, method: str, target: str, body: bytes) -> tuple[int, dict]:
+        """Return the HTTP status code and the JSON body of the response to the given request.
+        """
+        url = urlsplit(target)
+
+        if url.path == '/stats':
+            return (200, self.stats())
+        if url.path != '/plan':
+            return (404, {'error': 'Not found: ' + url.path})
+
+        if method == 'GET':
+            request = {name: values[0] for name, values in parse_qs(url.query).items()}
+        elif method == 'POST':
+            try:
+                request = json.loads(body.decode('utf-8'))
+            except ValueError:
+                return (400, {'error': 'The body must be a JSON object'})
+        else:
+            return (405, {'error': 'Only GET and POST are allowed'})
+
+        # only a request that cannot be read, or is not a valid trip, is the client's error
+        try:
+            if not isinstance(request, dict) or \
+                    not all(isinstance(request.get(name), str)
+                            for name in ('hotel', 'leave', 'return')):
+                raise ValueError('The request needs a hotel, a leave time and a return time')
+
+            hotel_name = request['hotel']
+            leave = datetime.datetime.fromisoformat(request['leave'])
+            return_time = datetime.datetime.fromisoformat(request['return'])
+            self._validate(hotel_name, leave, return_time)
+        except ValueError as error:
+            return (400, {'error': str(error)})
+
+        try:
+            itinerary = await self.plan(hotel_name, leave, return_time)
+        except Exception as error:  # the service keeps running if a trip cannot be planned
+            return (500, {'error': str(error) or type(error).__name__})
+
+        return (200, itinerary)
+
+    async def handle_connection(self, reader: asyncio.StreamReader,
+                                writer: asyncio.StreamWriter) -> None:
+        """Answer the HTTP requests sent on a connection, until the client closes it or asks for
+        it to be closed.
+
+        A request whose request line, headers or Content-Length cannot be read is answered with
+        400 Bad Request, and the connection is then closed, since the end of that request is not
+        known.
+        """
+        try:
+            keep_alive = True
+
+            while keep_alive:
+                try:
+                    head = await _read_head(reader)
+                    if head is None:
+                        break
+
+                    method, target, version, headers = head
+                    length = _content_length(headers)
+                except ValueError as error:
+                    await _send(writer, 400, {'error': str(error)}, False)
+                    break
+
+                body = await reader.readexactly(length)
+                status, payload = await self.respond(method, target, body)
+
+                keep_alive = version == 'HTTP/1.1' and \
+                    headers.get('connection', '').lower() != 'close'
+                await _send(writer, status, payload, keep_alive)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass  # a broken connection only ends this connection
+        finally:
+            writer.close()
+
+    async def serve(self, host: str, port: int) -> None:
+        """Answer HTTP requests on the given host and port, until cancelled."""
+        server = await asyncio.start_server(self.handle_connection, host, port)
+
+        async with server:
+            await server.serve_forever()
+
+    def close(self) -> None:
+        """Stop the executor of this service."""
+        self._executor.shutdown()
+
+    def _finish(self, key: Hashable, future: asyncio.Future) -> None:
+        """Cache the plan of the trip with the given key, now that its future is done."""
+        del self._in_flight[key]
+
+        if not future.cancelled() and future.exception() is None:
+            self.cache.put(key, future.result())
+
+
+async def _read_head(reader: asyncio.StreamReader)\
+        -> Optional[tuple[str, str, str, dict[str, str]]]:
+    """Return the method, target, HTTP version and headers of the next request read from reader,
+    where the names of the headers are in lowercase, or None if the client sent no other request.
+
+    Raise a ValueError if the request line or a header line is malformed.
+    """
+    request_line = await reader.readline()
+    if not request_line.strip():
+        return None
+
+    parts = request_line.decode('latin-1').split()
+    if len(parts) != 3 or not parts[2].startswith('HTTP/'):
+        raise ValueError('Malformed request line')
+
+    # read the headers, until the empty line after them
+    headers = {}
+    line = await reader.readline()
+    while line.strip():
+        name, colon, value = line.decode('latin-1').partition(':')
+        if not colon or not name.strip():
+            raise ValueError('Malformed header line')
+        headers[name.strip().lower()] = value.strip()
+        line = await reader.readline()
+
+    return (parts[0], parts[1], parts[2], headers)
+
+
+def _content_length(headers: dict[str, str]) -> int:
+    """Return the length of the body of a request with the given headers.
+
+    Raise a ValueError if its Content-Length is not a non-negative integer.
+    """
+    value = headers.get('content-length', '0')
+    if not (value.isascii() and value.isdigit()):
+        raise ValueError('Invalid Content-Length: ' + value)
+
+    return int(value)
+
+
+async def _send(writer: asyncio.StreamWriter, status: int, payload: dict,
+                keep_alive: bool) -> None:
+    """Send a response with the given HTTP status code and JSON body on writer, saying whether
+    the connection is kept alive after it.
+    """
+    content = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+    writer.write(('HTTP/1.1 ' + str(status) + ' ' + REASONS[status] + '\r\n'
+                  'Content-Type: application/json; charset=utf-8\r\n'
+                  'Content-Length: ' + str(len(content)) + '\r\n'
+                  'Connection: ' + ('keep-alive' if keep_alive else 'close') +
+                  '\r\n\r\n').encode('latin-1') + content)
+    await writer.drain()
+
+
+def _plan_in_worker(hotel_name: str, leave: datetime.datetime,
+                    return_time: datetime.datetime) -> dict:
+    """Return the JSON itinerary of the given trip, planned with the planner of the current
+    worker process.
+    """
+    return _worker_planner.plan_json(hotel_name, leave, return_time)
+
+
+def _move_itinerary(itinerary: dict, leave: datetime.datetime,
+                    return_time: datetime.datetime) -> dict:
+    """Return the given JSON itinerary moved to the date of leave, with the given leave and
+    return times.
+
+    Preconditions:
+        - the itinerary was planned for the same day of the week and the same times of day
+    """
+    shift = leave.date() - datetime.date.fromisoformat(itinerary['leave'][:10])
+    if not shift:
+        return itinerary
+
+    def move(moment: str) -> str:
+        """Return the given ISO 8601 time moved by shift."""
+        return (datetime.datetime.fromisoformat(moment) + shift).isoformat()
+
+    moved = dict(itinerary)
+    moved['leave'] = leave.isoformat()
+    moved['return'] = return_time.isoformat()
+    moved['schedule'] = [dict(block, start=move(block['start']), end=move(block['end']))
+                         for block in itinerary['schedule']]
+
+    return moved
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    """Load the graphs and run the service until interrupted."""
+    parser = argparse.ArgumentParser(description='Serve trip plans around Paris over HTTP.')
+    parser.add_argument('--host', default='127.0.0.1', help='the address to listen on')
+    parser.add_argument('--port', type=int, default=8080, help='the port to listen on')
+    parser.add_argument('--processes', type=int, default=None,
+                        help='the number of worker processes planning trips')
+    parser.add_argument('--cache-size', type=int, default=CACHE_SIZE,
+                        help='the number of plans kept in the cache')
+    parser.add_argument('--ttl', type=float, default=CACHE_TTL,
+                        help='the number of seconds a plan stays in the cache')
+    parser.add_argument('--hotels-file', default=planner.HOTELS_FILE,
+                        help='the CSV file of the hotels trips can leave from')
+    args = parser.parse_args(argv)
+
+    service = PlanService(planner.load_planner(args.hotels_file), args.processes,
+                          PlanCache(args.cache_size, args.ttl))
+    print('Serving on http://' + args.host + ':' + str(args.port))
+
+    try:
+        asyncio.run(service.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+"""This module shares the arrays of the city and subway graphs between processes, using
+multiprocessing.shared_memory.
+
+The parent process copies the arrays that the graphs are made of (the same ones stored in
+snapshots: coordinates, ratings, opening hours and edges in compressed sparse row form) into
+shared memory blocks once. Worker processes then attach to those blocks and rebuild their graphs
+around read-only views of them, so the large edge arrays exist only once, however many workers
+there are.
+
+This file is Copyright (c) 2021 Leen Al Lababidi, Michael Rubenstein, Maria Becerra and Nada Eldin
+"""
+from __future__ import annotations
+from typing import Optional
+from multiprocessing import shared_memory
+import numpy as np
+from graphs import CityLocations, SubwayLines
+from route_table import RouteTable
+import snapshot
+
+# the number of bytes each array is aligned to inside of a block
+ALIGNMENT = 64
+
+# the blocks attached by the current process, kept open for as long as the process uses them
+_attached = []
+
+
+class SharedArrays:
+    """A group of named numpy arrays stored in a single shared memory block.
+
+    Instance Attributes:
+        - name: the name of the shared memory block
+        - layout: maps the name of each array to its (offset in bytes, dtype, shape) in the block
+        - arrays: maps the name of each array to a view of it in the block
+    """
+    name: str
+    layout: dict[str, tuple[int, str, tuple[int, ...]]]
+    arrays: dict[str, np.ndarray]
+    # Private Instance Attributes:
+    #     - _memory: the shared memory block
+    _memory: shared_memory.SharedMemory
+
+    def __init__(self, memory: shared_memory.SharedMemory,
+                 layout: dict[str, tuple[int, str, tuple[int, ...]]], writeable: bool) -> None:
+        """Initialize views of the arrays in the given block, at the positions given by layout.
+        """
+        self.name = memory.name
+        self.layout = layout
+        self._memory = memory
+
+        self.arrays = {}
+        for key, (offset, dtype, shape) in layout.items():
+            array = np.ndarray(shape, dtype=np.dtype(dtype), buffer=memory.buf, offset=offset)
+            array.flags.writeable = writeable
+            self.arrays[key] = array
+
+    def descriptor(self) -> tuple[str, dict[str, tuple[int, str, tuple[int, ...]]]]:
+        """Return the information another process needs to attach to this block, which can be
+        pickled cheaply.
+        """
+        return (self.name, self.layout)
+
+    def close(self) -> None:
+        """Stop using the block in this process. The arrays of this object must not be used
+        afterwards.
+        """
+        self.arrays = {}
+        self._memory.close()
+
+    def unlink(self) -> None:
+        """Free the block, once no process needs it anymore. This should be called once, by the
+        process that created the block.
+        """
+        self._memory.unlink()
+
+
+class SharedGraphs:
+    """The arrays of a city graph and of a subway graph, copied into shared memory blocks.
+
+    Instance Attributes:
+        - city: the arrays of the city graph
+        - subway: the arrays of the subway graph
+        - transit: the arrays of the line-aware model of the subway network
+        - routes: the arrays of its table of shortest routes, if it was computed
+        - transfer_penalty: the transfer penalty of the line-aware model
+    """
+    city: SharedArrays
+    subway: SharedArrays
+    transit: SharedArrays
+    routes: Optional[SharedArrays]
+    transfer_penalty: float
+
+    def __init__(self, city_graph: CityLocations, subway_graph: SubwayLines) -> None:
+        """Copy the arrays of the given graphs into new shared memory blocks.
+
+        Preconditions:
+            - city_graph.hotel is None
+            - subway_graph.transit is not None
+        """
+        transit = subway_graph.transit
+
+        self.city = export_arrays(snapshot.graph_arrays(city_graph))
+        self.subway = export_arrays(snapshot.graph_arrays(subway_graph))
+        self.transit = export_arrays(snapshot.transit_arrays(transit))
+        self.transfer_penalty = transit.transfer_penalty
+
+        if transit.routes is not None:
+            self.routes = export_arrays({'costs': transit.routes.costs,
+                                         'predecessors': transit.routes.predecessors})
+        else:
+            self.routes = None
+
+    def descriptor(self) -> dict:
+        """Return the information another process needs to attach to these graphs with
+        attach_graphs, which can be pickled cheaply.
+        """
+        return {'city': self.city.descriptor(),
+                'subway': self.subway.descriptor(),
+                'transit': self.transit.descriptor(),
+                'routes': None if self.routes is None else self.routes.descriptor(),
+                'transfer_penalty': self.transfer_penalty}
+
+    def close(self) -> None:
+        """Stop using the blocks in this process, and free them."""
+        blocks = [self.city, self.subway, self.transit]
+        if self.routes is not None:
+            blocks.append(self.routes)
+
+        for block in blocks:
+            block.close()
+            block.unlink()
+
+
+def export_arrays(arrays: dict[str, np.ndarray]) -> SharedArrays:
+    """Return a new shared memory block holding a copy of each of the given arrays."""
+    # ACCUMULATOR: the position of each array in the block
+    layout = {}
+    size = 0
+
+    for key, array in arrays.items():
+        size = -(-size // ALIGNMENT) * ALIGNMENT  # round up to the next aligned position
+        layout[key] = (size, array.dtype.str, array.shape)
+        size += array.nbytes
+
+    memory = shared_memory.SharedMemory(create=True, size=max(size, 1))
+    shared = SharedArrays(memory, layout, writeable=True)
+
+    for key, array in arrays.items():
+        shared.arrays[key][...] = array
+        shared.arrays[key].flags.writeable = False
+
+    return shared
+
+
+def attach_arrays(descriptor: tuple[str, dict[str, tuple[int, str, tuple[int, ...]]]])\
+        -> SharedArrays:
+    """Return read-only views of the arrays in the shared memory block with the given
+    descriptor, as returned by SharedArrays.descriptor.
+
+    The block stays open for as long as the current process runs.
+    """
+    name, layout = descriptor
+    shared = SharedArrays(shared_memory.SharedMemory(name=name), layout, writeable=False)
+    _attached.append(shared)
+
+    return shared
+
+
+def attach_graphs(descriptor: dict) -> tuple[CityLocations, SubwayLines]:
+    """Return the city and subway graphs whose arrays are in the shared memory blocks with the
+    given descriptor, as returned by SharedGraphs.descriptor.
+
+    The edges of the graphs are read-only views of the shared memory, and are never copied.
+    """
+    city_graph = snapshot.graph_from_arrays(attach_arrays(descriptor['city']).arrays,
+                                            CityLocations())
+    subway_graph = snapshot.graph_from_arrays(attach_arrays(descriptor['subway']).arrays,
+                                              SubwayLines())
+    subway_graph.transit = snapshot.transit_from_arrays(
+        attach_arrays(descriptor['transit']).arrays, descriptor['transfer_penalty'])
+
+    if descriptor['routes'] is not None:
+        routes = attach_arrays(descriptor['routes']).arrays
+        subway_graph.transit.routes = RouteTable(routes['costs'], routes['predecessors'])
+
+    return (city_graph, subway_graph)
+
+
+if __name__ == "__main__":
+    import python_ta
+    python_ta.check_all(config={
+        'extra-imports': ['multiprocessing', 'numpy', 'graphs', 'route_table', 'snapshot'],
+        'allowed-io': [],  # the names (strs) of functions that call print/open/input
+        'max-line-length': 100,
+        'disable': ['E1136']
+    })
+
+    import python_ta.contracts
+    python_ta.contracts.DEBUG_CONTRACTS = False
+    python_ta.contracts.check_all_contracts()
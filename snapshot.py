@@ -0,0 +1,326 @@
+"""This module saves the city and subway graphs as compiled binary snapshots, so that they do not
+need to be rebuilt from the CSV files every time the program starts.
+
+A snapshot stores the graph as compact numpy arrays: the coordinates, ratings and opening hours
+of each location, and the edges in compressed sparse row (CSR) form along with their lengths. Each
+snapshot is keyed by a hash of the CSV files it was built from, so it is rebuilt automatically
+when the data changes.
+
+Several processes can share the same cache directory: each snapshot is written to a file of its
+own before it replaces the old one, and a snapshot that cannot be read, such as one cut short, is
+rebuilt as if it did not exist.
+
+This file is Copyright (c) 2021 Leen Al Lababidi, Michael Rubenstein, Maria Becerra and Nada Eldin
+"""
+from __future__ import annotations
+from typing import Callable, Mapping, Optional
+from datetime import time
+import hashlib
+import logging
+import os
+import re
+import tempfile
+import zipfile
+import numpy as np
+from location import Location, Landmark, Restaurant, SubwayStation
+import graphs
+from graphs import Graph, CityLocations, SubwayLines
+from opening_hours import DAYS, opening_times_array
+from route_table import RouteTable
+from transit import TRANSFER_PENALTY, TransitNetwork
+import instrumentation
+
+# the directory where snapshots are saved
+CACHE_DIR = '.cache'
+
+# changing this invalidates every existing snapshot
+SNAPSHOT_VERSION = 3
+
+# the number of hexadecimal digits of the key of a snapshot
+KEY_LENGTH = 16
+
+# codes used to store the kind of each location
+KINDS = [Landmark, Restaurant, SubwayStation]
+
+# the errors raised when reading a snapshot that is missing, cut short or from another version
+READ_ERRORS = (OSError, EOFError, ValueError, KeyError, zipfile.BadZipFile)
+
+logger = logging.getLogger(__name__)
+
+
+def snapshot_key(files: list[str], *params: object) -> str:
+    """Return a hash of the contents of the given files and of the given parameters.
+    """
+    digest = hashlib.sha256(str((SNAPSHOT_VERSION,) + params).encode('utf-8'))
+
+    for file in files:
+        with open(file, 'rb') as f:
+            digest.update(f.read())
+
+    return digest.hexdigest()[:KEY_LENGTH]
+
+
+@instrumentation.timed('load_city_snapshot')
+def load_base_city_graph(landmarks_file: str, restaurants_file: str, subway_file: str,
+                         cache_dir: str = CACHE_DIR) -> CityLocations:
+    """Return the same graph as graphs.load_base_city_graph, loading it from a snapshot in
+    cache_dir when one exists for the given files.
+
+    If there is no snapshot yet, the graph is built from the CSV files and a snapshot is saved.
+    """
+    key = snapshot_key([landmarks_file, restaurants_file, subway_file],
+                       graphs.PROXIMITY_THRESHOLD)
+    path = os.path.join(cache_dir, 'city-' + key + '.npz')
+
+    city_graph = _read_if_possible(lambda: read_snapshot(path, CityLocations()), path)
+
+    if city_graph is not None:
+        instrumentation.count('snapshot_hits')
+    else:
+        instrumentation.count('snapshot_misses')
+        city_graph = graphs.load_base_city_graph(landmarks_file, restaurants_file, subway_file)
+        write_snapshot(path, city_graph)
+
+    return city_graph
+
+
+@instrumentation.timed('load_subway_snapshot')
+def load_subway_graph(subway_file: str, subway_lines_file: str, precompute_routes: bool = False,
+                      transfer_penalty: float = TRANSFER_PENALTY, cache_dir: str = CACHE_DIR)\
+        -> SubwayLines:
+    """Return the same graph as graphs.load_subway_graph, loading it from a snapshot in
+    cache_dir when one exists for the given files.
+
+    If there is no snapshot yet, the graph is built from the CSV files and a snapshot is saved.
+    The same goes for the table of shortest routes, if precompute_routes is True.
+    """
+    key = snapshot_key([subway_file, subway_lines_file])
+    path = os.path.join(cache_dir, 'subway-' + key + '.npz')
+    transit_path = os.path.join(cache_dir, 'transit-' + key + '.npz')
+
+    subway_graph = _read_if_possible(lambda: read_snapshot(path, SubwayLines()), path)
+    transit = _read_if_possible(lambda: read_transit(transit_path, transfer_penalty),
+                                transit_path)
+
+    if subway_graph is not None and transit is not None:
+        instrumentation.count('snapshot_hits')
+        subway_graph.transit = transit
+    else:
+        instrumentation.count('snapshot_misses')
+        subway_graph = graphs.load_subway_graph(subway_file, subway_lines_file,
+                                                transfer_penalty=transfer_penalty)
+        write_snapshot(path, subway_graph)
+        write_transit(transit_path, subway_graph.transit)
+
+    if precompute_routes:
+        # the routes depend on the transfer penalty, so the tables of different penalties are
+        # kept side by side
+        routes_key = snapshot_key([subway_file, subway_lines_file], transfer_penalty)
+        routes_path = os.path.join(cache_dir, 'routes-' + format(transfer_penalty, 'g') + '-'
+                                   + routes_key + '.npz')
+        routes = _read_if_possible(lambda: read_route_table(routes_path), routes_path)
+
+        if routes is not None:
+            instrumentation.count('snapshot_hits')
+            subway_graph.transit.routes = routes
+        else:
+            instrumentation.count('snapshot_misses')
+            subway_graph.transit.routes = subway_graph.transit.build_route_table()
+            write_route_table(routes_path, subway_graph.transit.routes)
+
+    return subway_graph
+
+
+def write_snapshot(path: str, graph: Graph) -> None:
+    """Save the given graph as a snapshot at path.
+
+    Preconditions:
+        - all(isinstance(loc, tuple(KINDS)) for loc in graph.get_all_vertices())
+    """
+    _save_arrays(path, **graph_arrays(graph))
+
+
+def read_snapshot(path: str, graph: Graph) -> Graph:
+    """Add the vertices and edges of the snapshot at path to the given empty graph, and
+    return it.
+    """
+    with np.load(path, allow_pickle=False) as data:
+        return graph_from_arrays(data, graph)
+
+
+def graph_arrays(graph: Graph) -> dict[str, np.ndarray]:
+    """Return the arrays that a snapshot of the given graph is made of, by name.
+
+    Preconditions:
+        - all(isinstance(loc, tuple(KINDS)) for loc in graph.get_all_vertices())
+    """
+    locations, indptr, indices, weights = graph.export_adjacency()
+    n = len(locations)
+
+    kinds = np.zeros(n, dtype=np.int8)
+    ratings = np.zeros(n, dtype=np.float64)
+    opening_times = opening_times_array(locations)  # minutes since midnight, -1 if closed
+
+    for i in range(0, n):
+        kinds[i] = KINDS.index(type(locations[i]))
+
+        if isinstance(locations[i], (Landmark, Restaurant)):
+            ratings[i] = locations[i].rating
+
+    return {'names': np.array([loc.name for loc in locations], dtype=np.str_),
+            'kinds': kinds,
+            'coordinates': np.array([loc.location for loc in locations], dtype=np.float64),
+            'ratings': ratings,
+            'opening_times': opening_times,
+            'indptr': indptr,
+            'indices': indices,
+            'weights': weights}
+
+
+def graph_from_arrays(arrays: Mapping[str, np.ndarray], graph: Graph) -> Graph:
+    """Add the vertices and edges stored in the given arrays, as returned by graph_arrays, to the
+    given empty graph, and return it.
+
+    The graph uses the given edge arrays directly, without copying them.
+    """
+    names = arrays['names'].tolist()
+    kinds = arrays['kinds'].tolist()
+    coordinates = arrays['coordinates'].tolist()
+    ratings = arrays['ratings'].tolist()
+    opening_times = arrays['opening_times'].tolist()
+    indptr = arrays['indptr']
+    indices = arrays['indices']
+    weights = arrays['weights']
+
+    for i in range(0, len(names)):
+        graph.add_vertex(_make_location(names[i], KINDS[kinds[i]], tuple(coordinates[i]),
+                                        ratings[i], opening_times[i]))
+
+    graph.import_adjacency(indptr, indices, weights)
+
+    return graph
+
+
+def write_transit(path: str, transit: TransitNetwork) -> None:
+    """Save the platforms and edges of the given line-aware subway network at path."""
+    _save_arrays(path, **transit_arrays(transit))
+
+
+def read_transit(path: str, transfer_penalty: float) -> TransitNetwork:
+    """Return the line-aware subway network saved at path, with the given transfer penalty."""
+    with np.load(path, allow_pickle=False) as data:
+        return transit_from_arrays(data, transfer_penalty)
+
+
+def transit_arrays(transit: TransitNetwork) -> dict[str, np.ndarray]:
+    """Return the arrays that the platforms and edges of the given line-aware subway network are
+    saved as, by name.
+    """
+    return {'names': np.array(transit.names, dtype=np.str_),
+            'coordinates': transit.coordinates,
+            'indptr': transit.indptr,
+            'indices': transit.indices,
+            'times': transit.times}
+
+
+def transit_from_arrays(arrays: Mapping[str, np.ndarray], transfer_penalty: float)\
+        -> TransitNetwork:
+    """Return the line-aware subway network stored in the given arrays, as returned by
+    transit_arrays, with the given transfer penalty.
+    """
+    return TransitNetwork(arrays['names'].tolist(), arrays['coordinates'], arrays['indptr'],
+                          arrays['indices'], arrays['times'], transfer_penalty)
+
+
+def write_route_table(path: str, routes: RouteTable) -> None:
+    """Save the given table of shortest routes at path."""
+    _save_arrays(path, costs=routes.costs, predecessors=routes.predecessors)
+
+
+def read_route_table(path: str) -> RouteTable:
+    """Return the table of shortest routes saved at path."""
+    with np.load(path, allow_pickle=False) as data:
+        return RouteTable(data['costs'], data['predecessors'])
+
+
+def _read_if_possible(read: Callable[[], object], path: str) -> Optional[object]:
+    """Return what read returns when reading the snapshot at path, or None if there is no such
+    snapshot or it cannot be read.
+    """
+    try:
+        return read()
+    except FileNotFoundError:
+        return None
+    except READ_ERRORS as error:  # the snapshot is rebuilt, replacing the broken one
+        logger.warning('Cannot read the snapshot %s: %s', path, error)
+        return None
+
+
+def _save_arrays(path: str, **arrays: np.ndarray) -> None:
+    """Save the given arrays as an .npz file at path, whose name is a prefix followed by a key
+    returned by snapshot_key.
+
+    Files of the same kind, whose names are the same prefix followed by a different key, are
+    removed, since they are out of date. The file is written to a temporary file of its own
+    first, so an interrupted write never leaves a broken file behind, and processes saving the
+    same snapshot at once do not write over each other.
+    """
+    directory, filename = os.path.split(path)
+    os.makedirs(directory, exist_ok=True)
+
+    descriptor, temporary_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(descriptor, 'wb') as file:
+            np.savez(file, **arrays)
+        os.replace(temporary_path, path)
+    except BaseException:
+        os.remove(temporary_path)
+        raise
+
+    # remove the outdated files of the same kind
+    prefix = filename[:len(filename) - len('.npz') - KEY_LENGTH]
+    outdated = re.compile(re.escape(prefix) + '[0-9a-f]{' + str(KEY_LENGTH) + '}'
+                          + re.escape('.npz'))
+    for other in os.listdir(directory):
+        if outdated.fullmatch(other) and other != filename:
+            try:
+                os.remove(os.path.join(directory, other))
+            except FileNotFoundError:  # another process removed it first
+                pass
+
+
+def _make_location(name: str, kind: type, coordinates: tuple[float, float], rating: float,
+                   opening_times: list[list[int]]) -> Location:
+    """Return a location of the given kind, from the values stored in a snapshot."""
+    if kind is SubwayStation:
+        return SubwayStation(name, coordinates)
+
+    hours = {}
+    for day in range(0, 7):
+        open_time, close_time = opening_times[day]
+        if open_time == -1:
+            hours[DAYS[day]] = None
+        else:
+            hours[DAYS[day]] = (time(hour=open_time // 60, minute=open_time % 60),
+                                time(hour=close_time // 60, minute=close_time % 60))
+
+    if kind is Restaurant:
+        return Restaurant(name, coordinates, hours, int(rating))
+    else:
+        return Landmark(name, coordinates, hours, rating)
+
+
+if __name__ == "__main__":
+    import python_ta
+    python_ta.check_all(config={
+        'extra-imports': ['datetime', 'hashlib', 'logging', 'os', 're', 'tempfile', 'zipfile',
+                          'numpy', 'location', 'graphs', 'opening_hours', 'route_table',
+                          'transit', 'instrumentation'],
+        'allowed-io': ['snapshot_key'],
+        'max-line-length': 100,
+        'disable': ['E1136']
+    })
+
+    import python_ta.contracts
+    python_ta.contracts.DEBUG_CONTRACTS = False
+    python_ta.contracts.check_all_contracts()
@@ -0,0 +1,181 @@
+"""This module contains a grid-based spatial index used to quickly find locations that are
+geographically close to each other, without comparing every pair of locations.
+
+This file is Copyright (c) 2021 Leen Al Lababidi, Michael Rubenstein, Maria Becerra and Nada Eldin
+"""
+from __future__ import annotations
+from typing import Hashable, Iterator
+import math
+
+EARTH_RADIUS = 6371000  # radius of the earth, in meters
+
+# offsets of the neighbouring cells that come "after" a cell, so each pair of cells is only
+# visited once when generating cell blocks
+_FORWARD_NEIGHBOURS = [(0, 1), (1, -1), (1, 0), (1, 1)]
+
+
+class GridIndex:
+    """A spatial index that buckets points into square cells of a fixed size.
+
+    Coordinates are projected onto a plane (in meters) using an equirectangular projection. The
+    longitude is scaled using the latitude furthest from the equator, so projected distances never
+    overestimate the real distance between two points. This means any two points at most
+    cell_size meters apart are always in the same or in neighbouring cells.
+
+    Instance Attributes:
+        - cell_size: the width of each cell, in meters
+
+    Representation Invariants:
+        - self.cell_size > 0
+    """
+    cell_size: float
+    # Private Instance Attributes:
+    #     - _lon_scale: the cosine of the reference latitude used for the projection
+    #     - _cells: maps a cell to the keys of the points inside of it
+    #     - _points: maps a key to the cell it is in
+    _lon_scale: float
+    _cells: dict[tuple[int, int], list[Hashable]]
+    _points: dict[Hashable, tuple[int, int]]
+
+    def __init__(self, cell_size: float, reference_lat: float = 0.0) -> None:
+        """Initialize an empty index with the given cell size, in meters.
+
+        reference_lat should be the latitude furthest from the equator of the points that will be
+        stored in this index.
+        """
+        self.cell_size = cell_size
+        self._lon_scale = math.cos(math.radians(min(abs(reference_lat), 89.0)))
+        self._cells = {}
+        self._points = {}
+
+    def __len__(self) -> int:
+        """Return the number of points stored in this index."""
+        return len(self._points)
+
+    def __contains__(self, key: Hashable) -> bool:
+        """Return whether a point with the given key is stored in this index."""
+        return key in self._points
+
+    def cell_of(self, coordinates: tuple[float, float]) -> tuple[int, int]:
+        """Return the cell that the given (latitude, longitude) coordinates fall in."""
+        lat, lon = coordinates
+        x = EARTH_RADIUS * math.radians(lon) * self._lon_scale
+        y = EARTH_RADIUS * math.radians(lat)
+        return (math.floor(x / self.cell_size), math.floor(y / self.cell_size))
+
+    def insert(self, key: Hashable, coordinates: tuple[float, float]) -> None:
+        """Add a point with the given key and (latitude, longitude) coordinates to this index.
+
+        Do nothing if the key is already in this index.
+        """
+        if key not in self._points:
+            cell = self.cell_of(coordinates)
+            self._points[key] = cell
+            self._cells.setdefault(cell, []).append(key)
+
+    def remove(self, key: Hashable) -> None:
+        """Remove the point with the given key from this index.
+
+        Raise a ValueError if the key is not in this index.
+        """
+        if key not in self._points:
+            raise ValueError
+
+        cell = self._points.pop(key)
+        self._cells[cell].remove(key)
+        if not self._cells[cell]:
+            del self._cells[cell]
+
+    def nearby(self, coordinates: tuple[float, float], radius: float) -> Iterator[Hashable]:
+        """Yield the keys of every point that could be within radius meters of the given
+        coordinates.
+
+        This may also yield points that are further away, so callers should still check the real
+        distance.
+        """
+        for keys in self.nearby_cells(coordinates, radius):
+            yield from keys
+
+    def nearby_cells(self, coordinates: tuple[float, float], radius: float)\
+            -> Iterator[list[Hashable]]:
+        """Yield the keys of the points in each non-empty cell that could have points within
+        radius meters of the given coordinates, one list per cell.
+
+        The keys of each cell are in the order they were inserted.
+        """
+        cx, cy = self.cell_of(coordinates)
+        reach = math.ceil(radius / self.cell_size)
+
+        for dx in range(-reach, reach + 1):
+            for dy in range(-reach, reach + 1):
+                keys = self._cells.get((cx + dx, cy + dy))
+                if keys is not None:
+                    yield keys
+
+    def ring(self, coordinates: tuple[float, float], distance: int) -> Iterator[Hashable]:
+        """Yield the keys of every point in the cells that are exactly distance cells away from
+        the cell of the given coordinates, horizontally, vertically or diagonally.
+
+        Every point that is not in one of the first distance + 1 rings is more than
+        distance * cell_size meters away from the given coordinates.
+        """
+        cx, cy = self.cell_of(coordinates)
+
+        if distance == 0:
+            yield from self._cells.get((cx, cy), [])
+            return
+
+        for d in range(-distance, distance + 1):
+            # top and bottom rows of the ring
+            yield from self._cells.get((cx + d, cy - distance), [])
+            yield from self._cells.get((cx + d, cy + distance), [])
+
+        for d in range(-distance + 1, distance):
+            # left and right columns of the ring, without the corners
+            yield from self._cells.get((cx - distance, cy + d), [])
+            yield from self._cells.get((cx + distance, cy + d), [])
+
+    def cell_blocks(self) -> Iterator[tuple[list[Hashable], list[Hashable]]]:
+        """Yield pairs of key lists (keys, others), so that every pair of points in the same or in
+        neighbouring cells is made of one point from keys and one point from others.
+
+        For pairs inside a single cell, keys and others are the same list object, and each
+        unordered pair then appears twice (once in each order) along with every point paired
+        with itself. Pairs between two different cells are only covered once.
+        """
+        for (cx, cy), keys in self._cells.items():
+            # pairs inside of the same cell
+            yield (keys, keys)
+
+            # pairs with the neighbouring cells
+            for dx, dy in _FORWARD_NEIGHBOURS:
+                others = self._cells.get((cx + dx, cy + dy))
+                if others is not None:
+                    yield (keys, others)
+
+
+def build_grid_index(points: dict[Hashable, tuple[float, float]], cell_size: float) -> GridIndex:
+    """Return a GridIndex containing all the given points, which map a key to its
+    (latitude, longitude) coordinates.
+    """
+    reference_lat = max((abs(lat) for lat, _ in points.values()), default=0.0)
+    index = GridIndex(cell_size, reference_lat)
+
+    for key, coordinates in points.items():
+        index.insert(key, coordinates)
+
+    return index
+
+
+if __name__ == "__main__":
+    import python_ta
+    python_ta.check_all(config={
+        'extra-imports': ['math'],
+        'allowed-io': [],  # the names (strs) of functions that call print/open/input
+        'max-line-length': 100,
+        'disable': ['E1136']
+    })
+
+    import python_ta.contracts
+    python_ta.contracts.DEBUG_CONTRACTS = False
+    python_ta.contracts.check_all_contracts()
@@ -0,0 +1,344 @@
+"""This module generates synthetic cities, written as CSV files in the same formats as the Paris
+data in the data directory, so that the program can be run on cities of any size.
+
+A synthetic city is a square whose area grows with its number of points of interest, so that
+their density stays the same as the city grows. Most points of interest are gathered in clusters
+of very different sizes around random centres, like the neighbourhoods of a real city, and the
+rest are spread over the whole city. Landmarks and restaurants follow a few common kinds of
+opening hours, such as museums closed on one day of the week or restaurants open past midnight.
+
+The subway is made of straight lines with some noise, each starting at a station of an earlier
+line so that the network is connected. A line going close enough to a station of another line
+stops at that station, which then has a platform for each of its lines, like in the Paris data.
+
+This file is Copyright (c) 2021 Leen Al Lababidi, Michael Rubenstein, Maria Becerra and Nada Eldin
+"""
+from __future__ import annotations
+from typing import Optional
+import csv
+import math
+import os
+import numpy as np
+
+# the number of points of interest per square kilometer
+DENSITY = 50
+
+# the share of points of interest that are restaurants, as in the Paris data
+RESTAURANT_SHARE = 0.8
+
+# the number of points of interest for every subway station, as in the Paris data
+POINTS_PER_STATION = 20
+
+# the average number of points of interest in a cluster, and the share of them in clusters
+CLUSTER_SIZE = 150
+CLUSTERED_SHARE = 0.75
+
+# the range of the standard deviation, in meters, of the distance to the centre of a cluster of
+# CLUSTER_SIZE points of interest. Larger clusters spread further, so they are not denser.
+CLUSTER_SPREAD = (150.0, 600.0)
+
+# the distance in meters between two stations of a line, and how close a line must pass to a
+# station of another line to stop there
+STATION_SPACING = 600.0
+TRANSFER_DISTANCE = 150.0
+
+# the speed of a train in meters per second, the time in seconds it waits at each station, and
+# the time in seconds it takes to walk between two platforms of a station, as in the Paris data
+SUBWAY_SPEED = 12.0
+DWELL_TIME = 20.0
+TRANSFER_TIME = 120
+
+# the centre of the city, which is the centre of Paris
+CENTRE = (48.8566, 2.3522)
+
+# the kinds of opening hours, as (opens, closes, probability, may close one weekday)
+LANDMARK_HOURS = [('0900', '1800', 0.35, True),
+                  ('1000', '1700', 0.25, True),
+                  ('0000', '2359', 0.2, False),
+                  ('1100', '1900', 0.1, False),
+                  ('1900', '0200', 0.1, False)]
+RESTAURANT_HOURS = [('1100', '2300', 0.4, True),
+                    ('0700', '2000', 0.2, False),
+                    ('1200', '1430', 0.15, True),
+                    ('1900', '0030', 0.15, True),
+                    ('1100', '0200', 0.1, False)]
+
+# the probability of each rating from 1 to 5
+LANDMARK_RATINGS = [0.03, 0.07, 0.2, 0.4, 0.3]
+RESTAURANT_RATINGS = [0.05, 0.1, 0.3, 0.35, 0.2]
+
+
+class CityFiles:
+    """The paths to the CSV files of a city.
+
+    Instance Attributes:
+        - landmarks: the landmarks, in the format of data/paris-attraction-final.csv
+        - restaurants: the restaurants, in the format of data/paris-restaurant-organized-final.csv
+        - subway: the subway stations, in the format of data/paris_metro_stations.csv
+        - subway_lines: the subway lines, in the format of data/paris_metro_lines.csv
+        - hotels: the hotels, in the format of data/paris-hotel.csv
+    """
+    landmarks: str
+    restaurants: str
+    subway: str
+    subway_lines: str
+    hotels: str
+
+    def __init__(self, landmarks: str, restaurants: str, subway: str, subway_lines: str,
+                 hotels: str) -> None:
+        """Initialize the paths to the files of a city."""
+        self.landmarks = landmarks
+        self.restaurants = restaurants
+        self.subway = subway
+        self.subway_lines = subway_lines
+        self.hotels = hotels
+
+
+def generate_city(directory: str, points_of_interest: int, stations: Optional[int] = None,
+                  hotels: int = 5, density: float = DENSITY, seed: int = 0) -> CityFiles:
+    """Write the CSV files of a synthetic city in directory, and return their paths.
+
+    The city has the given number of points of interest (landmarks and restaurants), subway
+    stations and hotels. Without a number of stations, there is one station for every
+    POINTS_PER_STATION points of interest. The same seed always generates the same city.
+
+    Preconditions:
+        - points_of_interest >= 1
+        - stations is None or stations >= 2
+        - hotels >= 1
+        - density > 0
+    """
+    if stations is None:
+        stations = max(2, points_of_interest // POINTS_PER_STATION)
+
+    rng = np.random.default_rng(seed)
+    side = math.sqrt(points_of_interest / density) * 1000
+
+    # the neighbourhoods, with a few large ones and many small ones
+    clusters = max(1, points_of_interest // CLUSTER_SIZE)
+    centres = rng.uniform(-side / 2, side / 2, (clusters, 2))
+    weights = rng.pareto(1.5, clusters) + 1
+    weights /= weights.sum()
+    spreads = rng.uniform(CLUSTER_SPREAD[0], CLUSTER_SPREAD[1], clusters) \
+        * np.sqrt(weights * points_of_interest / CLUSTER_SIZE)
+
+    points = _clustered_points(rng, points_of_interest, side, centres, weights, spreads)
+    is_restaurant = rng.random(points_of_interest) < RESTAURANT_SHARE
+
+    os.makedirs(directory, exist_ok=True)
+    files = CityFiles(os.path.join(directory, 'attractions.csv'),
+                      os.path.join(directory, 'restaurants.csv'),
+                      os.path.join(directory, 'subway_stations.csv'),
+                      os.path.join(directory, 'subway_lines.csv'),
+                      os.path.join(directory, 'hotels.csv'))
+
+    _write_landmarks(files.landmarks, rng, points[~is_restaurant])
+    _write_restaurants(files.restaurants, rng, points[is_restaurant])
+    _write_subway(files.subway, files.subway_lines, rng, stations, side, centres, weights)
+
+    # hotels are in the neighbourhoods, close to their centres
+    chosen = rng.choice(clusters, hotels, p=weights)
+    hotel_points = centres[chosen] + rng.normal(0.0, 1.0, (hotels, 2)) * spreads[chosen, None] / 2
+    with open(files.hotels, 'w', encoding='utf-8', newline='') as file:
+        writer = csv.writer(file)
+        for i in range(0, hotels):
+            lat, lon = _to_coordinates(hotel_points[i])
+            writer.writerow(['Hotel ' + str(i), str(i) + ' Synthetic Street', 'hotel-' + str(i),
+                             lat, lon])
+
+    return files
+
+
+def _clustered_points(rng: np.random.Generator, n: int, side: float, centres: np.ndarray,
+                      weights: np.ndarray, spreads: np.ndarray) -> np.ndarray:
+    """Return an array of shape (n, 2) of the positions in meters, from the centre of the city,
+    of n points, CLUSTERED_SHARE of them in the given clusters and the rest anywhere in the city.
+    """
+    chosen = rng.choice(len(centres), n, p=weights)
+    clustered = centres[chosen] + rng.normal(0.0, 1.0, (n, 2)) * spreads[chosen, None]
+    anywhere = rng.uniform(-side / 2, side / 2, (n, 2))
+
+    return np.where((rng.random(n) < CLUSTERED_SHARE)[:, None], clustered, anywhere)
+
+
+def _to_coordinates(point: np.ndarray) -> tuple[float, float]:
+    """Return the latitude and longitude of the given position in meters from the centre of the
+    city, east and north.
+    """
+    lat = CENTRE[0] + float(point[1]) / 111320
+    lon = CENTRE[1] + float(point[0]) / (111320 * math.cos(math.radians(CENTRE[0])))
+    return (round(lat, 7), round(lon, 7))
+
+
+def _opening_hours(rng: np.random.Generator, n: int, kinds: list) -> list[list[str]]:
+    """Return the opening and closing times of n locations for each day of the week, starting
+    on Sunday, as in the columns of the Paris data. Each location follows one of the given kinds
+    of opening hours.
+    """
+    chosen = rng.choice(len(kinds), n, p=[kind[2] for kind in kinds])
+    closed_days = rng.choice([-1, 1, 2], n, p=[0.5, 0.3, 0.2])  # none, Monday or Tuesday
+
+    # ACCUMULATOR: the hours of each location
+    hours = []
+
+    for i in range(0, n):
+        opens, closes, _, may_close = kinds[chosen[i]]
+        row = []
+        for day in range(0, 7):
+            if may_close and day == closed_days[i]:
+                row.extend(['N/A', 'N/A'])
+            else:
+                row.extend([opens, closes])
+        hours.append(row)
+
+    return hours
+
+
+def _write_landmarks(path: str, rng: np.random.Generator, points: np.ndarray) -> None:
+    """Write landmarks at the given positions to the CSV file at path."""
+    hours = _opening_hours(rng, len(points), LANDMARK_HOURS)
+    ratings = rng.choice(np.arange(1, 6), len(points), p=LANDMARK_RATINGS)
+
+    with open(path, 'w', encoding='utf-8', newline='') as file:
+        writer = csv.writer(file)
+        for i in range(0, len(points)):
+            lat, lon = _to_coordinates(points[i])
+            writer.writerow([i, 'Landmark ' + str(i), str(i) + ' Synthetic Avenue, Paris, France',
+                             'attraction', 'Paris', lat, lon, 'landmark-' + str(i)]
+                            + hours[i] + [int(ratings[i])])
+
+
+def _write_restaurants(path: str, rng: np.random.Generator, points: np.ndarray) -> None:
+    """Write restaurants at the given positions to the CSV file at path."""
+    hours = _opening_hours(rng, len(points), RESTAURANT_HOURS)
+    ratings = rng.choice(np.arange(1, 6), len(points), p=RESTAURANT_RATINGS)
+
+    with open(path, 'w', encoding='utf-8', newline='') as file:
+        writer = csv.writer(file)
+        for i in range(0, len(points)):
+            lat, lon = _to_coordinates(points[i])
+            writer.writerow([i, 'Restaurant ' + str(i), str(i) + ' Synthetic Street, Paris, France',
+                             'restaurant', 'Paris', lat, lon, int(ratings[i]),
+                             'restaurant-' + str(i)] + hours[i])
+
+
+def _write_subway(stations_path: str, lines_path: str, rng: np.random.Generator, stations: int,
+                  side: float, centres: np.ndarray, weights: np.ndarray) -> None:
+    """Write a subway network with the given number of stations to the CSV files at
+    stations_path and lines_path.
+
+    Lines run between the centres of clusters, so that busy neighbourhoods have more stations.
+    """
+    # ACCUMULATORS: the name and position of each platform, the edges between platforms, and
+    # the first platform of each station in a grid of cells of TRANSFER_DISTANCE meters
+    names = []
+    points = []
+    edges = []
+    grid = {}
+    existing = 0
+
+    while existing < stations:
+        if names:
+            start = points[int(rng.integers(len(points)))]
+        else:
+            start = centres[rng.choice(len(centres), p=weights)]
+        end = centres[rng.choice(len(centres), p=weights)]
+        if math.dist(start, end) < side / 3:
+            end = rng.uniform(-side / 2, side / 2, 2)
+
+        count = max(2, int(math.dist(start, end) / STATION_SPACING) + 1)
+
+        # ACCUMULATOR: the platforms of this line, as (name, position, whether it is a new station)
+        line = []
+        new = 0
+
+        for k in range(0, count):
+            if existing + new >= stations:
+                break
+
+            point = start + (end - start) * k / (count - 1)
+            if k > 0:
+                point = point + rng.normal(0.0, STATION_SPACING / 5, 2)
+
+            transfer = _station_near(grid, points, point)
+            if transfer is not None and all(platform[0] != names[transfer] for platform in line):
+                line.append((names[transfer], points[transfer], False))
+            else:
+                line.append(('Station ' + str(existing + new), point, True))
+                new += 1
+
+        if len(line) < 2:
+            continue
+
+        for i in range(0, len(line)):
+            name, point, is_new = line[i]
+            if is_new:
+                grid.setdefault(_cell(point), []).append(len(names))
+
+            if i > 0:
+                seconds = round(math.dist(line[i - 1][1], point) / SUBWAY_SPEED + DWELL_TIME)
+                edges.append((len(names) - 1, len(names), seconds))
+                edges.append((len(names), len(names) - 1, seconds))
+
+            names.append(name)
+            points.append(point)
+
+        existing += new
+
+    # changing lines at a station takes the same time between any two of its platforms
+    platforms = {}
+    for p in range(0, len(names)):
+        platforms.setdefault(names[p], []).append(p)
+
+    for station in platforms.values():
+        for p1 in station:
+            edges.extend((p1, p2, TRANSFER_TIME) for p2 in station if p2 != p1)
+
+    with open(stations_path, 'w', encoding='utf-8', newline='') as file:
+        writer = csv.writer(file)
+        for i in range(0, len(names)):
+            lat, lon = _to_coordinates(points[i])
+            writer.writerow([str(i).zfill(4), names[i], lat, lon])
+
+    with open(lines_path, 'w', encoding='utf-8', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerows(edges)
+
+
+def _station_near(grid: dict[tuple[int, int], list[int]], points: list[np.ndarray],
+                  point: np.ndarray) -> Optional[int]:
+    """Return the first platform of the station closest to point, among the stations of grid at
+    most TRANSFER_DISTANCE meters away from it, or None if there are none.
+    """
+    x, y = _cell(point)
+
+    # the closest station so far, as (distance, platform)
+    closest = None
+
+    for cell in ((x + i, y + j) for i in (-1, 0, 1) for j in (-1, 0, 1)):
+        for platform in grid.get(cell, []):
+            distance = math.dist(points[platform], point)
+            if distance <= TRANSFER_DISTANCE and (closest is None or distance < closest[0]):
+                closest = (distance, platform)
+
+    return None if closest is None else closest[1]
+
+
+def _cell(point: np.ndarray) -> tuple[int, int]:
+    """Return the cell of the grid of TRANSFER_DISTANCE meters that the given position is in."""
+    return (int(point[0] // TRANSFER_DISTANCE), int(point[1] // TRANSFER_DISTANCE))
+
+
+if __name__ == "__main__":
+    import python_ta
+    python_ta.check_all(config={
+        'extra-imports': ['csv', 'math', 'os', 'numpy'],
+        'allowed-io': ['generate_city', '_write_landmarks', '_write_restaurants',
+                       '_write_subway'],
+        'max-line-length': 100,
+        'disable': ['E1136']
+    })
+
+    import python_ta.contracts
+    python_ta.contracts.DEBUG_CONTRACTS = False
+    python_ta.contracts.check_all_contracts()
@@ -0,0 +1,43 @@
+"""Tests for the routes found by the multimodal module, on the Paris data.
+
+This file is Copyright (c) 2021 Leen Al Lababidi, Michael Rubenstein, Maria Becerra and Nada Eldin
+"""
+import pytest
+from location import Landmark
+from multimodal import MultimodalRouter
+import planner
+
+HOTEL = 'Hôtel Ritz Paris'
+
+
+@pytest.fixture(scope='module')
+def trip_planner() -> planner.Planner:
+    """Return a planner for the Paris data."""
+    return planner.load_planner()
+
+
+def test_route_to_itself(trip_planner: planner.Planner) -> None:
+    """Test that the route from a location to itself takes no time and passes through no
+    station, for the hotel and for a landmark.
+    """
+    hotel = trip_planner.hotels[HOTEL]
+    landmark = trip_planner.city_graph.get_all_vertices(Landmark)[0]
+
+    with trip_planner.city_graph.attached(hotel):
+        router = MultimodalRouter(trip_planner.city_graph, trip_planner.subway_graph)
+
+        assert router.route(trip_planner.city_graph.hotel, trip_planner.city_graph.hotel) \
+            == (0.0, [])
+        assert router.route(landmark, landmark) == (0.0, [])
+
+
+def test_route_between_locations(trip_planner: planner.Planner) -> None:
+    """Test that the route between two different locations takes some time."""
+    hotel = trip_planner.hotels[HOTEL]
+    landmark = trip_planner.city_graph.get_all_vertices(Landmark)[0]
+
+    with trip_planner.city_graph.attached(hotel):
+        router = MultimodalRouter(trip_planner.city_graph, trip_planner.subway_graph)
+        time, _ = router.route(trip_planner.city_graph.hotel, landmark)
+
+    assert time > 0
@@ -0,0 +1,45 @@
+"""Tests for choosing the visits of a trip with the orienteering module, on the Paris data.
+
+This file is Copyright (c) 2021 Leen Al Lababidi, Michael Rubenstein, Maria Becerra and Nada Eldin
+"""
+import datetime
+import pytest
+import orienteering
+import planner
+
+HOTEL = 'Hôtel Ritz Paris'
+
+
+@pytest.fixture(scope='module')
+def trip_planner() -> planner.Planner:
+    """Return a planner for the Paris data."""
+    return planner.load_planner()
+
+
+@pytest.mark.parametrize('leave, return_time', [('09:00', '09:20'), ('03:00', '03:30'),
+                                                ('23:00', '23:59')])
+def test_no_visit_fits(trip_planner: planner.Planner, leave: str, return_time: str) -> None:
+    """Test that a trip too short to visit anything is refused, instead of planning a trip that
+    only leaves the hotel to come back to it.
+    """
+    hotel = trip_planner.hotels[HOTEL]
+    leave = datetime.datetime.fromisoformat('2021-04-16 ' + leave)
+    return_time = datetime.datetime.fromisoformat('2021-04-16 ' + return_time)
+
+    with trip_planner.city_graph.attached(hotel):
+        with pytest.raises(Exception, match='No open locations'):
+            orienteering.choose_visits(trip_planner.city_graph, trip_planner.subway_graph,
+                                       hotel, leave, return_time)
+
+    with pytest.raises(Exception, match='No open locations'):
+        trip_planner.plan(HOTEL, leave, return_time)
+
+
+def test_visits_fit(trip_planner: planner.Planner) -> None:
+    """Test that a day trip visits some places, all while they are open."""
+    path, trip_schedule = trip_planner.plan(HOTEL, datetime.datetime(2021, 4, 16, 9),
+                                            datetime.datetime(2021, 4, 16, 18))
+
+    assert path[0].name == HOTEL and path[-1].name == HOTEL
+    assert len(path) > 2
+    assert orienteering.outside_windows(trip_schedule) == []
@@ -0,0 +1,57 @@
+"""Tests for the answers of the HTTP service of the service module, on the Paris data.
+
+This file is Copyright (c) 2021 Leen Al Lababidi, Michael Rubenstein, Maria Becerra and Nada Eldin
+"""
+from typing import Iterator
+import asyncio
+import pytest
+import planner
+from service import PlanService
+
+
+@pytest.fixture(scope='module')
+def plan_service() -> Iterator[PlanService]:
+    """Yield a service planning trips in a thread, for the Paris data, and close it after."""
+    service = PlanService(planner.load_planner())
+    yield service
+    service.close()
+
+
+def exchange(plan_service: PlanService, request: bytes) -> bytes:
+    """Send request to plan_service on a new connection, and return everything it answers
+    until it closes the connection.
+    """
+    async def run() -> bytes:
+        """Start the service, send the request and read the answer."""
+        server = await asyncio.start_server(plan_service.handle_connection, '127.0.0.1', 0)
+        async with server:
+            port = server.sockets[0].getsockname()[1]
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            writer.write(request)
+            await writer.drain()
+            answer = await asyncio.wait_for(reader.read(), 10)
+            writer.close()
+            return answer
+
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize('request_head', [
+    b'garbage\r\n\r\n',
+    b'GET /stats\r\n\r\n',
+    b'GET /stats HTTP/1.1\r\nno colon here\r\n\r\n',
+    b'POST /plan HTTP/1.1\r\nContent-Length: ten\r\n\r\n',
+    b'POST /plan HTTP/1.1\r\nContent-Length: -5\r\n\r\n'])
+def test_malformed_request(plan_service: PlanService, request_head: bytes) -> None:
+    """Test that a request that cannot be read is answered with 400 Bad Request."""
+    answer = exchange(plan_service, request_head)
+
+    assert answer.startswith(b'HTTP/1.1 400 Bad Request\r\n')
+    assert b'Connection: close' in answer
+
+
+def test_stats(plan_service: PlanService) -> None:
+    """Test that a valid request is still answered."""
+    answer = exchange(plan_service, b'GET /stats HTTP/1.1\r\nConnection: close\r\n\r\n')
+
+    assert answer.startswith(b'HTTP/1.1 200 OK\r\n')
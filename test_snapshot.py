@@ -0,0 +1,69 @@
+"""Tests for saving and loading the snapshots of the snapshot module, on a small synthetic city.
+
+This file is Copyright (c) 2021 Leen Al Lababidi, Michael Rubenstein, Maria Becerra and Nada Eldin
+"""
+import os
+import pathlib
+import pytest
+import snapshot
+import synthetic_city
+
+
+@pytest.fixture(scope='module')
+def city(tmp_path_factory: pytest.TempPathFactory) -> synthetic_city.CityFiles:
+    """Return the files of a small synthetic city."""
+    return synthetic_city.generate_city(str(tmp_path_factory.mktemp('city')), 200)
+
+
+def test_broken_snapshot_is_rebuilt(city: synthetic_city.CityFiles,
+                                    tmp_path: pathlib.Path) -> None:
+    """Test that a snapshot cut short is rebuilt instead of failing to load."""
+    cache_dir = str(tmp_path)
+    expected = snapshot.load_base_city_graph(city.landmarks, city.restaurants, city.subway,
+                                             cache_dir)
+    [name] = os.listdir(cache_dir)
+
+    with open(os.path.join(cache_dir, name), 'r+b') as file:
+        file.truncate(100)
+
+    city_graph = snapshot.load_base_city_graph(city.landmarks, city.restaurants, city.subway,
+                                               cache_dir)
+
+    assert len(city_graph) == len(expected)
+    assert os.listdir(cache_dir) == [name]
+    assert os.path.getsize(os.path.join(cache_dir, name)) > 100
+
+
+def test_route_tables_of_each_penalty_are_kept(city: synthetic_city.CityFiles,
+                                               tmp_path: pathlib.Path) -> None:
+    """Test that the tables of routes for different transfer penalties do not remove each other,
+    and that no temporary file is left behind.
+    """
+    cache_dir = str(tmp_path)
+    for penalty in (60, 120):
+        snapshot.load_subway_graph(city.subway, city.subway_lines, precompute_routes=True,
+                                   transfer_penalty=penalty, cache_dir=cache_dir)
+
+    names = sorted(os.listdir(cache_dir))
+    assert [name.split('-')[0] for name in names] == ['routes', 'routes', 'subway', 'transit']
+    assert not any(name.endswith('.tmp') for name in names)
+
+
+def test_only_outdated_snapshots_are_removed(city: synthetic_city.CityFiles,
+                                             tmp_path: pathlib.Path) -> None:
+    """Test that saving a snapshot removes the outdated snapshots of the same kind, but not the
+    files of other processes that start with the same prefix.
+    """
+    cache_dir = str(tmp_path)
+    others = ['city-0123456789abcdef.npz', 'city-0123456789abcdef.npz.tmp', 'city-abc.tmp',
+              'city-notes.npz']
+    for name in others:
+        with open(os.path.join(cache_dir, name), 'wb') as file:
+            file.write(b'')
+
+    snapshot.load_base_city_graph(city.landmarks, city.restaurants, city.subway, cache_dir)
+
+    remaining = set(os.listdir(cache_dir))
+    assert 'city-0123456789abcdef.npz' not in remaining
+    assert set(others[1:]) <= remaining
+    assert len(remaining) == len(others)
@@ -0,0 +1,300 @@
+"""This module contains a line-aware model of the subway network, used to find realistic routes.
+
+In the subway data, a station served by several lines has one row (a "platform") for each of the
+lines, and the edges between two platforms of the same station are transfers between lines. Each
+edge also has the time in seconds it takes to travel along it. The lines themselves are not given,
+so they are recovered as the groups of platforms linked together by edges that are not transfers.
+
+This file is Copyright (c) 2021 Leen Al Lababidi, Michael Rubenstein, Maria Becerra and Nada Eldin
+"""
+from __future__ import annotations
+from typing import Optional
+import heapq
+import numpy as np
+from distances import distance_matrix, paired_distances
+from route_table import RouteTable, compute_route_table
+import instrumentation
+
+# the default time, in seconds, added to every transfer between two lines
+TRANSFER_PENALTY = 180
+
+
+class TransitNetwork:
+    """A subway network with one node for each line serving each station (a platform), and
+    transfer edges between the platforms of the same station.
+
+    Instance Attributes:
+        - names: names[p] is the name of the station of platform p
+        - lines: lines[p] is the line that platform p is on
+        - coordinates: the (latitude, longitude) of each platform
+        - indptr: the edges in compressed sparse row (CSR) form, along with indices
+        - indices: the neighbours of platform p are indices[indptr[p]:indptr[p + 1]]
+        - times: the time in seconds it takes to travel along each edge
+        - transfers: whether each edge is a transfer between two lines
+        - transfer_penalty: the time in seconds added to every transfer
+        - costs: the cost of each edge used for routing, which includes the transfer penalty
+        - line_platforms: maps each line to the platforms on it
+        - routes: the precomputed shortest routes between every pair of platforms, if they have
+            been computed
+
+    Representation Invariants:
+        - len(self.names) == len(self.lines) == len(self.coordinates) == len(self.indptr) - 1
+        - len(self.indices) == len(self.times) == len(self.transfers) == len(self.costs)
+        - self.transfer_penalty >= 0
+    """
+    names: list[str]
+    lines: np.ndarray
+    coordinates: np.ndarray
+    indptr: np.ndarray
+    indices: np.ndarray
+    times: np.ndarray
+    transfers: np.ndarray
+    transfer_penalty: float
+    costs: np.ndarray
+    line_platforms: dict[int, list[int]]
+    routes: Optional[RouteTable]
+    # Private Instance Attributes:
+    #     - _platforms: maps the name of a station to its platforms
+    #     - _max_speed: the highest speed in meters per second along any edge, used by the
+    #         heuristic of the route search
+    #     - _station_costs: the cost of the fastest route between every pair of stations, indexed
+    #         in the order of _platforms, computed the first time it is needed
+    _platforms: dict[str, list[int]]
+    _max_speed: float
+    _station_costs: Optional[np.ndarray]
+
+    def __init__(self, names: list[str], coordinates: np.ndarray, indptr: np.ndarray,
+                 indices: np.ndarray, times: np.ndarray,
+                 transfer_penalty: float = TRANSFER_PENALTY) -> None:
+        """Initialize a network from the given platforms and edges in compressed sparse row (CSR)
+        form, recovering the line of each platform.
+        """
+        self.names = names
+        self.coordinates = coordinates
+        self.indptr = indptr
+        self.indices = indices
+        self.times = times
+        self.transfer_penalty = transfer_penalty
+        self.routes = None
+        self._station_costs = None
+
+        self._platforms = {}
+        for p in range(0, len(names)):
+            self._platforms.setdefault(names[p], []).append(p)
+
+        # an edge between two platforms of the same station is a transfer
+        rows = np.repeat(np.arange(len(names)), np.diff(indptr))
+        name_array = np.array(names, dtype=np.str_)
+        self.transfers = name_array[rows] == name_array[indices]
+        self.costs = times + transfer_penalty * self.transfers
+
+        self.lines = _find_lines(len(names), rows[~self.transfers], indices[~self.transfers])
+        self.line_platforms = {}
+        for p in range(0, len(names)):
+            self.line_platforms.setdefault(int(self.lines[p]), []).append(p)
+
+        # the fastest any edge can be travelled, so the heuristic never overestimates
+        positive = self.costs > 0
+        lengths = paired_distances(coordinates[rows[positive]], coordinates[indices[positive]])
+        self._max_speed = float(np.max(lengths / self.costs[positive], initial=1.0))
+
+    def platforms_of(self, name: str) -> list[int]:
+        """Return the platforms of the station with the given name.
+
+        Raise a ValueError if there is no station with that name.
+        """
+        if name not in self._platforms:
+            raise ValueError
+
+        return self._platforms[name]
+
+    def station_costs(self) -> tuple[dict[str, int], np.ndarray]:
+        """Return a mapping from the name of each station to a position, along with a matrix of
+        the cost of the fastest route from the station at each position to the station at each
+        other position, from any of its platforms to any of theirs.
+
+        The matrix is computed from the precomputed routes if there are any, or from a new table
+        of routes otherwise, and kept for the next calls.
+        """
+        positions = {name: i for i, name in enumerate(self._platforms)}
+
+        if self._station_costs is None:
+            routes = self.routes if self.routes is not None else self.build_route_table()
+
+            # the fastest route from each station to each platform, then to each station
+            from_stations = np.array([routes.costs[platforms].min(axis=0)
+                                      for platforms in self._platforms.values()])
+            self._station_costs = np.array([from_stations[:, platforms].min(axis=1)
+                                            for platforms in self._platforms.values()]).T
+
+        return (positions, self._station_costs)
+
+    @instrumentation.timed('build_route_table')
+    def build_route_table(self) -> RouteTable:
+        """Return the table of the shortest routes between every pair of platforms, where each
+        edge is weighted by its cost.
+        """
+        return compute_route_table(self.indptr, self.indices, self.costs)
+
+    def route(self, name1: str, name2: str) -> Optional[list[int]]:
+        """Return the platforms along the fastest route from the station named name1 to the
+        station named name2. Return None if there is no route between them.
+
+        The route may start from any platform of name1 and end at any platform of name2. If the
+        shortest routes were precomputed, the route is looked up in that table. Otherwise, it is
+        found with the A* search algorithm.
+        """
+        sources = self.platforms_of(name1)
+        targets = self.platforms_of(name2)
+
+        if self.routes is None:
+            return self._search(sources, targets)
+
+        # pick the pair of platforms with the fastest route between them
+        route_costs = self.routes.costs[np.ix_(sources, targets)]
+        i, j = np.unravel_index(np.argmin(route_costs), route_costs.shape)
+
+        return self.routes.route(sources[i], targets[j])
+
+    def route_cost(self, platforms: list[int]) -> float:
+        """Return the total cost of travelling along the given route of platforms."""
+        total = 0.0
+        for k in range(0, len(platforms) - 1):
+            total += self.edge_cost(platforms[k], platforms[k + 1])
+        return total
+
+    def edge_cost(self, p1: int, p2: int) -> float:
+        """Return the cost of the edge from platform p1 to platform p2.
+
+        Raise a ValueError if there is no such edge.
+        """
+        start, end = self.indptr[p1], self.indptr[p1 + 1]
+        positions = np.flatnonzero(self.indices[start:end] == p2)
+
+        if len(positions) == 0:
+            raise ValueError
+
+        return float(np.min(self.costs[start + positions]))
+
+    def route_stations(self, platforms: list[int]) -> list[str]:
+        """Return the names of the stations along the given route of platforms, where the
+        platforms of a transfer only count as one station.
+        """
+        stations = []
+        for p in platforms:
+            if not stations or stations[-1] != self.names[p]:
+                stations.append(self.names[p])
+        return stations
+
+    def _search(self, sources: list[int], targets: list[int]) -> Optional[list[int]]:
+        """Return the platforms along the fastest route from any of the sources to any of the
+        targets, using the A* search algorithm with a binary heap.
+
+        The heuristic is the straight-line time to the closest target at the highest speed of the
+        network, so it never overestimates and the route found is always the fastest.
+        """
+        target_set = set(targets)
+
+        # a lower bound of the time from every platform to the closest target
+        estimates = (distance_matrix(self.coordinates, self.coordinates[targets]).min(axis=1)
+                     / self._max_speed).tolist()
+
+        # ACCUMULATORS: the fastest known time to each platform, and the platform before it
+        best = {p: 0.0 for p in sources}
+        previous = {p: -1 for p in sources}
+        finished = set()
+
+        # priority queue of (estimated time of the route, time so far, platform)
+        queue = [(estimates[p], 0.0, p) for p in sources]
+        heapq.heapify(queue)
+
+        while queue:
+            _, cost, p = heapq.heappop(queue)
+
+            if p in target_set:
+                instrumentation.count('vertices_visited', len(finished))
+
+                # follow the previous platforms back to the start
+                route = []
+                while p != -1:
+                    route.append(p)
+                    p = previous[p]
+                route.reverse()
+                return route
+
+            if p in finished:
+                continue
+            finished.add(p)
+
+            for k in range(self.indptr[p], self.indptr[p + 1]):
+                u = int(self.indices[k])
+                new_cost = cost + float(self.costs[k])
+
+                if u not in best or new_cost < best[u]:
+                    best[u] = new_cost
+                    previous[u] = p
+                    heapq.heappush(queue, (new_cost + estimates[u], new_cost, u))
+
+        instrumentation.count('vertices_visited', len(finished))
+        return None
+
+
+def build_transit_network(names: list[str], coordinates: list[tuple[float, float]],
+                          edges: list[tuple[int, int, float]],
+                          transfer_penalty: float = TRANSFER_PENALTY) -> TransitNetwork:
+    """Return a TransitNetwork with the given platforms, where edges contains a tuple
+    (p1, p2, time) for each edge going from platform p1 to platform p2 in time seconds.
+
+    Preconditions:
+        - all(0 <= p1 < len(names) and 0 <= p2 < len(names) for p1, p2, _ in edges)
+    """
+    edges = sorted(edges)
+
+    counts = np.bincount(np.array([e[0] for e in edges], dtype=np.int64), minlength=len(names))
+    indptr = np.concatenate(([0], np.cumsum(counts)))
+    indices = np.array([e[1] for e in edges], dtype=np.int32)
+    times = np.array([e[2] for e in edges], dtype=np.float64)
+
+    return TransitNetwork(names, np.array(coordinates, dtype=np.float64), indptr, indices, times,
+                          transfer_penalty)
+
+
+def _find_lines(n: int, rows: np.ndarray, columns: np.ndarray) -> np.ndarray:
+    """Return the line of each of the n platforms, where the edges from rows[i] to columns[i]
+    link platforms on the same line.
+
+    Lines are numbered from 0, in the order their first platform appears.
+    """
+    # union-find over the platforms
+    parents = list(range(0, n))
+
+    def find(p: int) -> int:
+        """Return the representative of the group of platform p."""
+        while parents[p] != p:
+            parents[p] = parents[parents[p]]
+            p = parents[p]
+        return p
+
+    for p1, p2 in zip(rows.tolist(), columns.tolist()):
+        parents[find(p1)] = find(p2)
+
+    numbers = {}
+    lines = np.empty(n, dtype=np.int32)
+    for p in range(0, n):
+        lines[p] = numbers.setdefault(find(p), len(numbers))
+
+    return lines
+
+
+if __name__ == "__main__":
+    import python_ta
+    python_ta.check_all(config={
+        'extra-imports': ['heapq', 'numpy', 'distances', 'route_table', 'instrumentation'],
+        'allowed-io': [],  # the names (strs) of functions that call print/open/input
+        'max-line-length': 100,
+        'disable': ['E1136']
+    })
+
+    import python_ta.contracts
+    python_ta.contracts.DEBUG_CONTRACTS = False
+    python_ta.contracts.check_all_contracts()
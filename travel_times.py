@@ -0,0 +1,84 @@
+"""This module estimates the travel times between many locations at once, as a matrix.
+
+Finding the exact fastest route between every pair of a few dozen locations would take one search
+per pair, so the matrix uses an estimate that only needs whole-array operations: the time it takes
+to walk straight there (when it is close enough to walk), or to walk to the closest subway station,
+ride to the station closest to the destination and walk from there, whichever is faster. Rides
+between stations are read from the table of the fastest routes between every pair of stations.
+
+This file is Copyright (c) 2021 Leen Al Lababidi, Michael Rubenstein, Maria Becerra and Nada Eldin
+"""
+from __future__ import annotations
+import numpy as np
+from location import Location
+from graphs import CityLocations, SubwayLines, PROXIMITY_THRESHOLD, WALKING_SPEED
+from distances import coordinates_array, distance_matrix, paired_distances
+import instrumentation
+
+
+@instrumentation.timed('travel_time_matrix')
+def travel_time_matrix(locations: list[Location], city_graph: CityLocations,
+                       subway_graph: SubwayLines) -> np.ndarray:
+    """Return a matrix of the estimated time in seconds it takes to go from each of the given
+    locations to each other one.
+
+    Entering the subway takes as long as a transfer between two lines, like in
+    multimodal.MultimodalRouter.
+
+    Preconditions:
+        - subway_graph.transit is not None
+        - city_graph has at least one subway station in subway_graph.transit
+    """
+    transit = subway_graph.transit
+    positions, station_costs = transit.station_costs()
+    coordinates = coordinates_array(locations)
+
+    # the time to walk straight from each location to each other one, where close enough
+    distances = distance_matrix(coordinates)
+    walks = np.where(distances <= PROXIMITY_THRESHOLD, distances / WALKING_SPEED * 60, np.inf)
+
+    # the time to walk between each location and its closest station
+    stations = [_closest_station(location, city_graph, positions) for location in locations]
+    to_stations = paired_distances(coordinates, coordinates_array(stations)) / WALKING_SPEED * 60
+
+    station_positions = np.array([positions[station.name] for station in stations],
+                                 dtype=np.int64)
+    rides = to_stations[:, np.newaxis] + transit.transfer_penalty \
+        + station_costs[np.ix_(station_positions, station_positions)] + to_stations[np.newaxis, :]
+
+    times = np.minimum(walks, rides)
+    np.fill_diagonal(times, 0.0)
+
+    return times
+
+
+def _closest_station(location: Location, city_graph: CityLocations,
+                     positions: dict[str, int]) -> Location:
+    """Return the subway station of city_graph closest to the given location, among the stations
+    whose names are in positions.
+    """
+    k = 1
+    while True:
+        closest = city_graph.nearest_stations(location, k)
+
+        for station in closest:
+            if station.name in positions:
+                return station
+
+        if len(closest) < k:
+            raise ValueError('There are no subway stations in this graph')
+        k *= 2
+
+
+if __name__ == "__main__":
+    import python_ta
+    python_ta.check_all(config={
+        'extra-imports': ['numpy', 'location', 'graphs', 'distances', 'instrumentation'],
+        'allowed-io': [],  # the names (strs) of functions that call print/open/input
+        'max-line-length': 100,
+        'disable': ['E1136']
+    })
+
+    import python_ta.contracts
+    python_ta.contracts.DEBUG_CONTRACTS = False
+    python_ta.contracts.check_all_contracts()